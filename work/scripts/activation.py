@@ -176,26 +176,43 @@ class VVBram:
 
 
 # ---- Main ----
-import matplotlib.pyplot as plt
+SIGM = 1
+TANH = 2
 
 
-bram = VVBram()
+# The global BRAM object (bram) and the activation tables (tblSigm, tblTanh)
+# are built on first access, so that importing this module stays cheap.
+def makeGlobalBram():
+    global bram, tblSigm, tblTanh
+    # build the activation tables
+    bram = VVBram()
+    tblSigm = bram.makeActTable(sigmoid, 1, 0)
+    tblTanh = bram.makeActTable(np.tanh, 1, -1)
+    # load the activation tables
+    bram.loadActTable(tblSigm, SIGM)
+    bram.loadActTable(tblTanh, TANH)
+
+
+# Returns the global BRAM object, building it if needed
+def getGlobalBram():
+    if 'bram' not in globals(): makeGlobalBram()
+    return bram
 
-# build the activation tables
-SIGM = 1
-TANH = 2
-tblSigm = bram.makeActTable(sigmoid, 1, 0)
-tblTanh = bram.makeActTable(np.tanh, 1, -1)
 
-# load the activation tables
-bram.loadActTable(tblSigm, SIGM)
-bram.loadActTable(tblTanh, TANH)
+# Module attribute hook: builds the lazy globals when they are first accessed
+# (e.g., from activation import tblSigm)
+def __getattr__(name):
+    if name in {'bram', 'tblSigm', 'tblTanh'}:
+        makeGlobalBram()
+        return globals()[name]
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 
 # Given a floating point value, applies the activation function
 # from the VVBram() instance objBram. By default, uses the 
 # global object name bram.
-def applyBramActivation(val, actCode, objBram=bram):
+def applyBramActivation(val, actCode, objBram=None):
+    if objBram is None: objBram = getGlobalBram()
     # Checks
     valSize = 16    # 16-bit unsigned number representing a signed fixed-point value
     fracWidth = 8   # fixed-point fraction bits
@@ -262,6 +279,7 @@ def get8bActVals(actFn, psat, nsat):
 
 # Plots the activation values for Q8.8 fixed-point numbers
 def plot16bActivationTable(actFn, psat, nsat):
+    import matplotlib.pyplot as plt     # only needed for plotting
     xvals, accAct, bramAct = get16bActVals(actFn, psat, nsat)
     # Plot them
     plt.figure()
@@ -272,6 +290,7 @@ def plot16bActivationTable(actFn, psat, nsat):
 
 # Plots the activation values for Q8.8 fixed-point numbers
 def plot8bActivationTable(actFn, psat, nsat):
+    import matplotlib.pyplot as plt     # only needed for plotting
     xvals, accAct, bramAct = get8bActVals(actFn, psat, nsat)
     # Plot them
     plt.figure()
@@ -0,0 +1,55 @@
+#!/bin/python3
+
+#############################################################################
+# This script benchmarks the start-up (import) time of the assembler        #
+# scripting interface. Each import is timed in a fresh interpreter, and     #
+# the heavy optional dependencies that should not be loaded at import time  #
+# are reported. Usage: python3 bench-import.py [repeat]                     #
+#############################################################################
+
+
+import os
+import subprocess
+import sys
+
+
+# Import statements to benchmark, (label, statement)
+benchmarks = [
+    ('python',            'pass'),
+    ('numpy',             'import numpy'),
+    ('davinci_assembler', 'from davinci_assembler import *'),
+    ('activation',        'import activation'),
+]
+
+# Modules that must not be loaded by importing the scripting interface
+lazy_modules = ['yaml', 'matplotlib', 'multiprocessing']
+
+
+# Given an import statement, runs it in a fresh interpreter and returns
+# (time in ms, list of lazy_modules that got loaded)
+def timeImport(stmt):
+    code = f'''import time
+t0 = time.perf_counter()
+{stmt}
+t1 = time.perf_counter()
+import sys
+print((t1-t0)*1000, *[m for m in {lazy_modules} if m in sys.modules])
+'''
+    scriptDir = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, '-c', code], cwd=scriptDir, capture_output=True, text=True, check=True)
+    fields = out.stdout.split()
+    return float(fields[0]), fields[1:]
+
+
+# ---- Main ----
+repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+print(f'Import time (ms), best/median of {repeat} runs')
+for label, stmt in benchmarks:
+    times = []
+    for _ in range(repeat):
+        tms, loaded = timeImport(stmt)
+        times.append(tms)
+    times.sort()
+    line = f'  {label:<20} {times[0]:8.1f} {times[len(times)//2]:8.1f}'
+    if loaded: line += f'   WARN: loaded {", ".join(loaded)}'
+    print(line)
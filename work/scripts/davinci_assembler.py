@@ -40,9 +40,8 @@
 
 import math
 import numpy as np
-import yaml
 from string import Template
-from copy import deepcopy
+from davinci_instrstore import DavinciInstrList, DavinciInstrStore, DavinciInstrStream, InstrSink
 
 
 
@@ -71,15 +70,19 @@ typedef struct {
 #endif  // DAVINCI_PROG_H
 '''
 
-c_prog_template = Template(f'''#include "{c_header_name}"
+# the C-program is split around the instruction array, so that it can also be
+# written in pieces by the streaming writers
+c_prog_head = Template(f'''#include "{c_header_name}"
 
 
 static const uint32_t word_arr[] = {{
-$instructions
-}};
+''')
+
+c_prog_tail = Template('''
+};
 
 
-Davinci_Prog $progname = {{
+Davinci_Prog $progname = {
     word_arr,
     sizeof(word_arr)/sizeof(word_arr[0]),   // size
     $fracWidth,    // fracWidth
@@ -88,9 +91,11 @@ Davinci_Prog $progname = {{
     $regWidth,   // regWidth
     $idWidth,    // idWidth
     $peCount,   // peCount
-}};
+};
 ''')
 
+c_prog_template = Template(c_prog_head.template + '$instructions' + c_prog_tail.template)
+
 
 # IR3 instruction format:
 # [sub-module-code] [sub-module-instruction] 
@@ -126,6 +131,32 @@ class DavinciAsm:
         'submInstr' : 30,   # width of the submodule-instruction field
     }
 
+    # Backends of the instruction store
+    tbl_instrStore = {
+        'list'     : DavinciInstrList,
+        'columnar' : DavinciInstrStore,
+    }
+
+    # Macros with a fixed shape: the expanded words only differ in the listed
+    # register fields, so they are instantiated from cached templates
+    tbl_macroTemplate = {
+        ('mv', 'sync')       : (),
+        ('mv', 'mult')       : ('rd', 'multiplicand', 'multiplier'),
+        ('mv', 'blockAccum') : ('rd', 'rs'),
+        ('mv', 'clearReg')   : ('reg',),
+        ('vv', 'sync')       : (),
+        ('vv', 'clearReg')   : ('reg',),
+    }
+
+    # Macros expanded in the process pool by assemble(workers=N); the rest are
+    # cheap enough (see tbl_macroTemplate) to be encoded in the main process
+    tbl_poolMacro = {
+        ('mv', 'loadMat'),
+        ('mv', 'loadVecRow'),
+        ('mv', 'loadVecCol'),
+        ('vv', 'loadVec'),
+    }
+
     # Import submodule assemblers
     from picaso_assembler import PiCaSOAsm
     from vvengine_assembler import VVBlockAsm
@@ -135,11 +166,16 @@ class DavinciAsm:
 
 
     # Class implementation
-    def __init__(self):
-        self.instructions = []        # will contain internal representation of each instruction
+    def __init__(self, instrStore='list'):
         self.isAssembled = False      # state flag, set to True after assemble
         self.picaso_as = self.PiCaSOAsm()  # PiCaSO assembler instance
         self.vvblock_as = self.VVBlockAsm()
+        self.instrStore = instrStore  # backend of the instruction store, see setInstrStore()
+        self.stream = None            # output files of the streaming mode, see openStream()
+        self.buildCache = None        # on-disk build cache, see enableBuildCache()
+        self.weightCache = None       # weight-image cache, see enableWeightCache()
+        self.regTracker = None        # register content tracker, see enableRegTracking()
+        self.instructions = self.makeInstrStore()   # will contain internal representation of each instruction
         self.setupParams()            # setup default parameter values
 
 
@@ -166,286 +202,385 @@ class DavinciAsm:
         self.vvblock_as.printParams(indent=indent+'  ')
 
 
-    # Given a segment dictionary (segDict) of VV-Engine submodule,
-    # returns a list of segments (in order) for IR3 machine code generation
-    def vveng_seg2list(self, segDict):
-        opcode = segDict['seg2']
-        seg1 = segDict['seg1']
-        seg0 = segDict['seg0']
-        w_opcode = self.vvblock_as.tbl_field_width['seg2']
-        w_seg1 = self.vvblock_as.tbl_field_width['seg1']
-        w_seg0 = self.vvblock_as.tbl_field_width['seg0']
-        return [(opcode, w_opcode), (seg1, w_seg1), (seg0, w_seg0)]
-
-
     # Given an instruction dictionary (internal representation) of a macro
-    # instruction, returns a list of submSegments (definition in genMachineCode())
+    # instruction, returns the (30-bit) submodule instruction words (in order)
+    # as a np.uint32 array
     def vveng_genMacro(self, instrDict):
         assert 'macro' in instrDict, f'Instruction is not a macro: {instrDict}'
         macroName = instrDict['macro']
-        llSegment = []      # list of submodule segment-lists (ordered)
+        vvblock_as = self.vvblock_as
         if macroName == 'sync':
             # 1 NOP is needed to create a synchronization barrier
-            vveng_nop = {'opcode' : 'nop'}
-            segDict = self.vvblock_as.genMachineCode(vveng_nop)
-            llSegment.append(self.vveng_seg2list(segDict))
+            words = vvblock_as.encodeBatch('nop', count=1)
         elif macroName == 'clearReg':
             # clearReg works as follows,
             #  - select all blocks
             #  - write zeros to the specified register
-            # get/build vvengine IR to generate machine codes
-            regAddr = self.vvblock_as.makeRegAddr(instrDict['reg']) # get the address for the specified register
-            vveng_selectAll = self.vvblock_as.instSelectAll()       # get the vvengine-ir
-            vveng_write = self.vvblock_as.instWrite(addr=regAddr, data=0)
-            # push the selectAll() instruction
-            segList = self.vveng_seg2list( self.vvblock_as.genMachineCode(vveng_selectAll) )
-            llSegment.append(segList)
-            segList = self.vveng_seg2list( self.vvblock_as.genMachineCode(vveng_write) )
-            llSegment.append(segList)
+            regAddr = vvblock_as.makeRegAddr(instrDict['reg']) # get the address for the specified register
+            words = np.concatenate([vvblock_as.encodeBatch('selectall', count=1),
+                                    vvblock_as.encodeBatch('write0', addr=regAddr, data=0)])
         elif macroName == 'loadVec':
             # write the non-zero elements of the given vector to the specified register
             #   - select a vvblock using its ID
             #   - write the element to that block
-            # build VV-Engine IR to generate machine codes
-            vveng_selblk = {'opcode' : 'selectblk', 'id' : None}
-            vveng_write  = {'opcode' : 'write0', 'addr' : None, 'data' : None}
-            # generate write instructions per BRAM column
-            for blkID, val in enumerate(instrDict['vector']): 
-                if val != 0:
-                    # select block
-                    vveng_selblk['id'] = blkID
-                    selectSegList = self.vveng_seg2list( self.vvblock_as.genMachineCode(vveng_selblk) )
-                    llSegment.append(selectSegList)
-                    # Write value to the register
-                    regAddr = self.vvblock_as.makeRegAddr(instrDict['reg'])   # get the register address
-                    vveng_write['addr'] = regAddr
-                    vveng_write['data'] = val
-                    segList = self.vveng_seg2list( self.vvblock_as.genMachineCode(vveng_write) )
-                    llSegment.append(segList)
+            vector = np.asarray(instrDict['vector'])
+            blkIDs = np.flatnonzero(vector)
+            regAddr = vvblock_as.makeRegAddr(instrDict['reg'])   # get the register address
+            selWords = vvblock_as.encodeBatch('selectblk', id=blkIDs)
+            writeWords = vvblock_as.encodeBatch('write0', addr=regAddr, data=vector[blkIDs])
+            words = np.stack([selWords, writeWords], axis=1).ravel()    # select then write, per block
         else:
             assert 0, f'vvengine submodule does not implement a macro named: {macroName}'
-        return llSegment
+        return words
 
 
-    # Given a segment dictionary (segDict) of GEMV array (picaso instruction)
-    # submodule, returns a list of segments (in order) for IR3 machine code generation
-    def gemv_seg2list(self, segDict):
-        w_seg0 = self.picaso_as.tbl_field_width['seg0']
-        w_seg1 = self.picaso_as.tbl_field_width['seg1']
-        w_seg2 = self.picaso_as.tbl_field_width['seg2']
-        return [(segDict['seg2'], w_seg2), (segDict['seg1'], w_seg1), (segDict['seg0'], w_seg0)]
+    # Given the BRAM image of a register (..., regWidth) and the select words
+    # of each (flattened) block, returns the words for writing the non-zero rows
+    # of each block into the register at ptrBase. The write words of a block
+    # are preceded by its select word; blocks without a non-zero row are not selected.
+    # (this optimizaiton assumes the register has been already cleared calling mv_macroClearReg)
+    # If mask (same shape as bramImg) is given, the rows where it is true are written instead.
+    def gemv_genImageWrites(self, bramImg, selWords, ptrBase, mask=None):
+        regWidth = self.picaso_as.regWidth
+        bramImg = bramImg.reshape(-1, regWidth)
+        blkNo, bitNo = np.nonzero(bramImg if mask is None else mask.reshape(-1, regWidth))
+        writeWords = self.picaso_as.encodeBatch('write', addr=ptrBase+bitNo, data=bramImg[blkNo, bitNo])
+        firstWrite = np.flatnonzero(np.diff(blkNo, prepend=-1))   # index of the first write of each block
+        return np.insert(writeWords, firstWrite, selWords[blkNo[firstWrite]])
+
+
+    # Given the BRAM images of a batch of row-vectors (batch, blkCols, regWidth),
+    # returns the (batch, n) LOADVEC_ROW words for writing each of them into the
+    # register at ptrBase. Unlike gemv_genImageWrites(), the zero rows are also
+    # written, so that the words of the batch items only differ in their data.
+    def gemv_genDenseVecRowWrites(self, bramImgs, ptrBase):
+        picaso_as = self.picaso_as
+        batch, blkCols, regWidth = bramImgs.shape
+        selWords = picaso_as.encodeBatch('select', fncode='sel_col', rowID=0, colID=np.arange(blkCols))
+        addr = np.broadcast_to(ptrBase + np.arange(regWidth), bramImgs.shape)
+        writeWords = picaso_as.encodeBatch('write', addr=addr.ravel(), data=bramImgs.ravel()).reshape(bramImgs.shape)
+        selWords = np.broadcast_to(selWords.reshape(1, blkCols, 1), (batch, blkCols, 1))
+        return np.concatenate([selWords, writeWords], axis=-1).reshape(batch, -1)
+
+
+    # Given an MV_LOADVEC_ROW instruction and a batch of vectors (batch, vecLen),
+    # returns the (batch, n) IR3 words that load each of the vectors in place
+    # of the vector of the instruction (see gemv_genDenseVecRowWrites())
+    def gemv_genBatchVecRow(self, instr, vectors):
+        # convert the vectors to fixed-point
+        vectors = np.asarray(vectors)
+        assert vectors.ndim == 2 and vectors.shape[1] == len(instr['vector']), f'Expected (batch, {len(instr["vector"])}) vectors, got an array of shape {vectors.shape}'
+        scaleFact = 1 << self.fracWidth
+        vectors = (vectors*scaleFact).astype(int)
+        words = self.gemv_genDenseVecRowWrites(self.makeBramImage(vectors), self.picaso_as.makeRegAddr(instr['reg']))
+        return words | np.uint32(self.tbl_submCode['mv'] << self.tbl_field_width['submInstr'])
+
+
+    # Given the BRAM image of a matrix, returns the LOADMAT words for writing
+    # it into the register at ptrBase: each block is selected using its row-col
+    # ID, followed by its writes. The broadcast writes (see
+    # gemv_genBroadcastLoadMat()) are used instead if they need fewer words;
+    # they need the dimension of the PiCaSO array (mvBlockDim).
+    def gemv_genLoadMat(self, bramImg, ptrBase):
+        rowIDs, colIDs = np.indices(bramImg.shape[:2])
+        selWords = self.picaso_as.encodeBatch('select', fncode='sel_block', rowID=rowIDs.ravel(), colID=colIDs.ravel())
+        words = self.gemv_genImageWrites(bramImg, selWords, ptrBase)
+        if not self.mvMaxRow: return words
+        bcastWords = self.gemv_genBroadcastLoadMat(bramImg, ptrBase)
+        return bcastWords if len(bcastWords) < len(words) else words
+
+
+    # Given the BRAM image of a matrix (blkRows, blkCols, regWidth), returns
+    # the LOADMAT words that write the bit-rows shared by many blocks with
+    # broadcast selections, in the order: all blocks (sel_enc), each block row
+    # (sel_row), each block column (sel_col). The bit-row of a group is written
+    # with the value most of its blocks need, if that saves words: it fixes
+    # the blocks that need the value, and breaks the blocks that already hold
+    # the right one. The remaining mismatches are patched block by block
+    # (sel_block), zeros included. The broadcasts reach all blocks of the
+    # array, so the image is zero-padded to the array dimension.
+    # (assumes the register has been already cleared calling mv_macroClearReg)
+    def gemv_genBroadcastLoadMat(self, bramImg, ptrBase):
+        picaso_as = self.picaso_as
+        blkRows, blkCols = self.mvMaxRow, self.mvMaxCol // picaso_as.peCount
+        regWidth = bramImg.shape[-1]
+        image = np.zeros((blkRows, blkCols, regWidth), dtype=bramImg.dtype)
+        image[:bramImg.shape[0], :bramImg.shape[1]] = bramImg
+        bramImg = image
+        rowIDs, colIDs = np.indices((blkRows, blkCols))
+        selWords = picaso_as.encodeBatch('select', fncode='sel_block', rowID=rowIDs.ravel(), colID=colIDs.ravel())
+        groups = [(picaso_as.encodeBatch('select', fncode='sel_enc', rowID=0, colID=0), np.ones((blkRows, blkCols), dtype=bool))]
+        if blkCols > 1: groups += [(picaso_as.encodeBatch('select', fncode='sel_row', rowID=r, colID=0), rowIDs == r) for r in range(blkRows)]
+        if blkRows > 1: groups += [(picaso_as.encodeBatch('select', fncode='sel_col', rowID=0, colID=c), colIDs == c) for c in range(blkCols)]
+        current = np.zeros_like(bramImg)   # contents of the register
+        words = []
+        for selWord, group in groups:
+            target = bramImg[group]     # (blocks, regWidth)
+            okCnt = (target == current[group]).sum(axis=0)
+            bits, data, gain = [], [], 0
+            for bitNo in range(regWidth):
+                vals, counts = np.unique(target[:, bitNo], return_counts=True)
+                # blocks fixed - blocks broken = blocks needing the value - blocks already right
+                bitGain = counts.max() - okCnt[bitNo] - 1
+                if bitGain > 0:
+                    bits.append(bitNo)
+                    data.append(vals[counts.argmax()])
+                    gain += bitGain
+            if gain <= 1: continue      # does not pay for the select word
+            words += [selWord, picaso_as.encodeBatch('write', addr=ptrBase+np.array(bits), data=np.array(data))]
+            written = current[group]
+            written[:, bits] = data
+            current[group] = written
+        words.append(self.gemv_genImageWrites(bramImg, selWords, ptrBase, mask=(current != bramImg)))
+        return np.concatenate(words)
+
+
+    # Same as gemv_genLoadMat() for a (fixed-point) matrix and register, using
+    # the weight-image cache: the image and words of a matrix are generated
+    # once, and relocated to the given register afterwards
+    def gemv_genCachedLoadMat(self, matrix, reg):
+        picaso_as = self.picaso_as
+        params = {'fracWidth' : self.fracWidth, 'regWidth' : picaso_as.regWidth,
+                  'peCount' : picaso_as.peCount, 'idWidth' : picaso_as.idWidth,
+                  'arrayDim' : (self.mvMaxRow, self.mvMaxCol)}     # for the broadcast writes
+        key = self.weightCache.makeKey(matrix, params)
+        entry = self.weightCache.get(key)
+        if entry is None:
+            bramImg = self.makeBramImage(matrix)
+            words = self.gemv_genLoadMat(bramImg, picaso_as.makeRegAddr(0))
+            delta = self.gemv_genLoadMat(bramImg, picaso_as.makeRegAddr(1)) - words
+            entry = {'image' : bramImg, 'words' : words, 'delta' : delta}
+            self.weightCache.put(key, entry)
+        return entry['words'] + entry['delta'] * np.uint32(reg)
+
+
+    # Enables the process-wide weight-image cache for MV_LOADMAT (shared by all
+    # assemblers; the settings of the last call apply to all of them).
+    # Options:
+    #    maxSize  : memory budget in bytes, least recently used matrices are evicted
+    #    cacheDir : directory for keeping the images across runs, not persistent if None
+    #    diskSize : size bound of cacheDir in bytes, unbounded if None
+    def enableWeightCache(self, maxSize=64*2**20, cacheDir=None, diskSize=None):
+        from davinci_weightcache import getWeightCache
+        self.weightCache = getWeightCache(maxSize, cacheDir, diskSize)
+
+
+    # Disables the weight-image cache for this assembler
+    def disableWeightCache(self):
+        self.weightCache = None
+
+
+    # Enables the register content tracker (DavinciRegTracker). The load
+    # macros then skip the clearing of registers that are known to be zero,
+    # skip loading a content that the register already holds, and copy a
+    # content held by another MV-Engine register with MV_MOV instead of
+    # reloading it. Instructions added before this call are tracked too.
+    # Tracking is suspended in streaming mode.
+    def enableRegTracking(self):
+        from davinci_regtrack import DavinciRegTracker
+        self.regTracker = DavinciRegTracker(self)
+
+
+    # Disables the register content tracker
+    def disableRegTracking(self):
+        self.regTracker = None
+
+
+    # Returns a register allocator (DavinciRegAlloc) of this assembler. The
+    # program is written with its mnemonics on virtual registers (see
+    # mvReg()/vvReg()), and allocate() adds the instructions with the
+    # physical registers assigned by liveness analysis and linear scan.
+    def regAllocator(self):
+        from davinci_regalloc import DavinciRegAlloc
+        return DavinciRegAlloc(self)
+
+
+    # Returns the GEMV tiling layer (DavinciTiler) of this assembler, for
+    # matrices larger than the PiCaSO array, e.g., gemvTiler().addGemv(M, V)
+    def gemvTiler(self):
+        from davinci_tiling import DavinciTiler
+        return DavinciTiler(self)
+
+
+    # Returns the layer-level frontend (DavinciFrontend) of this assembler, which
+    # compiles a model of Dense/LSTMCell/GRUCell layers (see davinci_frontend.py)
+    # with NumPy weights, e.g., modelFrontend().compile(layers, inputs, expFile=filename)
+    def modelFrontend(self):
+        from davinci_frontend import DavinciFrontend
+        return DavinciFrontend(self)
+
+
+    # Returns the weight-stationary program generator (DavinciWeightStationary)
+    # of this assembler: the weights are loaded once, followed by a per-vector
+    # section that the host replays for each input, e.g., weightStationary().build(M, B)
+    def weightStationary(self):
+        from davinci_wstat import DavinciWeightStationary
+        return DavinciWeightStationary(self)
+
+
+    # Given the submodule, register, kind and fixed-point payload of a load
+    # macro, and its source mnemonic, returns (instr, needClear). instr is the
+    # instruction that replaces the load if the content is already available
+    # (None otherwise), needClear is False if the register is known to be zero.
+    def trackLoad(self, submName, reg, kind, payload, src):
+        tracker = self.regTracker
+        if tracker is None or self.stream is not None: return None, True
+        tracker.update(self.instructions)
+        content = tracker.makeHash(kind, payload)
+        if tracker.get(submName, reg) == content:
+            return self.as_addComment(f'{src} skipped: reg {reg} already holds the content'), False
+        other = tracker.find(submName, content) if submName == 'mv' else None
+        if other is not None:
+            return self.mv_instMov(rd=reg, rs=other, comment=f'{src} replaced: reg {other} holds the content'), False
+        return None, tracker.get(submName, reg) != tracker.ZERO
 
 
     # Given an instruction dictionary (internal representation) of a macro
-    # instruction, returns a list of submSegments (definition in genMachineCode())
+    # instruction, returns the (30-bit) submodule instruction words (in order)
+    # as a np.uint32 array
     def gemv_genMacro(self, instrDict):
         assert 'macro' in instrDict, f'Instruction is not a macro: {instrDict}'
         macroName = instrDict['macro']
-        llSegment = []      # list of submodule segment-lists (ordered)
+        picaso_as = self.picaso_as
         if macroName == 'sync':
             # 2 NOPs are needed to create a synchronization barrier
-            picaso_nop = {'opcode' : 'nop'}      # picaso-ir for NOP
-            segDict = self.picaso_as.genMachineCode(picaso_nop)
-            segList = self.gemv_seg2list(segDict)
-            llSegment.append(segList)
-            llSegment.append(segList)
+            words = picaso_as.encodeBatch('nop', count=2)
         elif macroName == 'mult':
             # multiplication works as follows,
             #  - clearmbit: clear the multiplier bit storage in booth's ALU
             #  - execute updatepp for all bits of multiplier, lsb to msb
-            picaso_clearmbit = {'opcode' : 'superop', 'scode' : 'clrmbit'}
-            picaso_updatepp  = {'opcode' : 'updatepp', 'offset' : None, 
-                                'rd'  : instrDict['rd'], 
-                                'rs1' : instrDict['multiplier'], 
-                                'rs2' : instrDict['multiplicand']}
-            # push clearmbit instruction
-            segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_clearmbit) )
-            llSegment.append(segList)
-            # push updatepp instruction for all multiplier bits
-            for bitNo in range(self.picaso_as.regWidth):
-                picaso_updatepp['offset'] = bitNo
-                segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_updatepp) )
-                llSegment.append(segList)
+            clearmbit = picaso_as.encodeBatch('superop', scode='clrmbit')
+            updatepp  = picaso_as.encodeBatch('updatepp', offset=np.arange(picaso_as.regWidth),
+                                              rd=instrDict['rd'],
+                                              rs1=instrDict['multiplier'],
+                                              rs2=instrDict['multiplicand'])
+            words = np.concatenate([clearmbit, updatepp])
         elif macroName == 'blockAccum':
             # block-level accumulation works as follows,
             #  - apply fold=1 from source reg to destination reg
             #  - apply rest of the folds on the destination reg
-            picaso_accumblk = {'opcode' : 'accum', 'fncode' : 'accum_blk', 
-                               'param' : 1,
-                               'rs1' : instrDict['rs'],
-                               'rs2' : instrDict['rd'],
-                               'comment' : 'NOTE: First fold'}
-            # push first fold
-            segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_accumblk) )
-            llSegment.append(segList)
-            # push rest of the folds on destination reg
-            picaso_accumblk['rs1'] = instrDict['rd']
-            for f in range(2, self.picaso_as.maxFold+1):
-                picaso_accumblk['param'] = f
-                segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_accumblk) )
-                llSegment.append(segList)
+            folds = np.arange(1, picaso_as.maxFold+1)
+            rs1 = np.where(folds == 1, instrDict['rs'], instrDict['rd'])
+            words = picaso_as.encodeBatch('accum', fncode='accum_blk', param=folds,
+                                          rs1=rs1, rs2=instrDict['rd'])
         elif macroName == 'clearReg':
             # clearReg works as follows,
             #  - select all blocks
             #  - write zeros to all rows of the specified register
-            # get/build picaso IR to generate machine codes
-            picaso_selectAll = self.picaso_as.instSelectAll()   # get the picaso-ir
-            picaso_write = {'opcode' : 'write', 'addr' : None, 'data' : None}
-            # push the selectAll() instruction
-            segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_selectAll) )
-            llSegment.append(segList)
-            # push the write instructions
-            ptrReg = self.picaso_as.makeRegAddr(instrDict['reg'])   # get the register base address
-            for i in range(self.picaso_as.regWidth):
-                picaso_write['addr'] = ptrReg
-                picaso_write['data'] = 0
-                segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_write) )
-                llSegment.append(segList)
-                ptrReg += 1     # point to the next bit of the register
+            ptrReg = picaso_as.makeRegAddr(instrDict['reg'])   # get the register base address
+            selectAll = picaso_as.encodeBatch('select', fncode='sel_enc', rowID=0, colID=0)
+            writes = picaso_as.encodeBatch('write', addr=ptrReg+np.arange(picaso_as.regWidth), data=0)
+            words = np.concatenate([selectAll, writes])
         elif macroName == 'loadMat':
             # write block images corresponding to the given matrix
             #   - select a block using row-col ID, 
             #   - write all wordlines corresponding to the given register
-            # generate block images
-            bramArr = self.makePe2BramMat(instrDict['matrix'])
-            # build picaso IR to generate machine codes
-            picaso_selblk = {'opcode' : 'select', 'fncode' : 'sel_block',
-                             'rowID' : None, 'colID' : None}
-            picaso_write = {'opcode' : 'write', 'addr' : None, 'data' : None}
-            # generate write instructions per BRAM block
-            for r, bramRow in enumerate(bramArr):
-                for c, bram in enumerate(bramRow): 
-                    # Select the block
-                    picaso_selblk['rowID'] = r
-                    picaso_selblk['colID'] = c
-                    selectSegList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_selblk) )
-                    # selection instruction is compiled but will not be queued until a valid write is found: llSegment.append(selectSegList)
-                    # Write data to the given register
-                    isFirstWrite = True
-                    ptrReg = self.picaso_as.makeRegAddr(instrDict['reg'])   # get the register base address
-                    assert len(bram) == self.picaso_as.regWidth, f'BRAM image for loadMat contains unexpected no. of rows: {len(bram)} != {self.picaso_as.regWidth}'
-                    for data in bram:
-                        # Write the data if non-zero (this optimizaiton assumes the register has been already cleared calling mv_macroClearReg)
-                        if data != 0:
-                            # Select the block if a non-zero data is found for the first time
-                            if isFirstWrite: 
-                                llSegment.append(selectSegList)
-                                isFirstWrite = False
-                            picaso_write['addr'] = ptrReg
-                            picaso_write['data'] = data
-                            segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_write) )
-                            llSegment.append(segList)
-                        ptrReg += 1     # point to the next bit of the register
+            #   (shared wordlines are written to block rows/columns/all blocks at once, see gemv_genLoadMat)
+            if self.weightCache: words = self.gemv_genCachedLoadMat(instrDict['matrix'], instrDict['reg'])
+            else: words = self.gemv_genLoadMat(self.makeBramImage(instrDict['matrix']), picaso_as.makeRegAddr(instrDict['reg']))
         elif macroName == 'loadVecRow':
             # write block images corresponding to the given vector
             #   - select a column of picaso-blocks using colID
             #   - write all wordlines corresponding to the given register
-            # generate block images
-            bramRow = self.makePe2BramVec(instrDict['vector'])
-            # build picaso IR to generate machine codes
-            picaso_selcol = {'opcode' : 'select', 'fncode' : 'sel_col',
-                             'rowID' : 0, 'colID' : None}
-            picaso_write = {'opcode' : 'write', 'addr' : None, 'data' : None}
-            # generate write instructions per BRAM column
-            for c, bram in enumerate(bramRow): 
-                # Select the column
-                picaso_selcol['colID'] = c
-                selectSegList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_selcol) )
-                # selection instruction is compiled but will not be queued until a valid write is found: llSegment.append(selectSegList)
-                # Write data to the given register
-                isFirstWrite = True
-                ptrReg = self.picaso_as.makeRegAddr(instrDict['reg'])   # get the register base address
-                assert len(bram) == self.picaso_as.regWidth, f'BRAM image for loadVecRow contains unexpected no. of rows: {len(bram)} != {self.picaso_as.regWidth}'
-                for data in bram:
-                    # Write the data if non-zero (this optimizaiton assumes the register has been already cleared calling mv_macroClearReg)
-                    if data != 0:
-                        # Select the column if a non-zero data is found for the first time
-                        if isFirstWrite: 
-                            llSegment.append(selectSegList)
-                            isFirstWrite = False
-                        picaso_write['addr'] = ptrReg
-                        picaso_write['data'] = data
-                        segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_write) )
-                        llSegment.append(segList)
-                    ptrReg += 1     # point to the next bit of the register
+            #   (all wordlines are written if the macro is dense, see gemv_genDenseVecRowWrites)
+            bramRow = self.makeBramImage([instrDict['vector']])[0]
+            if instrDict.get('dense'):
+                words = self.gemv_genDenseVecRowWrites(bramRow[np.newaxis], picaso_as.makeRegAddr(instrDict['reg']))[0]
+            else:
+                selWords = picaso_as.encodeBatch('select', fncode='sel_col', rowID=0, colID=np.arange(len(bramRow)))
+                words = self.gemv_genImageWrites(bramRow, selWords, picaso_as.makeRegAddr(instrDict['reg']))
         elif macroName == 'loadVecCol':
             # write block images corresponding to the given vector
             #   - select a row of picaso-blocks using rowID
             #   - write all wordlines corresponding to the given register
-            # generate block images for the column vector
-            bramCol = self.makePe2BramColVec(instrDict['vector'])
-            # build picaso IR to generate machine codes
-            picaso_selrow = {'opcode' : 'select', 'fncode' : 'sel_row',
-                             'rowID' : None, 'colID' : 0}
-            picaso_write = {'opcode' : 'write', 'addr' : None, 'data' : None}
-            # generate write instructions per BRAM column
-            for r, bram in enumerate(bramCol): 
-                # Select the column
-                picaso_selrow['rowID'] = r
-                selectSegList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_selrow) )
-                # selection instruction is compiled but will not be queued until a valid write is found: llSegment.append(selectSegList)
-                # Write data to the given register
-                isFirstWrite = True
-                ptrReg = self.picaso_as.makeRegAddr(instrDict['reg'])   # get the register base address
-                assert len(bram) == self.picaso_as.regWidth, f'BRAM image for loadVecCol contains unexpected no. of rows: {len(bram)} != {self.picaso_as.regWidth}'
-                for data in bram:
-                    # Write the data if non-zero (this optimizaiton assumes the register has been already cleared calling mv_macroClearReg)
-                    if data != 0:
-                        # Select the row if a non-zero data is found for the first time
-                        if isFirstWrite: 
-                            llSegment.append(selectSegList)
-                            isFirstWrite = False
-                        picaso_write['addr'] = ptrReg
-                        picaso_write['data'] = data
-                        segList = self.gemv_seg2list( self.picaso_as.genMachineCode(picaso_write) )
-                        llSegment.append(segList)
-                    ptrReg += 1     # point to the next bit of the register
+            bramCol = self.makeBramColImage(instrDict['vector'])
+            selWords = picaso_as.encodeBatch('select', fncode='sel_row', rowID=np.arange(len(bramCol)), colID=0)
+            words = self.gemv_genImageWrites(bramCol, selWords, picaso_as.makeRegAddr(instrDict['reg']))
         else:
             assert 0, f'GEMV-array submodule does not implement a macro named: {macroName}'
-        return llSegment
+        return words
+
+
+    # Given the submodule name and the macro name, returns the word template of
+    # the macro as (words, relocs), where words is the expansion with all
+    # register fields set to 0, and relocs is a list of (field, delta) with the
+    # per-word increments for a unit step of that field. The expansion of the
+    # macro is linear in the register fields, so the deltas are found by
+    # expanding the macro once for each field set to 1.
+    def makeMacroTemplate(self, submName, macroName):
+        genMacro = self.gemv_genMacro if submName == 'mv' else self.vveng_genMacro
+        fields = self.tbl_macroTemplate[(submName, macroName)]
+        instrDict = {'submodule' : submName, 'macro' : macroName}
+        words = genMacro({**instrDict, **{key : 0 for key in fields}})
+        relocs = []
+        for field in fields:
+            unitWords = genMacro({**instrDict, **{key : int(key == field) for key in fields}})
+            relocs.append((field, unitWords - words))
+        return words, relocs
+
+
+    # Given an instruction dictionary (internal representation) of a macro
+    # listed in tbl_macroTemplate, returns the (30-bit) submodule instruction
+    # words by patching its register fields into the cached macro template.
+    # Templates are built on first use, and discarded when the parameters change.
+    def genMacroFromTemplate(self, instrDict):
+        key = (instrDict['submodule'], instrDict['macro'])
+        template = self.macroTemplates.get(key)
+        if template is None:
+            template = self.makeMacroTemplate(*key)
+            self.macroTemplates[key] = template
+        words, relocs = template
+        words = words.copy()
+        for field, delta in relocs:
+            words += delta * np.uint32(instrDict[field])
+        return words
+
+
+    # Given an instruction dictionary (internal representation) and its machine
+    # code words (e.g., from the build cache), returns the assembly dictionary
+    # in the same format as genMachineCode()
+    def makeAssembly(self, instrDict, words):
+        submCode = self.tbl_submCode[instrDict['submodule']]
+        if submCode < 0: instrType = 'pseudo'
+        elif 'macro' in instrDict: instrType = 'macro'
+        else: instrType = 'builtin'
+        return {'submCode' : submCode, 'type' : instrType, 'words' : words}
 
 
     # Given an instruction dictionary (internal representation), Returns the
-    # machine code as a dictionary of instruction-word segments (assembly)
-    # The format of assembly: {
+    # machine code as an assembly dictionary. The format of assembly: {
     #   'submCode' : num, 
-    #   'type': macro/builtin/pseudo,    # indicates if this is a macro, built-in, or pseudo instruction
-    #   'submSegments': [list of (code, code-width)]/None,  # None if type != instr, list of encoded segments of built-in instruction of the submodule
-    #   'submWordList': [list of submSegments]/None,        # None if type != macro, list of (ordered list of segment encoding) of macro instruction for the submodule
+    #   'type'  : macro/builtin/pseudo,  # indicates if this is a macro, built-in, or pseudo instruction
+    #   'words' : np.uint32 array,       # 32-bit instruction words, [sub-module-code][sub-module-instruction]
+    #                                    # one word for built-ins, all words of the expanded macro, empty for pseudo
     # }
     def genMachineCode(self, instrDict):
         submName = instrDict['submodule']
         submCode = self.tbl_submCode[submName]
-        if submCode < 0: return {'submCode' : submCode, 'type' : 'pseudo'}   # no machine code is generated for dummy submodule
+        if submCode < 0:    # no machine code is generated for dummy submodule
+            return {'submCode' : submCode, 'type' : 'pseudo', 'words' : np.zeros(0, dtype=np.uint32)}
         isMacro  = 'macro' in instrDict     # check if it's a macro
         instrType = 'macro' if isMacro else 'builtin'
-        if submName == 'mv':
-            if isMacro:
-                submSegments = None
-                submWordList = self.gemv_genMacro(instrDict)
-            else:
-                segDict = self.picaso_as.genMachineCode(instrDict['ir'])
-                submSegments = self.gemv_seg2list(segDict)  # get ordered list of segments
-                submWordList = None     # not a macro
+        if isMacro and (submName, instrDict['macro']) in self.tbl_macroTemplate:
+            submWords = self.genMacroFromTemplate(instrDict)
+        elif submName == 'mv':
+            if isMacro: submWords = self.gemv_genMacro(instrDict)
+            else: submWords = [self.picaso_as.encodeWord(instrDict['ir'])]
         elif submName == 'vv':
-            if isMacro:
-                submSegments = None
-                submWordList = self.vveng_genMacro(instrDict)
-            else:
-                segDict = self.vvblock_as.genMachineCode(instrDict['ir'])
-                submSegments = self.vveng_seg2list(segDict)  # get ordered list of segments
-                submWordList = None     # not a macro
+            if isMacro: submWords = self.vveng_genMacro(instrDict)
+            else: submWords = [self.vvblock_as.encodeWord(instrDict['ir'])]
         else:
             if submName in self.tbl_submCode:
                 assert 0, f'Submodule code generation not implemented yet, sumbName: {submName}'
             else:
                 assert 0, f'Invalid sub-module, sumbName: {submName}'
-        # build the word dictionary and return
+        # prepend the submodule code to the submodule instruction words
+        words = np.array(submWords, dtype=np.uint32) | np.uint32(submCode << self.tbl_field_width['submInstr'])
+        # build the assembly dictionary and return
         assembly = {
             'submCode' : submCode, 
             'type'     : instrType, 
-            'submSegments' : submSegments, 
-            'submWordList' : submWordList,
+            'words'    : words,
         }
         return assembly
 
@@ -532,54 +667,145 @@ class DavinciAsm:
     # Given an instruction assembly, returns a list of binary encoding strings
     # with optional separator between instruction segments
     def makeBinWord(self, assembly, sep=''):
-        instrType  = assembly['type']
-        submcode   = assembly['submCode']
-        w_submcode = self.tbl_field_width['submCode']
-        # build the binary encoding string
-        if instrType == 'builtin':
-            binword = [f'{submcode:0{w_submcode}b}']
-            for code, w_code in assembly['submSegments']:
-                binword.append(f'{code:0{w_code}b}')
-            return [sep.join(binword)]    # returns a list of single string
-        # build a list of binary encoding strings of the macro instruction
-        elif instrType == 'macro':
-            macro_words = []
-            for seglist in assembly['submWordList']:
-                binword = [f'{submcode:0{w_submcode}b}']
-                for code, w_code in seglist:
-                    binword.append(f'{code:0{w_code}b}')
-                macro_words.append(sep.join(binword))
-            return macro_words  # returns a list of strings
-        else:
-            assert 0, f'Invalid assembly type: {assembly["type"]}'
+        instrType = assembly['type']
+        assert instrType in {'builtin', 'macro'}, f'Invalid assembly type: {assembly["type"]}'
+        w_totinstr = self.tbl_field_width['submCode'] + self.tbl_field_width['submInstr']
+        segBounds  = self.tbl_seg_bounds[assembly['submCode']]
+        # build the binary encoding string of each word: returns a list of
+        # single string for built-ins, a list of strings for macros
+        binwords = []
+        for word in assembly['words'].tolist():
+            bits = f'{word:0{w_totinstr}b}'
+            binwords.append(sep.join([bits[lo:hi] for lo, hi in segBounds]))
+        return binwords
 
 
     # Given an instruction assembly, returns a list of hex encoding strings
     # with optional indent and suffix
     def makeHexWord(self, assembly, suffix='', indent=''):
         instrType   = assembly['type']
-        submcode    = assembly['submCode']
+        assert instrType in {'builtin', 'macro'}, f'Invalid assembly type: {assembly["type"]}'
         w_submcode  = self.tbl_field_width['submCode']
         w_subminstr = self.tbl_field_width['submInstr']
         w_totinstr  = w_submcode + w_subminstr
         w_hexinstr  = int(math.ceil(w_totinstr/4))  # width of the hex instruction string
-        # build the binary encoding string
-        if instrType == 'builtin':
-            word = submcode
-            for code, w_code in assembly['submSegments']:
-                word = (word << w_code) | code
-            return [f'{indent}0x{word:0{w_hexinstr}X}{suffix}']    # returns a list of single string
-        # build a list of binary encoding strings of the macro instruction
-        elif instrType == 'macro':
-            macro_words = []
-            for seglist in assembly['submWordList']:
-                word = submcode
-                for code, w_code in seglist:
-                    word = (word << w_code) | code
-                macro_words.append(f'{indent}0x{word:0{w_hexinstr}X}{suffix}')
-            return macro_words  # returns a list of strings
-        else:
-            assert 0, f'Invalid assembly type: {assembly["type"]}'
+        # build the hex encoding string of each word: returns a list of
+        # single string for built-ins, a list of strings for macros
+        return [f'{indent}0x{word:0{w_hexinstr}X}{suffix}' for word in assembly['words'].tolist()]
+
+
+    # Bulk formatter: given the machine code words (np.uint32 array) of the
+    # program, returns the binary encoding strings of all words as a character
+    # matrix (np.uint8, one row per word), with the separator between the
+    # instruction segments (same text as makeBinWord())
+    def formatBinWords(self, words, sep=''):
+        w_totinstr = self.tbl_field_width['submCode'] + self.tbl_field_width['submInstr']
+        shifts = np.arange(w_totinstr-1, -1, -1, dtype=np.uint32)
+        bits = ((words[:, None] >> shifts) & 1).astype(np.uint8) + ord('0')
+        sepChars = np.frombuffer(sep.encode(), dtype=np.uint8)
+        chars = np.concatenate([bits, np.broadcast_to(sepChars, (len(words), len(sepChars)))], axis=1)
+        sepCols = list(range(w_totinstr, w_totinstr + len(sepChars)))   # columns of the separator in chars
+        # gather the segments of each submodule, with separators in between
+        segCounts = {len(segBounds) for segBounds in self.tbl_seg_bounds.values()}
+        assert len(segCounts) == 1, 'All submodules must have the same no. of instruction segments'
+        rowWidth = w_totinstr + (segCounts.pop()-1) * len(sepChars)
+        out = np.empty((len(words), rowWidth), dtype=np.uint8)
+        submCodes = words >> self.tbl_field_width['submInstr']
+        for submCode, segBounds in self.tbl_seg_bounds.items():
+            cols = []
+            for lo, hi in segBounds:
+                if cols: cols += sepCols
+                cols += range(lo, hi)
+            rows = submCodes == submCode
+            out[rows] = chars[rows][:, cols]
+        return out
+
+
+    # Bulk formatter: given the machine code words (np.uint32 array) of the
+    # program, returns the hex encoding strings of all words as a character
+    # matrix (np.uint8, one row per word), with the indent and suffix (same
+    # text as makeHexWord())
+    def formatHexWords(self, words, suffix='', indent=''):
+        w_totinstr = self.tbl_field_width['submCode'] + self.tbl_field_width['submInstr']
+        w_hexinstr = int(math.ceil(w_totinstr/4))  # width of the hex instruction string
+        shifts = np.arange(4*(w_hexinstr-1), -1, -4, dtype=np.uint32)
+        digits = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)[(words[:, None] >> shifts) & 0xF]
+        prefix = np.frombuffer(f'{indent}0x'.encode(), dtype=np.uint8)
+        suffix = np.frombuffer(suffix.encode(), dtype=np.uint8)
+        return np.concatenate([np.broadcast_to(prefix, (len(words), len(prefix))), digits,
+                               np.broadcast_to(suffix, (len(words), len(suffix)))], axis=1)
+
+
+    # Given the formatted words of the assembled program (character matrix, see
+    # formatBinWords()/formatHexWords()), returns the program text: one line per
+    # word, with the meta information of the instructions merged in (same text
+    # as makeExportBinText()/makeExportHexText()/makeExportPseudoText()).
+    # Each instruction is handled with a few slices of the text of all words,
+    # and nothing is merged if comment and source are both disabled.
+    def makeBulkProgText(self, charMat, comment, source, indent=''):
+        wordCnt, width = charMat.shape
+        lineLen = width + 1
+        lines = np.empty((wordCnt, lineLen), dtype=np.uint8)
+        lines[:, :width] = charMat
+        lines[:, width] = ord('\n')
+        wordText = lines.tobytes()
+        if not comment and not source: return wordText.decode()     # no meta information to merge
+        wordStart = self.instructions.getWordStart().tolist() + [wordCnt]
+        out = []
+        for idx, instr in enumerate(self.instructions):
+            instrType = instr['assembly']['type']
+            if instrType == 'pseudo':
+                outxt = self.makeExportPseudoText(instr, addCmt=comment, addSrc=source, indent=indent)
+                if outxt: out.append((outxt + '\n').encode())
+                continue
+            start, end = wordStart[idx], wordStart[idx+1]
+            inlnCmt = self.makeInstrMetaInfo(instr, comment, source)
+            if instrType == 'macro':
+                if comment: out.append((indent + self.makeComment('---- MACRO: ' + inlnCmt) + '\n').encode())
+                if start < end: out.append(wordText[start*lineLen:end*lineLen])
+                elif comment: out.append(b'\n')     # empty line for a macro without words
+                if comment: out.append((indent + self.makeComment('---- End of MACRO') + '\n').encode())
+            elif inlnCmt:
+                out.append(wordText[start*lineLen:end*lineLen-1] + ('  ' + self.makeComment(inlnCmt) + '\n').encode())
+            else:
+                out.append(wordText[start*lineLen:end*lineLen])
+        return b''.join(out).decode()
+
+
+    # Bit-plane transpose engine: given a 2D-array of (fixed-point) integers that
+    # maps to the conceptual layout of the PE-array, returns the bit-level
+    # transposed images of all BRAM blocks (columnal layout) in one vectorized
+    # pass. The output is a uint16 array of shape (blockRows, blockCols, regWidth),
+    # where bit peNo of image[r, c, bitNo] is bit bitNo of PE peNo in block (r, c).
+    # Columns are zero-padded to a multiple of the no. of PEs in a block.
+    def makeBramImage(self, mat):
+        peCount = self.picaso_as.peCount
+        regWidth = self.picaso_as.regWidth
+        assert peCount <= 16, f'BRAM images are stored as uint16, peCount ({peCount}) is too big'
+        mat = np.asarray(mat, dtype=np.int64)
+        assert mat.ndim == 2, f'Expected a 2D-array, got an array of shape {mat.shape}'
+        rowCnt, colCnt = mat.shape
+        blkCols = -(-colCnt // peCount)     # no. of blocks needed per row (ceiling)
+        # zero-pad the columns to fill the last block, then split the columns into blocks
+        padded = np.zeros((rowCnt, blkCols*peCount), dtype=np.int64)
+        padded[:, :colCnt] = mat
+        blocks = padded.reshape(rowCnt, blkCols, peCount)
+        # extract all bit-planes: bits[r, c, bitNo, peNo] (2's complement bits of negative values)
+        bitNo = np.arange(regWidth, dtype=np.int64).reshape(-1, 1)
+        bits = (blocks[:, :, np.newaxis, :] >> bitNo) & 1
+        # put each PE bit into its rightful place in the BRAM row
+        peShift = np.arange(peCount, dtype=np.int64)
+        image = (bits << peShift).sum(axis=-1)
+        return image.astype(np.uint16)
+
+
+    # Given a column-vector that maps to the conceptual layout of the PE-column,
+    # returns the (blockRows, regWidth) array of bram images. Each vector element
+    # is copied into all PEs of the corresponding row of the PIM block.
+    def makeBramColImage(self, vec):
+        peCount = self.picaso_as.peCount
+        mat = np.repeat(np.reshape(vec, (-1, 1)), peCount, axis=1)
+        return self.makeBramImage(mat)[:, 0]
 
 
     # Given an array of numbers <= to the no. of PEs in a block,
@@ -587,49 +813,26 @@ class DavinciAsm:
     def makePe2BramBlock(self, block):
         arrLen = len(block)
         peCount = self.picaso_as.peCount
-        regWidth = self.picaso_as.regWidth
         assert len(block) <= peCount, f'Given block has more elements ({arrLen}) than PEs in a PiCaSO block ({peCount})'
-        outArr = [0] * regWidth
-        # transpose the bits
-        for bitNo in range(regWidth):
-            for peNo in range(arrLen):
-                peBit = (block[peNo] >> bitNo) & 1   # extract the bit from the pe-register
-                outArr[bitNo] |= peBit << peNo       # put the bit into its rightful place in BRAM row
-        return outArr
+        return self.makeBramImage([block])[0, 0].tolist()
 
 
     # Given a row-vector that maps to the conceptual layout of the PE-row
     # returns the corresponding array of bram images.
     def makePe2BramVec(self, vec):
-        outBramArr = []
-        peCount = self.picaso_as.peCount
-        upbound = len(vec)
-        for i in range(0, len(vec), peCount):
-            eslice = min(upbound, i+peCount)    # end of slice
-            block = vec[i:eslice]
-            outBramArr.append(self.makePe2BramBlock(block))
-        return outBramArr
+        return self.makeBramImage([vec])[0].tolist()
 
 
     # Given a column-vector that maps to the conceptual layout of the PE-column
     # returns the corresponding array of bram images.
     def makePe2BramColVec(self, vec):
-        outBramArr = []
-        peCount = self.picaso_as.peCount
-        for i in range(len(vec)):
-            block = [vec[i]] * peCount   # Meaning: select an vector element, copy into all PEs in the row of the PIM block
-            outBramArr.append(self.makePe2BramBlock(block))
-        return outBramArr
+        return self.makeBramColImage(vec).tolist()
 
 
     # Given a matrix that maps to the conceptual layout of the PE-array
     # returns the corresponding 2D array of bram images.
     def makePe2BramMat(self, mat):
-        outBramArr = []     # array of BRAM rows
-        for row in mat:
-            bramRow = self.makePe2BramVec(row)
-            outBramArr.append(bramRow)
-        return outBramArr
+        return self.makeBramImage(mat).tolist()
 
 
 
@@ -643,6 +846,9 @@ class DavinciAsm:
     #               if set to None, matrix/vector bound checking will be disabled.
     #   mvResvRegCnt: Registers (mvRegCnt, mvRegCnt+mvResvReg-1) are reserved to be freely used by the assembler.
     def setupParams(self, mvRegCnt=16, vvRegCnt=256, regWidth=16, maxLevel=3, maxFold=4, idWidth=8, fracWidth=0, mvBlockDim=None, mvResvRegCnt=0, actCount=3):
+        # save the parameters, e.g., for setting up the assemblers of the process pool
+        self.params = dict(mvRegCnt=mvRegCnt, vvRegCnt=vvRegCnt, regWidth=regWidth, maxLevel=maxLevel, maxFold=maxFold,
+                           idWidth=idWidth, fracWidth=fracWidth, mvBlockDim=mvBlockDim, mvResvRegCnt=mvResvRegCnt, actCount=actCount)
         # set up picaso instruction parameters
         assert mvRegCnt <= 60, "This initial version only supports upto 60 16-bit user registers"   # TODO: Adjust these assertion
         assert regWidth == 16, "This initial version only supports 16-bit registers"                # when more precisions are supported
@@ -677,12 +883,25 @@ class DavinciAsm:
         else:
             self.mvResvRegBase = None     # no reserved registers
             self.mvResvRegCnt  = 0
+        # bounds of the instruction-word segments in the binary encoding string
+        w_submcode = self.tbl_field_width['submCode']
+        self.tbl_seg_bounds = {}
+        for submName, subm_as in [('mv', self.picaso_as), ('vv', self.vvblock_as)]:
+            segWidths = [w_submcode] + [subm_as.tbl_field_width[seg] for seg in ('seg2', 'seg1', 'seg0')]
+            segEnds = np.cumsum(segWidths).tolist()
+            self.tbl_seg_bounds[self.tbl_submCode[submName]] = list(zip([0] + segEnds[:-1], segEnds))
+        # macro templates depend on the parameters, rebuild them on demand
+        self.macroTemplates = {}
+        # instructions encoded with the previous parameters must be encoded again
+        self.asmMark = 0
+        self.isAssembled = False
 
 
     # Sets up assembler parameters from a YAML file
     def loadParams(self, filepath, cpright=True, showparams=True):
         if cpright: self.printCopyright()     # by default prints the copyright notice
         # set up assembler parameters from the given file
+        import yaml     # only needed for loading parameter files
         with open(filepath, 'r') as fconf: params = yaml.safe_load(fconf)
         self.setupParams(**params)    # unpack dictionary as function parameters
         # by default print the loaded parameters
@@ -694,21 +913,228 @@ class DavinciAsm:
 
     # Resets the internal state for a fresh new program, preserving the assembler parameters
     def reset(self):
-        self.instructions = []     # clear instruction cache
+        assert self.stream is None, 'Reset invoked in streaming mode, call closeStream() first'
         self.isAssembled = False   # unset assemble flag
         self.picaso_as.reset()     # reset PiCaSO assembler instance
         self.vvblock_as.reset()    # reset VV-Engine assembler instance
+        self.instructions = self.makeInstrStore()   # clear instruction cache
+        if self.regTracker: self.regTracker.reset()
+
+
+    # Selects the backend of the instruction store. Instructions added so far
+    # are moved to the new store (they need to be assembled again).
+    # Backends:
+    #   list     : (default) keeps each instruction as a dictionary, as returned by the mnemonic functions
+    #   columnar : keeps the instructions in compact array columns (DavinciInstrStore), for long programs
+    def setInstrStore(self, backend='list'):
+        assert backend in self.tbl_instrStore, f'Invalid instruction store: {backend}, valid options: {set(self.tbl_instrStore)}'
+        assert self.stream is None, 'Instruction store cannot be changed in streaming mode, call closeStream() first'
+        assert not self.schedMark, 'Instruction store of a scheduled program cannot be changed, call reset() first'
+        instructions = self.instructions
+        self.instrStore = backend
+        self.instructions = self.makeInstrStore()
+        for instr in instructions: self.instructions.append(instr)
+        self.isAssembled = False
+
+
+    # Returns an empty instruction store for the selected backend
+    def makeInstrStore(self):
+        self.asmMark = 0    # high-water mark of assemble(): no. of instructions (from the start) encoded
+        self.schedMark = 0  # no. of instructions (from the start) reordered by scheduleAssembly()
+        self.buildKey = None    # build-cache key of the assembled program
+        assert self.instrStore in self.tbl_instrStore, f'Invalid instruction store: {self.instrStore}'
+        if self.instrStore == 'list':
+            # submodule assemblers keep their own copies of the instructions
+            self.picaso_as.instructions = []
+            self.vvblock_as.instructions = []
+            return DavinciInstrList()
+        # The columnar store keeps all the information needed for assembling,
+        # so the copies in the submodule assemblers are discarded
+        self.picaso_as.instructions = InstrSink()
+        self.vvblock_as.instructions = InstrSink()
+        submNames = {code : name for name, code in self.tbl_submCode.items()}
+        return DavinciInstrStore(submNames)
+
+
+    # Compiles the instructions into machine code fields for exporting. Only the
+    # instructions added after the last run are encoded (see asmMark), unless
+    # the parameters have changed since then.
+    # Options:
+    #    verbose : if true, prints each instruction as it is encoded
+    #    workers : if > 1, the payload macros (tbl_poolMacro) are expanded in a
+    #              pool of that many processes; the output is identical to the serial run
+    #    full    : if true, encodes all instructions again
+    #    optimize: if true, runs the peephole optimizer on the words of all instructions (see optimizeAssembly)
+    #    schedule: if true, overlaps the MV and VV engines by reordering the words (see scheduleAssembly)
+    def assemble(self, verbose=False, workers=None, full=False, optimize=False, schedule=False):
+        assert self.stream is None, 'Assemble invoked in streaming mode, instructions are encoded as they are added'
+        if full: self.asmMark = 0
+        start = self.asmMark
+        assert start >= self.schedMark, 'Scheduled instructions cannot be encoded again, call reset() and rebuild the program'
+        newInstr = range(start, len(self.instructions))  # indices of the instructions to be encoded
+        # look up the program in the build cache
+        cacheHit = False
+        if self.buildCache:
+            self.buildKey = self.buildCache.makeKey(self.params, self.instructions)
+            cacheHit = self.loadCachedAssembly(newInstr)
+        if not cacheHit:
+            self.encodeInstructions(newInstr, verbose, workers)
+            if self.buildCache: self.buildCache.storeWords(self.buildKey, self.instructions.getWords(), self.instructions.getWordStart())
+        self.asmMark = len(self.instructions)
+        if cacheHit: print(f"INFO: {len(self.instructions)} instructions assembled (build cache hit)")
+        elif start: print(f"INFO: {len(self.instructions)} instructions assembled ({len(newInstr)} new)")
+        else: print(f"INFO: {len(self.instructions)} instructions assembled")
+        if optimize: self.optimizeAssembly()
+        if schedule: self.scheduleAssembly()
+        self.isAssembled = True
 
 
-    # Compiles the instructions into machine code fields for exporting
-    def assemble(self, verbose=False):
+    # Returns true if there are instructions that are not encoded yet, i.e., added
+    # after the last assemble() or encoded with the previous parameters
+    def hasPendingInstr(self):
+        return self.asmMark < len(self.instructions)
+
+
+    # Runs the peephole optimizer (see davinci_peephole.py) on the words of all
+    # assembled instructions, and keeps the remaining words of each instruction
+    # as its assembly. Returns the no. of words removed by each rule.
+    def optimizeAssembly(self):
+        from davinci_peephole import DavinciPeephole
+        words = self.instructions.getWords()
+        wordStart = self.instructions.getWordStart()
+        keep, saved = DavinciPeephole(self).optimize(words)
+        wordEnd = np.append(wordStart[1:], len(words))
+        dropCnt = np.concatenate([[0], np.cumsum(~keep)])
+        changed = np.flatnonzero(dropCnt[wordEnd] - dropCnt[wordStart])     # instructions with removed words
+        if len(changed):
+            # instructions are saved in order, from the first changed one
+            for idx in range(changed[0], len(wordStart)):
+                instrWords = words[wordStart[idx]:wordEnd[idx]][keep[wordStart[idx]:wordEnd[idx]]]
+                self.instructions.setAssembly(idx, self.makeAssembly(self.instructions[idx], instrWords))
+            self.buildKey = None    # the cached texts are of the words before optimization
+        details = ', '.join(f'{rule}: {cnt}' for rule, cnt in saved.items() if cnt)
+        print(f"INFO: peephole optimizer removed {len(words) - keep.sum()} of {len(words)} words" + (f" ({details})" if details else ''))
+        return saved
+
+
+    # Reorders the assembled words with the list scheduler (see davinci_sched.py),
+    # so that the MV and VV engines overlap. The words of an instruction may get
+    # interleaved with the words of others, so each instruction is split into
+    # fragments (runs of its words in the scheduled order) that keep its source
+    # and comment; instructions without words stay before the next instruction.
+    # The fragments cannot be encoded again.
+    # Options:
+    #    vvBlkCnt, clkFreq: same as estimateLatency()
+    # Returns the estimated cycles of the program (before, after) scheduling
+    def scheduleAssembly(self, vvBlkCnt=None, clkFreq=100):
+        if vvBlkCnt is None: vvBlkCnt = self.mvMaxRow
+        assert vvBlkCnt, 'No. of VV-Engine blocks is unknown; set mvBlockDim in the assembler parameters or specify vvBlkCnt'
+        from davinci_sched import DavinciScheduler
+        scheduler = DavinciScheduler(self, vvBlkCnt, clkFreq)
+        words = self.instructions.getWords()
+        wordStart = self.instructions.getWordStart()
+        order = scheduler.schedule(words)
+        before = scheduler.timing.simulateIssue(words)[1]
+        after = scheduler.timing.simulateIssue(words[order])[1]
+        if after >= before:
+            print(f"INFO: scheduler kept the program order ({before} cycles)")
+            return before, before
+        # split the instructions into the fragments of the scheduled order
+        instrCnt = len(wordStart)
+        owner = np.repeat(np.arange(instrCnt), np.diff(np.append(wordStart, len(words))))[order]
+        fragStart = np.flatnonzero(np.diff(owner, prepend=-1))
+        fragEnd = np.append(fragStart[1:], len(owner))
+        fragCnt = np.bincount(owner[fragStart], minlength=instrCnt)
+        # instructions without words are placed before the next instruction with words
+        hasWords = np.flatnonzero(fragCnt)
+        nextIdx = np.searchsorted(hasWords, np.arange(instrCnt))
+        pending = {}    # {instruction with words: [instructions without words before it]}
+        trailing = []
+        for idx in np.flatnonzero(fragCnt == 0).tolist():
+            if nextIdx[idx] < len(hasWords): pending.setdefault(int(hasWords[nextIdx[idx]]), []).append(idx)
+            else: trailing.append(idx)
+        instructions = self.instructions
+        self.instructions = self.makeInstrStore()
+        def addInstr(instr, instrWords):
+            self.instructions.append(instr)
+            self.instructions.setAssembly(len(self.instructions)-1, self.makeAssembly(instr, instrWords))
+        emptyWords = np.zeros(0, dtype=np.uint32)
+        partNo = np.zeros(instrCnt, dtype=np.int64)
+        for start, end in zip(fragStart.tolist(), fragEnd.tolist()):
+            idx = int(owner[start])
+            for other in pending.pop(idx, []): addInstr(instructions[other], emptyWords)
+            instr = instructions[idx]
+            partNo[idx] += 1
+            if fragCnt[idx] > 1: instr = dict(instr, src=f"{instr['src']} [part {partNo[idx]}/{fragCnt[idx]}]")
+            addInstr(instr, words[order[start:end]])
+        for idx in trailing: addInstr(instructions[idx], emptyWords)
+        self.asmMark = self.schedMark = len(self.instructions)
+        if self.regTracker: self.regTracker.mark = len(self.instructions)   # same register contents
+        print(f"INFO: scheduler reduced the latency from {before} to {after} cycles ({before/after:.2f}x), "
+              f"{instrCnt} instructions split into {len(self.instructions)}")
+        return before, after
+
+
+    # Given the indices of the instructions, encodes them in order (see assemble() for the options)
+    def encodeInstructions(self, newInstr, verbose=False, workers=None):
         if verbose: print("INFO: Encoding instructions ...")
-        for instr in self.instructions:
+        poolCode = {}   # machine code of the macros expanded by the pool
+        if workers and workers > 1:
+            from davinci_pool import DavinciAsmPool     # multiprocessing is only needed here
+            macros = []
+            for idx in newInstr:
+                instr = self.instructions[idx]
+                if (instr['submodule'], instr.get('macro')) in self.tbl_poolMacro: macros.append((idx, instr))
+            if verbose: print(f"INFO: Expanding {len(macros)} macros using {workers} processes ...")
+            poolCode = DavinciAsmPool(self.params, workers).genMachineCode(macros)
+        for idx in newInstr:
+            instr = self.instructions[idx]
             if verbose: print(f"instr: {instr['src']}")
-            word = self.genMachineCode(instr)
-            instr['assembly'] = word
-        print(f"INFO: {len(self.instructions)} instructions assembled")
-        self.isAssembled = True
+            word = poolCode.pop(idx) if idx in poolCode else self.genMachineCode(instr)
+            self.instructions.setAssembly(idx, word)
+
+
+    # Given the indices of the instructions, restores their assembly from the
+    # build cache entry of the program (buildKey). Returns False on a miss.
+    def loadCachedAssembly(self, newInstr):
+        cached = self.buildCache.loadWords(self.buildKey)
+        if cached is None: return False
+        words, wordStart = cached
+        wordEnd = np.append(wordStart[1:], len(words))
+        for idx in newInstr:
+            instrWords = words[wordStart[idx]:wordEnd[idx]]
+            self.instructions.setAssembly(idx, self.makeAssembly(self.instructions[idx], instrWords))
+        return True
+
+
+    # Enables the on-disk build cache. Programs are identified by a hash of the
+    # parameters and the instructions (including the payloads); on a hit,
+    # assemble() and the exporters reuse the cached words and texts.
+    # Options:
+    #    cacheDir : path of the cache directory
+    #    maxSize  : size bound of the cache in bytes, least recently used programs are evicted
+    def enableBuildCache(self, cacheDir='.davinci_cache', maxSize=256*2**20):
+        from davinci_buildcache import DavinciBuildCache
+        self.buildCache = DavinciBuildCache(cacheDir, maxSize)
+        self.buildKey = None
+
+
+    # Disables the build cache (the cache directory is kept)
+    def disableBuildCache(self):
+        self.buildCache = None
+        self.buildKey = None
+
+
+    # Given an exporter kind and its options, returns the cached text of the
+    # assembled program, None if not available
+    def loadCachedText(self, kind, options):
+        if not (self.buildCache and self.buildKey): return None
+        return self.buildCache.loadText(self.buildKey, kind, options)
+
+
+    # Saves the exported text of the assembled program in the build cache (if enabled)
+    def storeCachedText(self, kind, options, text):
+        if self.buildCache and self.buildKey: self.buildCache.storeText(self.buildKey, kind, options, text)
 
 
     # Exports the compiled instructions as program image for Verilog readmemb
@@ -718,27 +1144,26 @@ class DavinciAsm:
     #    source   : if true, appends the source instruction mnemonics as inline comment
     #    separator: Separator between instruction segments for easy reading
     def export_verilogBin(self, filename=None, comment=True, source=True, separator='_'):
+        assert self.stream is None, 'Export invoked in streaming mode, the outputs are written by closeStream()'
         # Run assembler if not already
-        if not self.isAssembled:
+        if self.hasPendingInstr():
             print("WARN: Export invoked before the code is assembled")
             print("INFO: Running assembler ...")
             self.assemble()
         # build output string
-        outprog = []
-        for instr in self.instructions:
-            if instr['assembly']['type'] == 'pseudo': 
-                outxt = self.makeExportPseudoText(instr, addCmt=comment, addSrc=source)
-            else: 
-                outxt = self.makeExportBinText(instr, addCmt=comment, addSrc=source, sep=separator)  # build the instruction text for executable instructions
-            if outxt: outprog.append(outxt)   # save the instruction text for writing
+        outprog = self.loadCachedText('bin', (comment, source, separator))
+        if outprog is None:
+            binWords = self.formatBinWords(self.instructions.getWords(), sep=separator)
+            outprog = self.makeBulkProgText(binWords, comment, source)
+            self.storeCachedText('bin', (comment, source, separator), outprog)
         # write the output
         if filename:
             with open(filename, 'w') as fout:
-                for txt in outprog: fout.write(txt+'\n')
+                fout.write(outprog)
             print(f"INFO: assembled program written to {filename}")
         else:
             print("---- Assembled Program ----")
-            for txt in outprog: print(txt)
+            print(outprog, end='')
             print("---- End of Program ----")
 
 
@@ -749,23 +1174,19 @@ class DavinciAsm:
     #    comment  : if true, appends user-comments as inline comment
     #    source   : if true, appends the source instruction mnemonics as inline comment
     def export_CprogHex(self, progname, filename=None, comment=True, source=True):
+        assert self.stream is None, 'Export invoked in streaming mode, the outputs are written by closeStream()'
         # Run assembler if not already
-        if not self.isAssembled:
+        if self.hasPendingInstr():
             print("WARN: Export invoked before the code is assembled")
             print("INFO: Running assembler ...")
             self.assemble()
         # build output string
-        instructions = []
-        for instr in self.instructions:
-            if instr['assembly']['type'] == 'pseudo':
-                outxt = self.makeExportPseudoText(instr, addCmt=comment, addSrc=source, indent=' '*4)
-            else:
-                outxt = self.makeExportHexText(instr, addCmt=comment, addSrc=source, word_suffix=', ', indent=' '*4)  # build the instruction text
-            if outxt: instructions.append(outxt)   # save the instruction text for writing
-        instructions = '\n'.join(instructions)
-        cprog = c_prog_template.substitute(instructions=instructions, progname=progname,
-                                   fracWidth=self.fracWidth, mvMaxRow=self.mvMaxRow, mvMaxCol=self.mvMaxCol,
-                                   regWidth=self.picaso_as.regWidth, idWidth=self.picaso_as.idWidth, peCount=self.picaso_as.peCount)
+        cprog = self.loadCachedText('cprog', (progname, comment, source))
+        if cprog is None:
+            hexWords = self.formatHexWords(self.instructions.getWords(), suffix=', ', indent=' '*4)
+            instructions = self.makeBulkProgText(hexWords, comment, source, indent=' '*4)[:-1]  # lines are joined with newlines
+            cprog = c_prog_template.substitute(instructions=instructions, **self.makeCprogParams(progname))
+            self.storeCachedText('cprog', (progname, comment, source), cprog)
         # write the output
         if filename:
             with open(filename, 'w') as fout:
@@ -778,6 +1199,52 @@ class DavinciAsm:
             print("---- End of Program ----")
 
 
+    # Given an assembled instruction, returns its text in the Verilog binary
+    # program (None if nothing is to be written)
+    def makeProgBinText(self, instr, comment, source, separator):
+        if instr['assembly']['type'] == 'pseudo':
+            return self.makeExportPseudoText(instr, addCmt=comment, addSrc=source)
+        return self.makeExportBinText(instr, addCmt=comment, addSrc=source, sep=separator)  # build the instruction text for executable instructions
+
+
+    # Given an assembled instruction, returns its text in the C-program (None
+    # if nothing is to be written)
+    def makeProgHexText(self, instr, comment, source):
+        if instr['assembly']['type'] == 'pseudo':
+            return self.makeExportPseudoText(instr, addCmt=comment, addSrc=source, indent=' '*4)
+        return self.makeExportHexText(instr, addCmt=comment, addSrc=source, word_suffix=', ', indent=' '*4)  # build the instruction text
+
+
+    # Returns the substitutions of the C-program template, except the instructions
+    def makeCprogParams(self, progname):
+        return dict(progname=progname, fracWidth=self.fracWidth, mvMaxRow=self.mvMaxRow, mvMaxCol=self.mvMaxCol,
+                    regWidth=self.picaso_as.regWidth, idWidth=self.picaso_as.idWidth, peCount=self.picaso_as.peCount)
+
+
+    # Returns the assembled program as a contiguous np.uint32 array of
+    # instruction words (in program order), without any text formatting
+    def words(self):
+        assert self.stream is None, 'Program words are not kept in streaming mode, use openStream(rawFile=...)'
+        # Run assembler if not already
+        if self.hasPendingInstr():
+            print("INFO: Running assembler ...")
+            self.assemble()
+        return self.instructions.getWords()
+
+
+    # Exports the compiled instructions as a raw binary program image: the
+    # 32-bit instruction words in little-endian order, without any header.
+    # If filename ends with .npy, the words are saved in NumPy format instead.
+    # Both can be memory-mapped for zero-copy loading, e.g.,
+    #   np.memmap(filename, dtype='<u4', mode='r')   # raw image
+    #   np.load(filename, mmap_mode='r')             # .npy
+    def export_rawBin(self, filename):
+        words = self.words().astype('<u4', copy=False)
+        if filename.endswith('.npy'): np.save(filename, words)
+        else: words.tofile(filename)
+        print(f"INFO: raw program image ({len(words)} words) written to {filename}")
+
+
     # Exports the header for C-programs
     def export_CprogHeader(self, filename=None):
         if filename:
@@ -791,6 +1258,185 @@ class DavinciAsm:
         pass
 
 
+    # Estimates the latency of the assembled program using the static timing
+    # model (see davinci_timing.py), and prints the cycles per instruction kind
+    # (macro or built-in opcode) and of the whole program.
+    # Options:
+    #    clkFreq  : clock frequency in MHz
+    #    vvBlkCnt : no. of VV-Engine blocks (shifted out after PARALLEL_EN), mvMaxRow if None
+    #    verbose  : if true, also prints the cycles of each instruction
+    #    report   : if false, the report is returned without printing
+    # Returns the report dictionary of DavinciTiming.estimate()
+    def estimateLatency(self, clkFreq=100, vvBlkCnt=None, verbose=False, report=True):
+        assert self.stream is None, 'Program words are not kept in streaming mode, latency cannot be estimated'
+        if vvBlkCnt is None: vvBlkCnt = self.mvMaxRow
+        assert vvBlkCnt, 'No. of VV-Engine blocks is unknown; set mvBlockDim in the assembler parameters or specify vvBlkCnt'
+        # Run assembler if not already
+        if self.hasPendingInstr():
+            print("INFO: Running assembler ...")
+            self.assemble()
+        from davinci_timing import DavinciTiming
+        timing = DavinciTiming(self, vvBlkCnt, clkFreq)
+        names, srcs = [], []
+        for instr in self.instructions:
+            if 'macro' in instr: names.append(f"{instr['submodule']}.{instr['macro']}")
+            elif 'ir' in instr: names.append(f"{instr['submodule']}.{instr['ir']['opcode']}")
+            else: names.append(instr['submodule'])
+            srcs.append(self.makeInstrMetaInfo(instr, addCmt=True, addSrc=True))
+        result = timing.estimate(self.instructions.getWords(), self.instructions.getWordStart(), names)
+        if report: timing.printReport(result, srcs if verbose else None)
+        return result
+
+
+    # Runs the assembled program on the functional simulator (see davinci_sim.py),
+    # which models the PiCaSO array and the VV-Engine blocks at the word level.
+    # Options:
+    #    expFile  : path of the expected-output file ($readmemb format of the testbenches), not written if None
+    #    bitLevel : if true, the PiCaSO blocks are simulated bit-serially on their BRAM images (DavinciBitSim)
+    # Returns the simulator, e.g., sim.getOutputs() gives the vectors shifted out to the FIFO
+    def simulate(self, expFile=None, bitLevel=False):
+        assert self.stream is None, 'Program words are not kept in streaming mode, the program cannot be simulated'
+        # Run assembler if not already
+        if self.hasPendingInstr():
+            print("INFO: Running assembler ...")
+            self.assemble()
+        from davinci_sim import DavinciSim, DavinciBitSim
+        sim = DavinciBitSim(self) if bitLevel else DavinciSim(self)
+        sim.run(self.instructions.getWords())
+        print(f"INFO: simulated {sim.wordCount} words, {len(sim.outputs)} output vector(s)")
+        if expFile: sim.export_expBin(expFile)
+        return sim
+
+
+    # Simulates the assembled program for a batch of input vectors at once (see
+    # simulate()). The batch items only differ in the vector loaded by the given
+    # MV_LOADVEC_ROW instruction, all other instructions are shared.
+    # Parameters:
+    #    instr    : the instruction returned by mv_LOADVEC_ROW(), or its index in the program
+    #    vectors  : (batch, vecLen) array of input vectors, same length as the vector of instr
+    #    bitLevel : same as simulate()
+    # Returns the simulator, sim.getOutputs() gives the outputs of all batch items as (batch, vvBlkCnt) arrays
+    def simulateBatch(self, instr, vectors, bitLevel=False):
+        assert self.stream is None, 'Program words are not kept in streaming mode, the program cannot be simulated'
+        # Run assembler if not already
+        if self.hasPendingInstr():
+            print("INFO: Running assembler ...")
+            self.assemble()
+        # find the instruction in the program
+        if isinstance(instr, dict):
+            matches = [idx for idx, other in enumerate(self.instructions)
+                       if other is instr or (other.get('macro') == 'loadVecRow' and instr.get('macro') == 'loadVecRow'
+                                             and other['reg'] == instr['reg'] and np.array_equal(other['vector'], instr['vector']))]
+            assert len(matches) == 1, f'Found {len(matches)} instructions matching the given MV_LOADVEC_ROW, use its index instead'
+            idx = matches[0]
+        else:
+            idx = instr
+        instr = self.instructions[idx]
+        assert instr.get('macro') == 'loadVecRow', f'Instruction {idx} is not an MV_LOADVEC_ROW: {instr["src"]}'
+        # words of the program, the words of the instruction are replaced with the batch words
+        words = self.instructions.getWords()
+        wordStart = self.instructions.getWordStart()
+        start = wordStart[idx]
+        end = wordStart[idx+1] if idx+1 < len(wordStart) else len(words)
+        batchWords = self.gemv_genBatchVecRow(instr, vectors)
+        from davinci_sim import DavinciSim, DavinciBitSim
+        simClass = DavinciBitSim if bitLevel else DavinciSim
+        sim = simClass(self, batch=len(vectors))
+        for part in [words[:start], batchWords, words[end:]]: sim.run(part)
+        print(f"INFO: simulated {sim.wordCount} words for {len(vectors)} inputs, {len(sim.outputs)} output vector(s)")
+        return sim
+
+
+
+    # ---- Streaming mode: each instruction is encoded as soon as it is added
+    #      and flushed through generator-based writers (sinks) to the output
+    #      files. Instructions are not kept, so the memory use stays bounded
+    #      no matter how long the program is. Use it as follows,
+    #   davinci_as.openStream(binFile='prog.bin', cFile='prog.c', progname='prog')
+    #   ... instruction mnemonics/macros ...
+    #   davinci_as.closeStream()
+
+    # Opens the streaming mode; the instructions added so far are streamed first.
+    # Options:
+    #    binFile  : path of the Verilog binary program (see export_verilogBin), not written if None
+    #    cFile    : path of the C-program (see export_CprogHex), not written if None
+    #    rawFile  : path of the raw binary program image (see export_rawBin, .npy is not supported), not written if None
+    #    progname : name of the program instance in the C-file, required if cFile is given
+    #    sinks    : additional (un-primed) generators, each receives the assembled instructions via send()
+    #    comment, source, separator: same as export_verilogBin()/export_CprogHex()
+    def openStream(self, binFile=None, cFile=None, progname=None, rawFile=None, sinks=(), comment=True, source=True, separator='_'):
+        assert self.stream is None, 'A stream is already open, call closeStream() first'
+        assert binFile or cFile or rawFile or sinks, 'No output specified for the stream'
+        assert not (rawFile and rawFile.endswith('.npy')), 'Raw program image cannot be streamed in .npy format'
+        assert progname or not cFile, 'progname is required for streaming a C-program'
+        pipeline = []
+        if binFile: pipeline.append(self.sink_verilogBin(binFile, comment, source, separator))
+        if cFile: pipeline.append(self.sink_CprogHex(cFile, progname, comment, source))
+        if rawFile: pipeline.append(self.sink_rawBin(rawFile))
+        pipeline.extend(sinks)
+        # switch to the streaming store (the sinks are primed there)
+        instructions = self.instructions
+        self.instructions = DavinciInstrStream(self.genMachineCode, pipeline)
+        self.picaso_as.instructions = InstrSink()   # submodule copies are not needed
+        self.vvblock_as.instructions = InstrSink()
+        self.stream = {'outputs' : [f for f in (binFile, cFile, rawFile) if f]}
+        for instr in instructions: self.instructions.append(instr)
+
+
+    # Closes the streaming mode, completing the output files. The assembler
+    # returns to the selected instruction store with an empty program.
+    def closeStream(self):
+        assert self.stream is not None, 'No stream is open, call openStream() first'
+        self.instructions.close()   # flush the sinks, closing the output files
+        print(f"INFO: {len(self.instructions)} instructions ({self.instructions.wordCount} words) streamed")
+        if self.instructions.aborted: print(f"WARN: the stream was aborted, the outputs are incomplete: {', '.join(self.stream['outputs'])}")
+        else:
+            for filename in self.stream['outputs']: print(f"INFO: assembled program written to {filename}")
+        self.stream = None
+        self.instructions = self.makeInstrStore()
+        self.isAssembled = False
+        if self.regTracker: self.regTracker.reset()    # streamed instructions are not tracked
+
+
+    # Generator-based writer of the Verilog binary program. Receives the
+    # assembled instructions via send() and writes their text to the file.
+    # The file is opened when primed and closed with the generator.
+    def sink_verilogBin(self, filename, comment=True, source=True, separator='_'):
+        with open(filename, 'w') as fout:
+            while True:
+                instr = yield
+                outxt = self.makeProgBinText(instr, comment, source, separator)
+                if outxt: fout.write(outxt+'\n')
+
+
+    # Generator-based writer of the raw binary program image. Receives the
+    # assembled instructions via send() and writes their words to the file (binary).
+    def sink_rawBin(self, filename):
+        with open(filename, 'wb') as fout:
+            while True:
+                instr = yield
+                fout.write(instr['assembly']['words'].astype('<u4', copy=False).tobytes())
+
+
+    # Generator-based writer of the C-program. Receives the assembled
+    # instructions via send() and writes their text to the file. The head of
+    # the program is written when primed, the tail when the generator is
+    # closed; an aborted stream (see DavinciInstrStream.abort) gets no tail.
+    def sink_CprogHex(self, filename, progname, comment=True, source=True):
+        with open(filename, 'w') as fout:
+            fout.write(c_prog_head.substitute())
+            sep = ''    # the instruction texts are joined with newlines
+            try:
+                while True:
+                    instr = yield
+                    outxt = self.makeProgHexText(instr, comment, source)
+                    if outxt:
+                        fout.write(sep + outxt)
+                        sep = '\n'
+            except GeneratorExit:
+                fout.write(c_prog_tail.substitute(**self.makeCprogParams(progname)))
+
+
 
 
     # ---- Instruction mnemonic functions: when called with parameters, encodes
@@ -1299,8 +1945,11 @@ class DavinciAsm:
         scaleFact = 1 << self.fracWidth
         matrix = np.array(matrix)    # create a deepcopy as numpy array
         matrix = (matrix*scaleFact).astype(int)   # convert to integer representation of fixed-point
+        # Reuse the tracked register contents, see enableRegTracking()
+        reused, needClear = self.trackLoad('mv', reg, 'loadMat', matrix, 'MV_LOADMAT')
+        if reused: return reused
         # Add dependencies
-        self.mv_macroClearReg(reg, comment='dependency of MV_LOADMAT')
+        if needClear: self.mv_macroClearReg(reg, comment='dependency of MV_LOADMAT')
         # Create a macro IR
         src = f'MV_LOADMAT Mat({matRowCnt}, {matColCnt})'
         instr = {
@@ -1314,7 +1963,10 @@ class DavinciAsm:
 
 
     # Given a 1D-array, generates instructions for loading it into the specified register of all PE rows
-    def mv_macroLoadVecRow(self, reg, vector, *, comment=None):
+    # If dense is set, all bit-rows of the vector are written, zeros included
+    # (see gemv_genDenseVecRowWrites()): the words do not depend on the values,
+    # so that they can be replayed with other vectors, and no clearing is needed.
+    def mv_macroLoadVecRow(self, reg, vector, *, comment=None, dense=False):
         # Validate parameters
         self.picaso_as.validateReg(reg)
         vecLen = len(vector)
@@ -1323,15 +1975,20 @@ class DavinciAsm:
         scaleFact = 1 << self.fracWidth
         vector = np.array(vector)    # create a deepcopy as numpy array
         vector = (vector*scaleFact).astype(int)    # convert to integer representation of fixed-point
-        # Add dependencies
-        self.mv_macroClearReg(reg, comment='dependency of MV_LOADVEC_ROW')
+        if not dense:
+            # Reuse the tracked register contents, see enableRegTracking()
+            reused, needClear = self.trackLoad('mv', reg, 'loadVecRow', vector, 'MV_LOADVEC_ROW')
+            if reused: return reused
+            # Add dependencies
+            if needClear: self.mv_macroClearReg(reg, comment='dependency of MV_LOADVEC_ROW')
         # Create a macro IR
-        src = f'MV_LOADVEC_ROW Vec({vecLen})'
+        src = f'MV_LOADVEC_ROW Vec({vecLen})' + (' dense' if dense else '')
         instr = {
             'submodule' : 'mv', 'macro' : 'loadVecRow',
             'reg' : reg, 'vector' : vector,    # save the fixed-point vector for assemble() phase
             'comment' : comment, 'src' : src
         }
+        if dense: instr['dense'] = 1
         self.instructions.append(instr)
         self.isAssembled = False        # un-assembled instruction added
         return instr
@@ -1347,8 +2004,11 @@ class DavinciAsm:
         scaleFact = 1 << self.fracWidth
         vector = np.array(vector)    # create a deepcopy as numpy array
         vector = (vector*scaleFact).astype(int)    # convert to integer representation of fixed-point
+        # Reuse the tracked register contents, see enableRegTracking()
+        reused, needClear = self.trackLoad('mv', reg, 'loadVecCol', vector, 'MV_LOADVEC_COL')
+        if reused: return reused
         # Add dependencies
-        self.mv_macroClearReg(reg, comment='dependency of MV_LOADVEC_COL')
+        if needClear: self.mv_macroClearReg(reg, comment='dependency of MV_LOADVEC_COL')
         # Create a macro IR
         src = f'MV_LOADVEC_COL Vec({vecLen})'
         instr = {
@@ -1418,8 +2078,11 @@ class DavinciAsm:
         scaleFact = 1 << self.fracWidth
         vector = np.array(vector)    # create a deepcopy as numpy array
         vector = (vector*scaleFact).astype(int)    # convert to integer representation of fixed-point
+        # Reuse the tracked register contents, see enableRegTracking()
+        reused, needClear = self.trackLoad('vv', reg, 'loadVec', vector, 'VV_LOADVEC')
+        if reused: return reused
         # Add dependencies
-        self.vv_macroClearReg(reg, comment='dependency of VV_LOADVEC')
+        if needClear: self.vv_macroClearReg(reg, comment='dependency of VV_LOADVEC')
         # Create a macro IR
         src = f'VV_LOADVEC Vec({vecLen})'
         instr = {
@@ -1442,14 +2105,34 @@ class DavinciAsm:
 #   from davinci_assembler import *
 #
 #   davinci_as.setupParams(...)
+#   davinci_as.setInstrStore('columnar')    # optional, compact store for long programs
+#   davinci_as.enableBuildCache()           # optional, reuses the outputs of unchanged programs
+#   davinci_as.enableWeightCache()          # optional, reuses the images of repeated weight matrices
+#   davinci_as.enableRegTracking()          # optional, skips redundant register clears and loads
+#   ra = davinci_as.regAllocator()          # optional, virtual registers: ra.mv_MULT(ra.mvReg(), ...), then ra.allocate()
+#   davinci_as.gemvTiler().addGemv(M, V)    # matrix @ vector for matrices larger than the PiCaSO array
+#   davinci_as.modelFrontend().compile(layers, inputs)  # whole models (davinci_frontend.Dense/LSTMCell/GRUCell)
+#   ws = davinci_as.weightStationary(); ws.build(M, B)   # weights loaded once, per-vector section replayed by the host
 #
 #   add(rd, rs1, rs2)
 #   sub(rd, rs1, rs2)
 #     .
 #     .
 #     .
-#   davinci_as.assemble(flags...)
+#   davinci_as.assemble(flags...)          # optimize=True runs the peephole optimizer after macro expansion
+#                                          # schedule=True overlaps the MV and VV engines (estimated latency before/after)
 #   davinci_as.export_verilogBin(filename, flags...)
+#   davinci_as.export_rawBin(filename)     # raw image of the words, also available as davinci_as.words()
+#   davinci_as.estimateLatency(clkFreq)    # static estimate of the cycles and latency of the program
+#   davinci_as.simulate(expFile)           # functional simulation, writes the expected outputs
+#   davinci_as.simulateBatch(instr, vecs)  # functional simulation for a batch of MV_LOADVEC_ROW inputs
+#
+# or, for long programs, in streaming mode (outputs are written as instructions are added)
+#   davinci_as.openStream(binFile=filename, cFile=cfilename, progname=cprogname)
+#   add(rd, rs1, rs2)
+#     .
+#     .
+#   davinci_as.closeStream()
 
 # Assembler object
 davinci_as = DavinciAsm()
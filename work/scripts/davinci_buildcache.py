@@ -0,0 +1,192 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the content-addressed build cache of DavinciAsm.      #
+#   A program is identified by a hash of the assembler parameters, the           #
+#   assembler sources, and the canonical instruction stream (including the       #
+#   matrix/vector payload bytes). The machine code words and the exported texts  #
+#   of a program are stored under the cache directory; the least recently used   #
+#   entries are evicted to keep the cache within its size bound.                 #
+#                                                                                #
+#================================================================================#
+
+import hashlib
+import os
+import shutil
+import numpy as np
+
+
+
+# Given a hash object and a value (instruction dictionary or one of its
+# fields), updates the hash with a canonical encoding of the value. Dictionary
+# keys are sorted, NumPy scalars are hashed as Python numbers, and the arrays
+# are hashed by their dtype, shape and bytes.
+def updateHash(h, val):
+    if isinstance(val, dict):
+        h.update(b'{')
+        for key in sorted(val):
+            h.update(repr(key).encode())
+            updateHash(h, val[key])
+        h.update(b'}')
+    elif isinstance(val, np.ndarray) and val.dtype != object:
+        h.update(f'array({val.dtype.str}, {val.shape})'.encode())
+        h.update(np.ascontiguousarray(val).tobytes())
+    elif isinstance(val, (list, tuple, np.ndarray)):
+        h.update(b'[')
+        for item in val: updateHash(h, item)
+        h.update(b']')
+    elif isinstance(val, np.generic):
+        h.update(repr(val.item()).encode())
+    else:
+        h.update(repr(val).encode())
+    h.update(b';')
+
+
+
+# The cache directory holds one sub-directory per program (entry), named by
+# its key, with the following files,
+#   words.npz   : machine code words of the program and the start of each instruction
+#   <kind>-<options-hash>.txt : exported texts, see makeTextName()
+# The modification time of an entry is its last use, for LRU eviction.
+class DavinciBuildCache:
+    # Source files of the assembler, a change in these invalidates the cache
+    srcFiles = ['davinci_assembler.py', 'davinci_instrstore.py', 'picaso_assembler.py', 'vvengine_assembler.py']
+
+
+    # Parameters:
+    #   cacheDir : path of the cache directory, created if it does not exist
+    #   maxSize  : size bound of the cache in bytes
+    def __init__(self, cacheDir, maxSize):
+        self.cacheDir = cacheDir
+        self.maxSize  = maxSize
+        os.makedirs(cacheDir, exist_ok=True)
+        # digest of the assembler sources
+        h = hashlib.sha256()
+        srcDir = os.path.dirname(os.path.abspath(__file__))
+        for fname in self.srcFiles:
+            with open(os.path.join(srcDir, fname), 'rb') as fsrc: h.update(fsrc.read())
+        self.srcDigest = h.digest()
+
+
+    # Given the assembler parameters and the instructions, returns the key
+    # (hex digest) of the program. The assembly and the comment/source of the
+    # submodule IR (not exported) are not part of the canonical instruction,
+    # so the key does not depend on the instruction store backend.
+    def makeKey(self, params, instructions):
+        h = hashlib.sha256(self.srcDigest)
+        updateHash(h, params)
+        for instr in instructions:
+            canon = {key : val for key, val in instr.items() if key != 'assembly'}
+            if 'ir' in canon: canon['ir'] = {key : val for key, val in canon['ir'].items() if key not in {'comment', 'src'}}
+            updateHash(h, canon)
+        return h.hexdigest()
+
+
+    # Returns the path of the given file of an entry
+    def makePath(self, key, fname=''):
+        return os.path.join(self.cacheDir, key, fname)
+
+
+    # Marks the entry as the most recently used
+    def touch(self, key):
+        os.utime(self.makePath(key))
+
+
+    # Given the key of a program, returns (words, wordStart) of its machine
+    # code, None if it is not in the cache
+    def loadWords(self, key):
+        fpath = self.makePath(key, 'words.npz')
+        if not os.path.isfile(fpath): return None
+        with np.load(fpath) as data: words, wordStart = data['words'], data['wordStart']
+        self.touch(key)
+        return words, wordStart
+
+
+    # Saves the machine code of a program: words (np.uint32 array) of all
+    # instructions and the start of each instruction in words
+    def storeWords(self, key, words, wordStart):
+        os.makedirs(self.makePath(key), exist_ok=True)
+        self.writeFile(key, 'words.npz', lambda fout: np.savez(fout, words=words, wordStart=wordStart))
+
+
+    # Returns the file name of an exported text, given the exporter kind
+    # (e.g., bin, cprog) and its options
+    def makeTextName(self, kind, options):
+        return f'{kind}-{hashlib.sha1(repr(options).encode()).hexdigest()[:16]}.txt'
+
+
+    # Given the key of a program, the exporter kind and its options, returns
+    # the exported text, None if it is not in the cache
+    def loadText(self, key, kind, options):
+        fpath = self.makePath(key, self.makeTextName(kind, options))
+        if not os.path.isfile(fpath): return None
+        with open(fpath, 'r') as fin: text = fin.read()
+        self.touch(key)
+        return text
+
+
+    # Saves an exported text of a program. The entry must exist (see storeWords()).
+    def storeText(self, key, kind, options, text):
+        if not os.path.isdir(self.makePath(key)): return    # evicted, or the words were never stored
+        self.writeFile(key, self.makeTextName(kind, options), lambda fout: fout.write(text.encode()))
+
+
+    # Writes a file of an entry using the given writer function, through a
+    # temporary file so that an interrupted write never leaves a partial file.
+    # The cache is trimmed to its size bound afterwards.
+    def writeFile(self, key, fname, writer):
+        fpath = self.makePath(key, fname)
+        with open(fpath + '.tmp', 'wb') as fout: writer(fout)
+        os.replace(fpath + '.tmp', fpath)
+        self.touch(key)
+        self.evict(keep=key)
+
+
+    # Removes the least recently used entries until the cache fits in maxSize.
+    # The entry named by keep is not removed.
+    def evict(self, keep=None):
+        entries = []
+        totSize = 0
+        for key in os.listdir(self.cacheDir):
+            entryDir = self.makePath(key)
+            if not os.path.isdir(entryDir): continue
+            size = sum(os.path.getsize(os.path.join(entryDir, f)) for f in os.listdir(entryDir))
+            entries.append((os.path.getmtime(entryDir), key, size))
+            totSize += size
+        for mtime, key, size in sorted(entries):
+            if totSize <= self.maxSize: break
+            if key == keep: continue
+            shutil.rmtree(self.makePath(key), ignore_errors=True)
+            totSize -= size
+
+
+    # Removes all entries of the cache
+    def clear(self):
+        for key in os.listdir(self.cacheDir):
+            shutil.rmtree(self.makePath(key), ignore_errors=True)
@@ -0,0 +1,371 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the layer-level frontend of DavinciAsm. A model is    #
+#   given as a list of layers with NumPy weights (Dense, LSTMCell, GRUCell),     #
+#   which are lowered to DavinciAsm macros: the matrix-vector products go        #
+#   through the GEMV tiling layer (davinci_tiling.py), the gates and activations #
+#   are VV-Engine elementwise operations, and the registers are allocated by the #
+#   linear-scan allocator (davinci_regalloc.py). The outputs of each layer are   #
+#   shifted out to the FIFO; the host feeds them back as the input of the next   #
+#   layer (and the state of the next time step), so the compiler simulates the   #
+#   program as it is built (davinci_sim.py), which also gives the bit-exact      #
+#   expected outputs.                                                            #
+#                                                                                #
+#================================================================================#
+
+import numpy as np
+
+
+
+# Float reference of the activation functions, {name: function}
+tbl_activFn = {
+    None   : lambda x: x,
+    'relu' : lambda x: np.maximum(x, 0),
+    'sigm' : lambda x: 1/(1 + np.exp(-x)),
+    'tanh' : np.tanh,
+}
+
+
+
+# Fully connected layer, y = activation(W @ x + b)
+class Dense:
+    stateful = False
+
+    # Parameters:
+    #   W : (outLen, inLen) weight matrix
+    #   b : bias vector of outLen, no bias if None
+    #   activation : relu/sigm/tanh, or None for a linear layer
+    def __init__(self, W, b=None, activation='relu'):
+        self.W = np.asarray(W)
+        self.b = None if b is None else np.asarray(b)
+        assert self.W.ndim == 2, f'Expected a weight matrix, got an array of shape {self.W.shape}'
+        assert self.b is None or self.b.shape == (self.W.shape[0],), f'Bias of shape {self.b.shape} does not match the weight matrix {self.W.shape}'
+        assert activation in tbl_activFn, f'Unknown activation: {activation}'
+        self.activation = activation
+        self.inLen, self.outLen = self.W.shape[1], self.W.shape[0]
+
+
+    # Returns the initial state (none)
+    def initState(self):
+        return ()
+
+
+    # Returns the activations that need a table in VV-Engine
+    def getActivations(self):
+        return {self.activation} - {None, 'relu'}
+
+
+    # Given an input vector and the state, returns the outputs (y,) at full-precision
+    def forward(self, x, state):
+        y = self.W @ x + (0 if self.b is None else self.b)
+        return (tbl_activFn[self.activation](y),)
+
+
+    # Records the instructions of the layer into the register allocator ra.
+    # Returns the outputs as [(VV-Engine registers of the row-tiles, length)].
+    def lower(self, fe, ra, x, state):
+        acc = fe.gemvGates(ra, [self.W], x, comment='dense')[0]
+        if self.b is not None: acc = fe.vvAdd(ra, acc, fe.loadVec(ra, self.b, 'bias'), 'dense')
+        if self.activation is not None: acc = fe.vvActiv(ra, acc, self.activation, 'dense')
+        return [(acc, self.outLen)]
+
+
+
+# LSTM cell (one time step), gates in the order i, f, g, o,
+#   i, f, o = sigm(W_* @ x + U_* @ h + b_*), g = tanh(W_g @ x + U_g @ h + b_g)
+#   c' = f*c + i*g, h' = o*tanh(c')
+class LSTMCell:
+    stateful = True
+
+    # Parameters:
+    #   W : (4*hidLen, inLen) input weights of the stacked gates
+    #   U : (4*hidLen, hidLen) recurrent weights of the stacked gates
+    #   b : bias vector of 4*hidLen, no bias if None
+    #   h0, c0 : initial hidden and cell states, zeros if None
+    def __init__(self, W, U, b=None, h0=None, c0=None):
+        self.W, self.U = np.asarray(W), np.asarray(U)
+        self.hidLen = self.U.shape[1]
+        self.inLen = self.W.shape[1]
+        assert self.W.shape[0] == self.U.shape[0] == 4*self.hidLen, f'Expected weights of 4 gates, got W{self.W.shape} and U{self.U.shape}'
+        self.b = np.zeros(4*self.hidLen) if b is None else np.asarray(b)
+        self.h0 = np.zeros(self.hidLen) if h0 is None else np.asarray(h0)
+        self.c0 = np.zeros(self.hidLen) if c0 is None else np.asarray(c0)
+        self.outLen = self.hidLen
+
+
+    # Returns the initial state (h, c)
+    def initState(self):
+        return (self.h0, self.c0)
+
+
+    # Returns the activations that need a table in VV-Engine
+    def getActivations(self):
+        return {'sigm', 'tanh'}
+
+
+    # Given an input vector and the state (h, c), returns the outputs (h', c') at full-precision
+    def forward(self, x, state):
+        h, c = state
+        pre = self.W @ x + self.U @ h + self.b
+        i, f, g, o = np.split(pre, 4)
+        sigm = tbl_activFn['sigm']
+        c = sigm(f)*c + sigm(i)*np.tanh(g)
+        return (sigm(o)*np.tanh(c), c)
+
+
+    # Records the instructions of the cell into the register allocator ra.
+    # Returns the outputs as [(VV-Engine registers of the row-tiles, length)] of h' and c'.
+    def lower(self, fe, ra, x, state):
+        h, c = state
+        gates = fe.gemvGates(ra, np.split(np.hstack([self.W, self.U]), 4), np.concatenate([x, h]), comment='lstm')
+        bias = [fe.loadVec(ra, b, f'bias_{gate}') for gate, b in zip('ifgo', np.split(self.b, 4))]
+        gates = [fe.vvAdd(ra, acc, b, f'lstm gate {gate}') for gate, acc, b in zip('ifgo', gates, bias)]
+        i, f, o = [fe.vvActiv(ra, gates[k], 'sigm', f'lstm gate {gate}') for k, gate in ((0, 'i'), (1, 'f'), (3, 'o'))]
+        g = fe.vvActiv(ra, gates[2], 'tanh', 'lstm gate g')
+        c = fe.vvMult(ra, f, fe.loadVec(ra, c, 'cell'), 'lstm cell')
+        c = fe.vvAdd(ra, c, fe.vvMult(ra, i, g, 'lstm cell'), 'lstm cell')
+        h = fe.vvMult(ra, o, fe.vvActiv(ra, c, 'tanh', 'lstm hidden'), 'lstm hidden')
+        return [(h, self.hidLen), (c, self.hidLen)]
+
+
+
+# GRU cell (one time step), gates in the order r, z, n,
+#   r, z = sigm(W_* @ x + bw_* + U_* @ h + bu_*), n = tanh(W_n @ x + bw_n + r*(U_n @ h + bu_n))
+#   h' = (1-z)*n + z*h = n + z*(h - n)
+class GRUCell:
+    stateful = True
+
+    # Parameters:
+    #   W  : (3*hidLen, inLen) input weights of the stacked gates
+    #   U  : (3*hidLen, hidLen) recurrent weights of the stacked gates
+    #   bw : input bias vector of 3*hidLen, no bias if None
+    #   bu : recurrent bias vector of 3*hidLen, no bias if None
+    #   h0 : initial hidden state, zeros if None
+    def __init__(self, W, U, bw=None, bu=None, h0=None):
+        self.W, self.U = np.asarray(W), np.asarray(U)
+        self.hidLen = self.U.shape[1]
+        self.inLen = self.W.shape[1]
+        assert self.W.shape[0] == self.U.shape[0] == 3*self.hidLen, f'Expected weights of 3 gates, got W{self.W.shape} and U{self.U.shape}'
+        self.bw = np.zeros(3*self.hidLen) if bw is None else np.asarray(bw)
+        self.bu = np.zeros(3*self.hidLen) if bu is None else np.asarray(bu)
+        self.h0 = np.zeros(self.hidLen) if h0 is None else np.asarray(h0)
+        self.outLen = self.hidLen
+
+
+    # Returns the initial state (h,)
+    def initState(self):
+        return (self.h0,)
+
+
+    # Returns the activations that need a table in VV-Engine
+    def getActivations(self):
+        return {'sigm', 'tanh'}
+
+
+    # Given an input vector and the state (h,), returns the outputs (h',) at full-precision
+    def forward(self, x, state):
+        h, = state
+        wx, uh = np.split(self.W @ x + self.bw, 3), np.split(self.U @ h + self.bu, 3)
+        sigm = tbl_activFn['sigm']
+        r, z = sigm(wx[0] + uh[0]), sigm(wx[1] + uh[1])
+        n = np.tanh(wx[2] + r*uh[2])
+        return (n + z*(h - n),)
+
+
+    # Records the instructions of the cell into the register allocator ra.
+    # Returns the outputs as [(VV-Engine registers of the row-tiles, length)] of h'.
+    def lower(self, fe, ra, x, state):
+        h, = state
+        W, U = np.split(self.W, 3), np.split(self.U, 3)
+        bw, bu = np.split(self.bw, 3), np.split(self.bu, 3)
+        # r and z take x and h at once, the recurrent part of n is gated by r
+        rz = fe.gemvGates(ra, [np.hstack([W[k], U[k]]) for k in range(2)], np.concatenate([x, h]), comment='gru')
+        r, z = [fe.vvActiv(ra, fe.vvAdd(ra, rz[k], fe.loadVec(ra, bw[k] + bu[k], f'bias_{gate}'), f'gru gate {gate}'), 'sigm', f'gru gate {gate}')
+                for k, gate in enumerate('rz')]
+        nx = fe.vvAdd(ra, fe.gemvGates(ra, [W[2]], x, comment='gru')[0], fe.loadVec(ra, bw[2], 'bias_nx'), 'gru gate n')
+        nh = fe.vvAdd(ra, fe.gemvGates(ra, [U[2]], h, comment='gru')[0], fe.loadVec(ra, bu[2], 'bias_nh'), 'gru gate n')
+        n = fe.vvActiv(ra, fe.vvAdd(ra, nx, fe.vvMult(ra, r, nh, 'gru gate n'), 'gru gate n'), 'tanh', 'gru gate n')
+        diff = fe.vvSub(ra, fe.loadVec(ra, h, 'hidden'), n, 'gru hidden')
+        h = fe.vvAdd(ra, n, fe.vvMult(ra, z, diff, 'gru hidden'), 'gru hidden')
+        return [(h, self.hidLen)]
+
+
+
+# Compiles a model (list of layers) to a DA-VinCi program. Vectors are kept in
+# VV-Engine registers as the row-tiles of the GEMV tiling layer, i.e., element
+# k of a vector is in block (k % tileRows) of register [k // tileRows].
+class DavinciFrontend:
+    # VV-Engine instructions of the elementwise operations, {name: mnemonic of DavinciRegAlloc}
+    tbl_vvOp = {
+        'add'  : 'vv_add',
+        'sub'  : 'vv_sub',
+        'mult' : 'vv_mult',
+    }
+
+    # Parameters:
+    #   asm : the assembler (DavinciAsm) that receives the program
+    def __init__(self, asm):
+        # the VV-Engine multiplier (FXPFRAC_WIDTH) and the activation tables use 8 fractional bits
+        assert asm.fracWidth == 8, f'The VV-Engine works on 8 fractional bits, the assembler uses fracWidth={asm.fracWidth}'
+        self.asm = asm
+        self.tiler = asm.gemvTiler()
+
+
+    # ---- Lowering helpers, the instructions are recorded into the register allocator ra
+
+    # Given a list of matrices with the same shape (the gates) and a vector,
+    # records their products with the vector as a single GEMV. The rows of
+    # each gate are padded to whole row-tiles, so that the same elements of all
+    # gates are in the same VV-Engine block. Returns the row-tile registers of each gate.
+    def gemvGates(self, ra, mats, vector, *, comment=None):
+        tileRows = self.tiler.tileRows
+        rowCnt, colCnt = mats[0].shape
+        tileCnt = -(-rowCnt // tileRows)
+        stacked = np.zeros((len(mats)*tileCnt*tileRows, colCnt))
+        for k, mat in enumerate(mats):
+            assert mat.shape == (rowCnt, colCnt), f'Gate {k} has shape {mat.shape}, expected {(rowCnt, colCnt)}'
+            stacked[k*tileCnt*tileRows:][:rowCnt] = mat
+        accRegs = self.tiler.gemv(ra, stacked, vector, comment=comment)
+        return [accRegs[k*tileCnt:(k+1)*tileCnt] for k in range(len(mats))]
+
+
+    # Given a vector, records its loading into VV-Engine registers, returns the row-tile registers
+    def loadVec(self, ra, vector, name=None):
+        tileRows = self.tiler.tileRows
+        vregs = []
+        for i in range(0, len(vector), tileRows):
+            vreg = ra.vvReg(name)
+            ra.vv_LOADVEC(vreg, vector[i:i+tileRows], comment=f'{name} [{i}:{i+tileRows}]' if name else None)
+            vregs.append(vreg)
+        return vregs
+
+
+    # Given the name of an elementwise operation (see tbl_vvOp) and the
+    # row-tile registers of the operands, records opl (op) opr, returns the
+    # row-tile registers of the result
+    def vvBinary(self, ra, op, opl, opr, comment=None):
+        VVREG = self.asm.VVREG
+        assert len(opl) == len(opr), f'Operands of {op} have different no. of row-tiles: {len(opl)} != {len(opr)}'
+        result = []
+        for x, y in zip(opl, opr):
+            getattr(ra, self.tbl_vvOp[op])(x, y, comment=comment)
+            result.append(ra.vvReg(op))
+            ra.vv_mov(result[-1], VVREG.O, comment=comment)
+        return result
+
+    def vvAdd(self, ra, opl, opr, comment=None):
+        return self.vvBinary(ra, 'add', opl, opr, comment)
+
+    def vvSub(self, ra, opl, opr, comment=None):
+        return self.vvBinary(ra, 'sub', opl, opr, comment)
+
+    def vvMult(self, ra, opl, opr, comment=None):
+        return self.vvBinary(ra, 'mult', opl, opr, comment)
+
+
+    # Given the row-tile registers of a vector and an activation (relu/sigm/tanh),
+    # records the activation, returns the row-tile registers of the result
+    def vvActiv(self, ra, vregs, activation, comment=None):
+        VVREG = self.asm.VVREG
+        actCode = getattr(self.asm.ACTCODE, activation.upper())
+        result = []
+        for vreg in vregs:
+            ra.vv_mov(VVREG.ACT, vreg, comment=comment)
+            ra.vv_activ(actCode, comment=comment)
+            result.append(ra.vvReg(activation))
+            ra.vv_mov(result[-1], VVREG.O, comment=comment)
+        return result
+
+
+    # ---- Compilation
+
+    # Given the activations (sigm/tanh), writes their tables into VV-Engine
+    def setupTables(self, activations):
+        from activation import tblSigm, tblTanh     # pre-computed activation tables
+        tables = {'sigm' : tblSigm, 'tanh' : tblTanh}
+        for activation in sorted(activations):
+            actCode = getattr(self.asm.ACTCODE, activation.upper())
+            for i in range(1<<8):
+                self.asm.vv_instWrite((actCode << 8) + i, tables[activation][i])
+            self.asm.as_addComment(f'Finished writing the {activation} activation table\n')
+
+
+    # Given the layers of a model and its input vectors, adds the program of
+    # the model to the assembler. The layers are run in order on each input
+    # vector (time step); the state of the cells carries over to the next step.
+    # Options:
+    #   expFile  : path of the expected-output file (see DavinciSim.export_expBin()), not written if None
+    #   bitLevel : if true, the program is simulated at the bit-level (DavinciBitSim)
+    # Returns (outputs, sim): the outputs of the last layer of each step, as a
+    # (steps, outLen) array, and the simulator that ran the program
+    def compile(self, layers, inputs, *, expFile=None, bitLevel=False):
+        asm = self.asm
+        assert asm.stream is None, 'The program is simulated as it is built, which is not possible in streaming mode'
+        from davinci_sim import DavinciSim, DavinciBitSim
+        scaleFact = 1 << asm.fracWidth
+        inputs = np.asarray(inputs)
+        steps = inputs[np.newaxis] if inputs.ndim == 1 else inputs
+        for k, layer in enumerate(layers):
+            inLen = steps.shape[1] if k == 0 else layers[k-1].outLen
+            assert layer.inLen == inLen, f'Layer {k} ({type(layer).__name__}) takes vectors of {layer.inLen}, got {inLen}'
+        self.setupTables(set().union(*[layer.getActivations() for layer in layers]))
+        sim = DavinciBitSim(asm) if bitLevel else DavinciSim(asm)
+        states = [layer.initState() for layer in layers]
+        refStates = list(states)
+        outputs = []
+        maxErr = 0
+        for t, x in enumerate(steps):
+            ref = x
+            for k, layer in enumerate(layers):
+                ra = asm.regAllocator()
+                asm.as_addComment(f'Step {t}, layer {k}: {type(layer).__name__}\n')
+                groups = layer.lower(self, ra, x, states[k])
+                for vregs, _ in groups: self.tiler.shiftOut(ra, vregs, comment=f'output of layer {k}')
+                ra.allocate()
+                # run the new words; the host feeds the outputs back as the inputs and states
+                outCnt = len(sim.outputs)
+                asm.assemble()
+                sim.run(asm.instructions.getWords()[sim.wordCount:])
+                vecs = sim.getOutputs()[outCnt:]
+                outs = []
+                for vregs, length in groups:
+                    outs.append(np.concatenate(vecs[:len(vregs)])[:length] / scaleFact)
+                    vecs = vecs[len(vregs):]
+                x = outs[0]
+                if layer.stateful: states[k] = tuple(outs)
+                # full-precision reference, for the quantization error
+                refOuts = layer.forward(ref, refStates[k])
+                ref = refOuts[0]
+                if layer.stateful: refStates[k] = refOuts
+            outputs.append(x)
+            maxErr = max(maxErr, np.max(np.abs(x - ref)))
+        print(f"INFO: {len(layers)} layer(s), {len(steps)} step(s) compiled; max error of the outputs w.r.t. full-precision: {maxErr:.4f}")
+        if expFile: sim.export_expBin(expFile)
+        return np.array(outputs), sim
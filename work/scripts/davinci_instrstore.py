@@ -0,0 +1,344 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the instruction stores (backends) of DavinciAsm.      #
+#   The default backend keeps each instruction as a dictionary in a list. The    #
+#   columnar backend keeps the same information in compact array columns, so    #
+#   that programs with tens of thousands of instructions can be assembled with   #
+#   a small memory footprint. Both backends expose the same list-like           #
+#   interface to the assembler.                                                  #
+#                                                                                #
+#================================================================================#
+
+from array import array
+import numpy as np
+
+
+
+# The default backend: a list of instruction dictionaries (internal representation)
+class DavinciInstrList(list):
+    backend = 'list'
+
+    # Saves the assembly (machine code) of the instruction at the given index
+    def setAssembly(self, idx, assembly):
+        self[idx]['assembly'] = assembly
+
+
+    # Returns the machine code words of all instructions as a np.uint32 array
+    def getWords(self):
+        words = [instr['assembly']['words'] for instr in self]
+        return np.concatenate(words) if words else np.zeros(0, dtype=np.uint32)
+
+
+    # Returns the start of the words of each instruction in getWords()
+    def getWordStart(self):
+        wordCnt = [len(instr['assembly']['words']) for instr in self]
+        return np.cumsum([0] + wordCnt[:-1]) if wordCnt else np.zeros(0, dtype=np.int64)
+
+
+
+# A list-like object that discards all appended instructions. It is used in
+# place of the instruction lists of the submodule assemblers when DavinciAsm
+# keeps its own (compact) copy of the instructions.
+class InstrSink:
+    def append(self, instr):
+        pass
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+
+
+# The columnar backend. Each instruction occupies one row of the following
+# columns (array.array),
+#   submCode  : submodule code of the instruction
+#   kind      : builtin/macro/pseudo, see tbl_kind
+#   name      : interned opcode (builtin) or macro name (macro)
+#   layout    : interned tuple of (field-name, field-type) of the operands
+#   op0 - op3 : operand fields; string fields (e.g., fncode) are interned
+#   comment   : interned user comment (-1 if None)
+#   src       : interned source mnemonic
+# Array payloads of macros (matrix/vector) are kept in a side table indexed by
+# the instruction number. The machine code words of the assembled instructions
+# are kept in a single uint32 array, with the start of each instruction in the
+# wordStart column.
+class DavinciInstrStore:
+    backend = 'columnar'
+
+    tbl_kind = {
+        'builtin' : 0,
+        'macro'   : 1,
+        'pseudo'  : 2,
+    }
+    kindNames = {code : kind for kind, code in tbl_kind.items()}
+    opCount = 4     # no. of operand columns
+
+    # Keys that are not stored as operands
+    metaKeys = {'submodule', 'ir', 'macro', 'opcode', 'comment', 'src', 'assembly'}
+
+
+    # Parameters:
+    #   submNames : {submCode: submodule-name}
+    def __init__(self, submNames):
+        self.submNames = submNames
+        self.submCodes = {name : code for code, name in submNames.items()}
+        # instruction columns
+        self.col_submCode = array('b')
+        self.col_kind     = array('B')
+        self.col_name     = array('H')
+        self.col_layout   = array('H')
+        self.col_ops      = [array('i') for _ in range(self.opCount)]
+        self.col_comment  = array('i')
+        self.col_src      = array('i')
+        self.payloads = {}      # side table, {instruction-index: {field-name: array}}
+        # interned values
+        self.strTable = []      # interned strings
+        self.strIndex = {}      # {string: index in strTable}
+        self.layoutTable = []   # interned operand layouts
+        self.layoutIndex = {}   # {layout: index in layoutTable}
+        # assembled machine code
+        self.asmCount  = 0              # no. of instructions (from the start) that are assembled
+        self.words     = array('I')     # machine code words of all assembled instructions
+        self.wordStart = array('q')     # start of each instruction in words
+
+
+    # Returns the index of the given string in the interned string table
+    def internStr(self, text):
+        idx = self.strIndex.get(text)
+        if idx is None:
+            idx = len(self.strTable)
+            self.strTable.append(text)
+            self.strIndex[text] = idx
+        return idx
+
+
+    # Returns the index of the given layout in the interned layout table
+    def internLayout(self, layout):
+        idx = self.layoutIndex.get(layout)
+        if idx is None:
+            idx = len(self.layoutTable)
+            self.layoutTable.append(layout)
+            self.layoutIndex[layout] = idx
+        return idx
+
+
+    # Given an instruction dictionary (internal representation), stores it in
+    # the columns. Same as list.append() of the default backend.
+    def append(self, instr):
+        submName = instr['submodule']
+        idx = len(self.col_kind)
+        if 'macro' in instr:
+            kind, name, fields = 'macro', instr['macro'], instr
+        elif 'ir' in instr:
+            kind, name, fields = 'builtin', instr['ir']['opcode'], instr['ir']
+        else:
+            kind, name, fields = 'pseudo', '', {}
+        # split the fields into operands and payloads
+        layout = []
+        operands = []
+        for key, val in fields.items():
+            if key in self.metaKeys: continue
+            if isinstance(val, str):
+                layout.append((key, 's'))
+                operands.append(self.internStr(val))
+            elif isinstance(val, (np.ndarray, list, tuple)):
+                self.payloads.setdefault(idx, {})[key] = val
+            else:
+                layout.append((key, 'i'))
+                operands.append(val)
+        assert len(operands) <= self.opCount, f'Too many operand fields ({len(operands)} > {self.opCount}) in instruction: {instr}'
+        operands += [0] * (self.opCount - len(operands))
+        # push the row
+        self.col_submCode.append(self.submCodes[submName])
+        self.col_kind.append(self.tbl_kind[kind])
+        self.col_name.append(self.internStr(name))
+        self.col_layout.append(self.internLayout(tuple(layout)))
+        for col, val in zip(self.col_ops, operands): col.append(val)
+        comment = instr.get('comment')
+        self.col_comment.append(-1 if comment is None else self.internStr(comment))
+        self.col_src.append(self.internStr(instr['src']))
+
+
+    def __len__(self):
+        return len(self.col_kind)
+
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+    # Rebuilds the instruction dictionary at the given index. Note that the
+    # rebuilt dictionary is a copy, changing it does not change the store.
+    def __getitem__(self, idx):
+        if isinstance(idx, slice): return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0: idx += len(self)
+        submCode = self.col_submCode[idx]
+        kind = self.col_kind[idx]
+        name = self.strTable[self.col_name[idx]]
+        # rebuild the operand fields
+        fields = {}
+        for (key, ftype), col in zip(self.layoutTable[self.col_layout[idx]], self.col_ops):
+            val = col[idx]
+            fields[key] = self.strTable[val] if ftype == 's' else val
+        fields.update(self.payloads.get(idx, {}))
+        # rebuild the instruction dictionary
+        instr = {'submodule' : self.submNames[submCode]}
+        if kind == self.tbl_kind['builtin']:
+            instr['ir'] = {'opcode' : name, **fields}
+        elif kind == self.tbl_kind['macro']:
+            instr['macro'] = name
+            instr.update(fields)
+        cmtIdx = self.col_comment[idx]
+        instr['comment'] = None if cmtIdx < 0 else self.strTable[cmtIdx]
+        instr['src'] = self.strTable[self.col_src[idx]]
+        if idx < self.asmCount: instr['assembly'] = self.getAssembly(idx)
+        return instr
+
+
+    # Returns a NumPy array (copy) of the named column, e.g., submCode, kind,
+    # name, layout, comment, src, words, wordStart. A copy is returned because
+    # a buffer view would prevent the column from growing.
+    def getColumn(self, name):
+        if name in {'words', 'wordStart'}: col = getattr(self, name)
+        else: col = getattr(self, f'col_{name}')
+        return np.array(col, dtype=col.typecode)
+
+
+    # Saves the assembly (machine code) of the instruction at the given index.
+    # Instructions are assembled in order; assembling an earlier instruction
+    # again discards the machine code of all instructions after it.
+    def setAssembly(self, idx, assembly):
+        assert idx <= self.asmCount, f'Instruction {idx} assembled before instruction {self.asmCount}'
+        if idx < self.asmCount:
+            del self.words[self.wordStart[idx]:]
+            del self.wordStart[idx:]
+            self.asmCount = idx
+        self.wordStart.append(len(self.words))
+        self.words.extend(assembly['words'].tolist())
+        self.asmCount += 1
+
+
+    # Returns the machine code words of all assembled instructions as a np.uint32 array
+    def getWords(self):
+        return np.frombuffer(self.words, dtype=np.uint32).copy()
+
+
+    # Returns the start of the words of each instruction in getWords()
+    def getWordStart(self):
+        return self.getColumn('wordStart')
+
+
+    # Returns the assembly (machine code) of the instruction at the given index,
+    # in the same format as DavinciAsm.genMachineCode()
+    def getAssembly(self, idx):
+        assert idx < self.asmCount, f'Instruction {idx} is not assembled'
+        start = self.wordStart[idx]
+        end = self.wordStart[idx+1] if idx+1 < self.asmCount else len(self.words)
+        kind = self.kindNames[self.col_kind[idx]]
+        words = np.array(self.words[start:end], dtype=np.uint32)
+        return {'submCode' : self.col_submCode[idx], 'type' : kind, 'words' : words}
+
+
+
+# The streaming backend. Instructions are not stored: each appended instruction
+# is encoded right away and sent to the sinks (generator-based writers), so the
+# memory use does not grow with the length of the program.
+class DavinciInstrStream:
+    backend = 'stream'
+
+    # Parameters:
+    #   encoder : function that returns the assembly of an instruction dictionary
+    #   sinks   : list of (un-primed) generators, each receives the assembled instructions via send()
+    def __init__(self, encoder, sinks):
+        self.encoder = encoder
+        self.sinks = []
+        self.instrCount = 0     # no. of instructions streamed
+        self.wordCount  = 0     # no. of machine code words streamed
+        self.aborted    = False # set if the stream is aborted, see abort()
+        # prime the generators; the ones already primed are aborted on failure
+        for sink in sinks:
+            try:
+                next(sink)
+            except Exception as exc:
+                self.abort(exc)
+                raise
+            self.sinks.append(sink)
+
+
+    # Given an instruction dictionary (internal representation), encodes it
+    # and flushes it to all sinks. If encoding or writing fails, the stream
+    # is aborted before the error is raised.
+    def append(self, instr):
+        assert self.sinks, 'The stream is closed'
+        try:
+            instr['assembly'] = self.encoder(instr)
+            for sink in self.sinks: sink.send(instr)
+        except Exception as exc:
+            self.abort(exc)
+            raise
+        self.instrCount += 1
+        self.wordCount += len(instr['assembly']['words'])
+
+
+    # Closes all sinks, flushing the pending outputs
+    def close(self):
+        for sink in self.sinks: sink.close()
+        self.sinks = []
+
+
+    # Closes all sinks without completing their outputs: the given exception
+    # is thrown into each sink, so that it releases its file without writing
+    # the rest (e.g., the tail of the C-program)
+    def abort(self, exc):
+        for sink in self.sinks:
+            try:
+                sink.throw(exc)
+            except Exception:
+                pass
+            sink.close()
+        self.sinks = []
+        self.aborted = True
+
+
+    def __len__(self):
+        return self.instrCount
+
+
+    # Streamed instructions are not kept, nothing to iterate over
+    def __iter__(self):
+        return iter(())
+
+
+    # Instructions are assembled as they are appended
+    def setAssembly(self, idx, assembly):
+        pass
@@ -0,0 +1,206 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the peephole optimizer of DA-VinCi programs. It runs  #
+#   on the IR3 words after macro expansion, tracking the block selection of the  #
+#   GEMV array and the VV-Engine and the synchronization state of both engines.  #
+#   Selections that are already in effect or never used by a write, NOPs after a #
+#   completed barrier, and writes that are overwritten before any instruction    #
+#   reads the registers are removed. The effect of the program on the registers  #
+#   and the outputs is unchanged.                                                #
+#                                                                                #
+#================================================================================#
+
+import numpy as np
+
+
+
+# Peephole optimizer of the IR3 words of an assembler (DavinciAsm). Each rule
+# returns the indices of the words it removes; the rules run in the order of
+# tbl_rules, each on the words kept by the previous ones.
+class DavinciPeephole:
+    tbl_rules = [
+        'mv_write',     # MV writes overwritten before the register is read
+        'vv_write',     # VV writes overwritten before the register is read
+        'mv_nop',       # MV NOPs after a completed barrier (no MV work since)
+        'vv_nop',       # VV NOPs after a completed barrier (no VV work since)
+        'mv_select',    # MV selections not used by any write, or already in effect
+        'vv_select',    # VV selections not used by any write, or already in effect
+    ]
+    mvBarrierNops = 2   # no. of back-to-back NOPs of the MV_SYNC barrier
+
+
+    # Parameters:
+    #   asm : the assembler (DavinciAsm), for the instruction formats
+    def __init__(self, asm):
+        self.picaso_as  = asm.picaso_as
+        self.vvblock_as = asm.vvblock_as
+        self.submCodes  = {name : code for name, code in asm.tbl_submCode.items() if code >= 0}
+        self.submShift  = asm.tbl_field_width['submInstr']
+
+
+    # Given the (32-bit) IR3 words, decodes the fields used by the rules into
+    # a dictionary of arrays (one entry per word),
+    #   subm   : submodule name of each word (mv/vv)
+    #   kind   : write, select, nop, or other (compute and configuration)
+    #   addr   : address of writes (-1 for the rest)
+    #   sel    : selection key of selects, e.g., ('sel_block', row, col), ('selectall',)
+    def decode(self, words):
+        words = np.asarray(words, dtype=np.uint32)
+        submCode = (words >> np.uint32(self.submShift)).tolist()
+        codeNames = {code : name for name, code in self.submCodes.items()}
+        instrMask = 2**self.submShift - 1
+        # PiCaSO fields
+        fw = self.picaso_as.tbl_field_width
+        mvOpc, mvFn = self.picaso_as.tbl_opcode, self.picaso_as.tbl_fncode
+        mvShift = fw['seg0'] + fw['seg1']
+        mvNames = {mvOpc['write'] : 'write', mvOpc['select'] : 'select', mvOpc['nop'] : 'nop'}
+        selNames = {mvFn[fn] : fn for fn in ('sel_col', 'sel_block', 'sel_row', 'sel_enc')}
+        # VV-Engine fields
+        vfw = self.vvblock_as.tbl_field_width
+        vvOpc = self.vvblock_as.tbl_opcode
+        vvShift = vfw['seg0'] + vfw['seg1']
+        vvNames = {vvOpc['write0'] : 'write', vvOpc['write1'] : 'write', vvOpc['nop'] : 'nop',
+                   vvOpc['selectblk'] : 'select', vvOpc['selectall'] : 'select'}
+        subm, kind, addr, sel = [], [], [], []
+        for code, word in zip(submCode, words.tolist()):
+            name = codeNames[code]
+            word &= instrMask
+            wkind, waddr, wsel = 'other', -1, None
+            if name == 'mv':
+                wkind = mvNames.get(word >> mvShift, 'other')
+                if wkind == 'write': waddr = (word >> fw['seg0']) & (2**fw['addr'] - 1)
+                elif wkind == 'select':
+                    fn = selNames[(word >> (fw['seg0'] + fw['reg'])) & (2**fw['fncode'] - 1)]
+                    rowID = (word >> fw['id']) & (2**fw['id'] - 1)
+                    colID = word & (2**fw['id'] - 1)
+                    if fn == 'sel_enc': wsel = (fn,)
+                    elif fn == 'sel_row': wsel = (fn, rowID)
+                    elif fn == 'sel_col': wsel = (fn, colID)
+                    else: wsel = (fn, rowID, colID)
+            else:
+                opcode = word >> vvShift
+                wkind = vvNames.get(opcode, 'other')
+                if wkind == 'write': waddr = (word >> vfw['seg0']) & (2**vfw['addr'] - 1)
+                elif wkind == 'select':
+                    if opcode == vvOpc['selectall']: wsel = ('selectall',)
+                    else: wsel = ('selectblk', (word >> vfw['reg']) & (2**vfw['id'] - 1))
+            subm.append(name)
+            kind.append(wkind)
+            addr.append(waddr)
+            sel.append(wsel)
+        return {'subm' : subm, 'kind' : kind, 'addr' : addr, 'sel' : sel}
+
+
+    # Returns true if the blocks of selection key 'outer' include the blocks of 'inner'
+    @staticmethod
+    def selCovers(outer, inner):
+        if outer is None or inner is None: return False     # unknown selection
+        if outer == inner or outer[0] in ('sel_enc', 'selectall'): return True
+        if inner[0] != 'sel_block': return False
+        if outer[0] == 'sel_row': return outer[1] == inner[1]
+        if outer[0] == 'sel_col': return outer[1] == inner[2]
+        return False
+
+
+    # Rule: a write is removed if a later write of the same engine writes the
+    # same address of (at least) the same blocks, and no instruction of that
+    # engine other than selects, writes and NOPs runs in between (i.e., nothing
+    # reads the registers). The selection is unknown at the start.
+    def ruleWrite(self, fields, order, engine):
+        removed = []
+        pending = {}    # {addr: [(word-index, selection-key)]}, writes that may be overwritten
+        curSel = None
+        for idx in order:
+            if fields['subm'][idx] != engine: continue
+            kind = fields['kind'][idx]
+            if kind == 'select': curSel = fields['sel'][idx]
+            elif kind == 'write':
+                addr = fields['addr'][idx]
+                alive = []
+                for prevIdx, prevSel in pending.get(addr, []):
+                    if self.selCovers(curSel, prevSel): removed.append(prevIdx)
+                    else: alive.append((prevIdx, prevSel))
+                pending[addr] = alive + [(idx, curSel)]
+            elif kind != 'nop':
+                pending = {}    # the registers may be read
+        return removed
+
+
+    # Rule: NOPs of an engine are removed once the engine is known to be idle,
+    # i.e., after barrierNops back-to-back NOPs (in the whole word stream)
+    # with no other word of that engine since.
+    def ruleNop(self, fields, order, engine, barrierNops):
+        removed = []
+        nopRun = 0      # no. of back-to-back NOPs
+        idle = False
+        for idx in order:
+            isNop = fields['subm'][idx] == engine and fields['kind'][idx] == 'nop'
+            if isNop and idle: removed.append(idx); continue
+            if isNop:
+                nopRun += 1
+                if nopRun >= barrierNops: idle = True
+            else:
+                nopRun = 0
+                if fields['subm'][idx] == engine: idle = False
+        return removed
+
+
+    # Rule: a select is removed if the next word of the engine that depends on
+    # the selection is another select (the selection is never used), or if
+    # the same selection is already in effect. The last select is kept.
+    def ruleSelect(self, fields, order, engine):
+        removed = set()
+        engOrder = [idx for idx in order if fields['subm'][idx] == engine and fields['kind'][idx] in ('select', 'write')]
+        for cur, nxt in zip(engOrder, engOrder[1:]):
+            if fields['kind'][cur] == 'select' and fields['kind'][nxt] == 'select': removed.add(cur)
+        curSel = None
+        for idx in engOrder:
+            if idx in removed or fields['kind'][idx] != 'select': continue
+            if fields['sel'][idx] == curSel: removed.add(idx)
+            curSel = fields['sel'][idx]
+        return sorted(removed)
+
+
+    # Given the (32-bit) IR3 words of a program, applies all rules. Returns
+    # (keep, saved), where keep is a boolean array of the words to keep, and
+    # saved is the no. of words removed by each rule {rule: count}.
+    def optimize(self, words):
+        fields = self.decode(words)
+        keep = np.ones(len(fields['kind']), dtype=bool)
+        saved = {}
+        for rule in self.tbl_rules:
+            engine, kind = rule.split('_')
+            order = np.flatnonzero(keep).tolist()
+            if kind == 'write': removed = self.ruleWrite(fields, order, engine)
+            elif kind == 'select': removed = self.ruleSelect(fields, order, engine)
+            else: removed = self.ruleNop(fields, order, engine, self.mvBarrierNops if engine == 'mv' else 1)
+            keep[removed] = False
+            saved[rule] = len(removed)
+        return keep, saved
@@ -0,0 +1,127 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the process pool used by DavinciAsm.assemble() to     #
+#   expand the payload macros (LOADMAT, LOADVEC) in parallel. The payload arrays #
+#   are placed in a shared memory block which the workers map without copying;   #
+#   each worker runs its own DavinciAsm with the same parameters and returns the #
+#   machine code of its share of the macros in program order.                    #
+#                                                                                #
+#================================================================================#
+
+import numpy as np
+from contextlib import redirect_stdout
+from io import StringIO
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+
+
+# Per-process state of a pool worker, set up by initWorker()
+worker = {}
+
+
+# Initializer of the pool workers. Creates the assembler of the worker with
+# the given parameters (DavinciAsm.params) and attaches the shared memory block
+# of the payloads (None if there is no payload).
+def initWorker(params, shmName):
+    from davinci_assembler import DavinciAsm
+    asm = DavinciAsm()
+    with redirect_stdout(StringIO()): asm.setupParams(**params)   # parameters are already reported by the parent
+    worker['asm'] = asm
+    worker['shm'] = SharedMemory(name=shmName) if shmName else None     # the block is unlinked by the parent
+
+
+# Given a list of tasks (instrDict, payloadRefs), returns the assembly of each
+# instruction (in order). payloadRefs is a list of (field, offset, shape, dtype)
+# of the payload arrays in the shared memory block, these are added back to the
+# instruction dictionary as read-only views.
+def expandMacros(tasks):
+    asm, shm = worker['asm'], worker['shm']
+    assemblies = []
+    for instrDict, payloadRefs in tasks:
+        for field, offset, shape, dtype in payloadRefs:
+            payload = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            payload.flags.writeable = False
+            instrDict[field] = payload
+        assemblies.append(asm.genMachineCode(instrDict))
+    return assemblies
+
+
+
+# Expands macro instructions of a DavinciAsm in a process pool
+class DavinciAsmPool:
+    chunksPerWorker = 4     # no. of task chunks per worker, for load balancing
+
+    # Parameters:
+    #   params  : assembler parameters (DavinciAsm.params)
+    #   workers : no. of worker processes
+    def __init__(self, params, workers):
+        assert workers > 1, f'Process pool needs at least 2 workers, got {workers}'
+        self.params = params
+        self.workers = workers
+
+
+    # Given a list of (index, instrDict) of macro instructions, returns the
+    # dictionary {index: assembly} of their machine code, same as
+    # DavinciAsm.genMachineCode(instrDict)
+    def genMachineCode(self, macros):
+        if not macros: return {}
+        # separate the payload arrays from the instructions
+        tasks = []
+        payloads = []   # (offset, array) to be placed in the shared memory
+        shmSize = 0
+        for idx, instr in macros:
+            instrDict = {}
+            payloadRefs = []
+            for field, val in instr.items():
+                if field == 'assembly': continue
+                if isinstance(val, np.ndarray) and val.dtype != object:
+                    payloadRefs.append((field, shmSize, val.shape, val.dtype.str))
+                    payloads.append((shmSize, val))
+                    shmSize += -(-val.nbytes // 8) * 8    # keep the payloads 8-byte aligned
+                else:
+                    instrDict[field] = val      # scalars and ragged payloads are sent with the task
+            tasks.append((instrDict, payloadRefs))
+        # copy the payloads into the shared memory block
+        shm = SharedMemory(create=True, size=shmSize) if shmSize else None
+        try:
+            for offset, val in payloads:
+                np.ndarray(val.shape, dtype=val.dtype, buffer=shm.buf, offset=offset)[...] = val
+            # shard the tasks into contiguous chunks, results come back in program order
+            chunkCnt = min(len(tasks), self.workers * self.chunksPerWorker)
+            bounds = np.linspace(0, len(tasks), chunkCnt+1).astype(int)
+            chunks = [tasks[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+            with Pool(self.workers, initializer=initWorker, initargs=(self.params, shm.name if shm else None)) as pool:
+                assemblies = [asm for chunk in pool.imap(expandMacros, chunks) for asm in chunk]
+        finally:
+            if shm:
+                shm.close()
+                shm.unlink()
+        return {idx : asm for (idx, _), asm in zip(macros, assemblies)}
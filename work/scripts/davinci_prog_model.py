@@ -0,0 +1,62 @@
+# An assembly program for DA-VinCi
+# Written for DavinciAsm v0.x for end-to-end model benchmarks.
+# Usage: python3 davinci_prog_model.py [mlp|lstm|gru]
+import numpy as np
+import sys
+
+from davinci_assembler import *
+from davinci_frontend import Dense, LSTMCell, GRUCell
+davinci_as.printCopyright()
+
+
+# Assembler parameters and compatability checks
+assert davinci_as.v_major == 0
+davinci_as.setupParams(mvBlockDim=(16,4), fracWidth=8, maxLevel=1,
+                       mvRegCnt=60, mvResvRegCnt=4)  # 0-59 are user regs, 60-63 are reserved
+print('DA-VinCi Assembler Parameters:')
+davinci_as.printParams()
+print('')
+
+
+# Script parameters
+model     = sys.argv[1] if len(sys.argv) > 1 else 'mlp'
+outfile   = f'davinci_prog_model_{model}.bin'
+outCfile  = f'davinci_prog_model_{model}.c'
+cprogname = f'prog_model_{model}'
+expfile   = f'davinci_prog_model_{model}_exp.bin'     # expected output in $readmemb() format
+inLen     = 64      # length of the input vectors
+hidLen    = 32      # no. of hidden units
+outLen    = 10      # length of the output vectors
+stepCnt   = 4       # no. of time steps of the recurrent models
+
+
+# ---- Model generation
+np.random.seed(2)       # fixed seed to keep tests predictable
+uniform = np.random.uniform
+if model == 'mlp':      # 2-layer MLP: ReLU(W1@x+b1) -> W2@h+b2
+    layers = [Dense(uniform(-0.5, 0.5, (hidLen, inLen)), uniform(-0.5, 0.5, hidLen), activation='relu'),
+              Dense(uniform(-0.5, 0.5, (outLen, hidLen)), uniform(-0.5, 0.5, outLen), activation=None)]
+    inputs = uniform(-1, 1, inLen)
+elif model == 'lstm':   # LSTM cell followed by a linear read-out, over stepCnt steps
+    layers = [LSTMCell(uniform(-0.3, 0.3, (4*hidLen, inLen)), uniform(-0.3, 0.3, (4*hidLen, hidLen)), uniform(-0.3, 0.3, 4*hidLen)),
+              Dense(uniform(-0.5, 0.5, (outLen, hidLen)), uniform(-0.5, 0.5, outLen), activation=None)]
+    inputs = uniform(-1, 1, (stepCnt, inLen))
+elif model == 'gru':    # GRU cell followed by a linear read-out, over stepCnt steps
+    layers = [GRUCell(uniform(-0.3, 0.3, (3*hidLen, inLen)), uniform(-0.3, 0.3, (3*hidLen, hidLen)),
+                      uniform(-0.3, 0.3, 3*hidLen), uniform(-0.3, 0.3, 3*hidLen)),
+              Dense(uniform(-0.5, 0.5, (outLen, hidLen)), uniform(-0.5, 0.5, outLen), activation=None)]
+    inputs = uniform(-1, 1, (stepCnt, inLen))
+else:
+    assert 0, f'Unknown model: {model}'
+
+
+# ---- Compile the model; the expected outputs come from the simulation of the program
+outputs, sim = davinci_as.modelFrontend().compile(layers, inputs, expFile=expfile)
+print(f'INFO: outputs of the {model} model at fixed-precision')
+print(outputs)
+
+
+# Export the binary for verilog $readmemb()
+davinci_as.export_verilogBin(outfile)
+davinci_as.export_CprogHex(cprogname, outCfile)
+davinci_as.estimateLatency(clkFreq=100)
@@ -0,0 +1,49 @@
+# An assembly program for DA-VinCi
+# Written for DavinciAsm v0.x for weight-stationary streaming benchmarks.
+import numpy as np
+import sys
+
+from davinci_assembler import *
+davinci_as.printCopyright()
+
+
+# Assembler parameters and compatability checks
+assert davinci_as.v_major == 0
+davinci_as.setupParams(mvBlockDim=(16,4), fracWidth=8, maxLevel=1,
+                       mvRegCnt=60, mvResvRegCnt=4)  # 0-59 are user regs, 60-63 are reserved
+print('DA-VinCi Assembler Parameters:')
+davinci_as.printParams()
+print('')
+
+
+# Script parameters
+outfile   = 'davinci_prog_wstat.bin'
+outCfile  = 'davinci_prog_wstat.c'
+cprogname = 'prog_wstat'
+expfile   = 'davinci_prog_wstat_exp.bin'         # expected output of the replayed vectors in $readmemb() format
+vecCnt    = int(sys.argv[1]) if len(sys.argv) > 1 else 16    # no. of input vectors of the stream
+dblBuffer = len(sys.argv) > 2 and sys.argv[2] == 'double'   # alternate two input-vector registers
+peRowCnt  = 16
+peColCnt  = 4*16
+
+
+# ---- Test input generation
+np.random.seed(2)       # fixed seed to keep tests predictable
+M = np.random.uniform(-2, 2, (peRowCnt, peColCnt))
+B = np.random.uniform(-1, 1, peRowCnt)
+V = np.random.uniform(-1, 1, (vecCnt, peColCnt))
+
+
+# ---- Program: ReLU(M@v+B) for each vector v of the stream
+for reg in range(8): mv_CLRREG(reg, comment='initial clear')
+as_addComment('Finished clearing out\n')
+ws = davinci_as.weightStationary()
+ws.build(M, B, activation='relu', vector=V[0], doubleBuffer=dblBuffer)
+
+
+# Export the program (first vector) for verilog $readmemb(), and the runtime
+# format of the sections; the expected outputs are of the replayed stream
+davinci_as.export_verilogBin(outfile)
+ws.export_CprogHex(cprogname, outCfile)
+ws.simulate(V, expFile=expfile)
+ws.estimate(vecCnt)
@@ -0,0 +1,235 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the register allocator of DavinciAsm. Programs are    #
+#   written against virtual registers of the MV-Engine and the VV-Engine using   #
+#   the same mnemonics as the scripting interface; the instructions are          #
+#   recorded, the live interval of each virtual register is found (liveness      #
+#   analysis of the straight-line program), and physical registers are assigned  #
+#   with a linear scan, using register pairs for the 2-register destinations of  #
+#   MV_MULT. The instructions are then issued to the assembler with the physical #
+#   registers. Registers given as numbers are left as they are.                  #
+#                                                                                #
+#================================================================================#
+
+import inspect
+
+
+
+# A virtual register of a submodule (mv/vv). width is 2 for the register
+# pairs of the MV_MULT destinations, it is set when the register is used as one.
+class VirtualReg:
+    def __init__(self, subm, vid, name=None):
+        self.subm  = subm
+        self.vid   = vid
+        self.name  = name
+        self.width = 1
+
+    def __repr__(self):
+        return f'{self.subm}:{self.name or self.vid}'
+
+
+
+# Linear-scan register allocator over virtual registers. The mnemonics of the
+# scripting interface (e.g., mv_LOADMAT, vv_add) are recorded as they are
+# called on this object; allocate() assigns the registers and adds the
+# instructions to the assembler.
+class DavinciRegAlloc:
+    # Recorded mnemonics, {mnemonic: (DavinciAsm method, {register argument: role})}
+    # Roles: def (written), use (read), usedef (read and written); the suffix
+    # 2 marks the register pairs, e.g., rd of MV_MULT spans rd and rd+1.
+    tbl_mnemonic = {
+        'mv_write'       : ('mv_instWrite',       {}),
+        'mv_nop'         : ('mv_instNop',         {}),
+        'mv_mov'         : ('mv_instMov',         {'rd' : 'def', 'rs' : 'use'}),
+        'mv_add'         : ('mv_instAdd',         {'rd' : 'def', 'rs1' : 'use', 'rs2' : 'use'}),
+        'mv_sub'         : ('mv_instSub',         {'rd' : 'def', 'rs1' : 'use', 'rs2' : 'use'}),
+        'mv_movOffset'   : ('mv_instMovOffset',   {'rd' : 'def', 'rs' : 'use'}),
+        'mv_selectBlk'   : ('mv_instSelectBlock', {}),
+        'mv_selectRow'   : ('mv_instSelectRow',   {}),
+        'mv_selectCol'   : ('mv_instSelectCol',   {}),
+        'mv_selectAll'   : ('mv_instSelectAll',   {}),
+        'mv_accumRow'    : ('mv_instAccumrow',    {'reg' : 'usedef'}),
+        'mv_updatepp'    : ('mv_instUpdatepp',    {'ppreg' : 'usedef2', 'multiplicand' : 'use', 'multiplier' : 'use'}),
+        'mv_blockFold'   : ('mv_instBlockFold',   {'rd' : 'def', 'rs' : 'use'}),
+        'vv_write'       : ('vv_instWrite',       {}),
+        'vv_nop'         : ('vv_instNop',         {}),
+        'vv_mov'         : ('vv_muxMov',          {'rd' : 'def', 'rs' : 'use'}),
+        'vv_add'         : ('vv_muxAdd',          {'opl' : 'use', 'opr' : 'use'}),
+        'vv_sub'         : ('vv_muxSub',          {'opl' : 'use', 'opr' : 'use'}),
+        'vv_mult'        : ('vv_muxMult',         {'opl' : 'use', 'opr' : 'use'}),
+        'vv_activ'       : ('vv_muxActivation',   {}),
+        'vv_shiftOff'    : ('vv_instDisableShift', {}),
+        'vv_serialEn'    : ('vv_instSerialEn',    {}),
+        'vv_parallelEn'  : ('vv_instParallelEn',  {}),
+        'vv_selectBlk'   : ('vv_instSelectBlk',   {}),
+        'vv_selectAll'   : ('vv_instSelectAll',   {}),
+        'mv_MULT'        : ('mv_macroMult',       {'rd' : 'def2', 'multiplicand' : 'use', 'multiplier' : 'use'}),
+        'mv_SYNC'        : ('mv_macroSync',       {}),
+        'mv_BLOCKACCUM'  : ('mv_macroBlockAccum', {'rd' : 'def', 'rs' : 'use'}),
+        'mv_RNGACCUM'    : ('mv_macroRangeAccum', {'rd' : 'def', 'rs' : 'use'}),
+        'mv_ALLACCUM'    : ('mv_macroAllAccum',   {'rd' : 'def', 'rs' : 'use'}),
+        'mv_LOADMAT'     : ('mv_macroLoadMat',    {'reg' : 'def'}),
+        'mv_CLRREG'      : ('mv_macroClearReg',   {'reg' : 'def'}),
+        'mv_LOADVEC_ROW' : ('mv_macroLoadVecRow', {'reg' : 'def'}),
+        'mv_LOADVEC_COL' : ('mv_macroLoadVecCol', {'reg' : 'def'}),
+        'vv_SYNC'        : ('vv_macroSync',       {}),
+        'vv_CLRREG'      : ('vv_macroClearReg',   {'reg' : 'def'}),
+        'vv_LOADVEC'     : ('vv_macroLoadVec',    {'reg' : 'def'}),
+        'as_addComment'  : ('as_addComment',      {}),
+    }
+
+    # Registers that are never allocated, {submodule: set}. The SUB/MULT
+    # variants of the VV-Engine (see VVBlockAsm.muxSub()) do not accept register 0.
+    tbl_resvRegs = {
+        'mv' : set(),
+        'vv' : {0},
+    }
+
+
+    # Parameters:
+    #   asm : the assembler (DavinciAsm) that receives the instructions
+    def __init__(self, asm):
+        self.asm = asm
+        self.reset()
+
+
+    # Discards the recorded instructions and the virtual registers
+    def reset(self):
+        self.vregs = []     # all virtual registers
+        self.calls = []     # recorded instructions, [(mnemonic, {argument: value})]
+
+
+    # Returns a new virtual register of the MV-Engine
+    def mvReg(self, name=None):
+        return self.makeReg('mv', name)
+
+
+    # Returns a new virtual register of the VV-Engine
+    def vvReg(self, name=None):
+        return self.makeReg('vv', name)
+
+
+    def makeReg(self, subm, name):
+        vreg = VirtualReg(subm, len(self.vregs), name)
+        self.vregs.append(vreg)
+        return vreg
+
+
+    # Recording functions of the mnemonics, e.g., ra.mv_LOADMAT(reg, matrix)
+    def __getattr__(self, mnemonic):
+        if mnemonic not in self.tbl_mnemonic: raise AttributeError(f'{type(self).__name__} has no mnemonic {mnemonic}')
+        def record(*args, **kwargs):
+            self.record(mnemonic, *args, **kwargs)
+        return record
+
+
+    # Records a mnemonic with the given arguments; the arguments are bound to
+    # the parameters of the DavinciAsm method, so that errors show up here.
+    def record(self, mnemonic, *args, **kwargs):
+        method, roles = self.tbl_mnemonic[mnemonic]
+        bound = inspect.signature(getattr(self.asm, method)).bind(*args, **kwargs)
+        for arg, role in roles.items():
+            vreg = bound.arguments.get(arg)
+            if not isinstance(vreg, VirtualReg): continue
+            assert vreg.subm == mnemonic[:2], f'{mnemonic}: {arg}={vreg} is not a register of the {mnemonic[:2].upper()}-Engine'
+            if role.endswith('2'): vreg.width = 2
+        self.calls.append((mnemonic, bound.arguments))
+
+
+    # MV_MULTFXP multiplies into a virtual register pair and moves the
+    # fixed-point product, instead of using the reserved registers
+    def mv_MULTFXP(self, rd, multiplicand, multiplier, *, comment=None):
+        src = f'MV_MULTFXP rd={rd}, multiplicand={multiplicand}, multiplier={multiplier}'
+        comment = f'From macro call: {src}; {comment or ""}'
+        pair = self.mvReg('multfxp')
+        self.record('mv_MULT', pair, multiplicand, multiplier, comment=comment)
+        self.record('mv_movOffset', self.asm.fracWidth, rd=rd, rs=pair, comment=comment)
+
+
+    # Returns the live interval of each virtual register {vreg: [first, last]},
+    # the indices of the first and last recorded instructions that access it,
+    # and the physical registers of each submodule given as numbers {subm: set}
+    def getLiveness(self):
+        intervals = {}
+        fixed = {'mv' : set(), 'vv' : set()}
+        for idx, (mnemonic, args) in enumerate(self.calls):
+            subm = mnemonic[:2]
+            for arg, role in self.tbl_mnemonic[mnemonic][1].items():
+                reg = args.get(arg)
+                if isinstance(reg, VirtualReg):
+                    if reg not in intervals:
+                        assert role.startswith('def'), f'{reg} is used before it is defined, by instruction {idx}: {mnemonic}'
+                        intervals[reg] = [idx, idx]
+                    intervals[reg][1] = idx
+                elif isinstance(reg, int) and reg >= 0:     # special registers of VV-Engine are negative
+                    fixed[subm].update(range(reg, reg + (2 if role.endswith('2') else 1)))
+        return intervals, fixed
+
+
+    # Given the submodule, the live intervals of its virtual registers and the
+    # physical registers to exclude, returns {vreg: register} by linear scan:
+    # the intervals are visited by their start, the registers of the ones that
+    # ended before are freed, and the lowest free register (pair) is taken.
+    def scan(self, subm, intervals, fixed):
+        regCnt = (self.asm.picaso_as if subm == 'mv' else self.asm.vvblock_as).regCnt
+        free = [reg for reg in range(regCnt) if reg not in fixed and reg not in self.tbl_resvRegs[subm]]
+        active = []     # [(end, vreg)]
+        alloc = {}
+        for vreg, (start, end) in sorted(intervals.items(), key=lambda item: (item[1][0], item[0].vid)):
+            if vreg.subm != subm: continue
+            for item in [item for item in active if item[0] < start]:
+                active.remove(item)
+                free.extend(range(alloc[item[1]], alloc[item[1]] + item[1].width))
+            free.sort()
+            if vreg.width == 1: cands = free
+            else: cands = [reg for reg in free if reg+1 in free]
+            assert cands, f'Out of {subm.upper()}-Engine registers for {vreg} at instruction {start}: {len(active)} live, {regCnt} registers'
+            alloc[vreg] = cands[0]
+            for reg in range(cands[0], cands[0] + vreg.width): free.remove(reg)
+            active.append((end, vreg))
+        return alloc
+
+
+    # Assigns the physical registers and adds the recorded instructions to the
+    # assembler. Returns the assignment {vreg: register}; the recording is reset.
+    def allocate(self):
+        intervals, fixed = self.getLiveness()
+        alloc = {}
+        for subm in ('mv', 'vv'): alloc.update(self.scan(subm, intervals, fixed[subm]))
+        for mnemonic, args in self.calls:
+            method, roles = self.tbl_mnemonic[mnemonic]
+            args = {arg : alloc[val] if isinstance(val, VirtualReg) else val for arg, val in args.items()}
+            getattr(self.asm, method)(**args)
+        for subm in ('mv', 'vv'):
+            used = {reg for vreg, base in alloc.items() if vreg.subm == subm for reg in range(base, base + vreg.width)}
+            vcnt = sum(vreg.subm == subm for vreg in alloc)
+            if vcnt: print(f"INFO: {vcnt} virtual {subm.upper()}-Engine registers allocated to {len(used)} registers")
+        self.reset()
+        return alloc
@@ -0,0 +1,158 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the register content tracker of DavinciAsm. It        #
+#   follows the instructions of a program as they are added, and keeps what each #
+#   MV-Engine and VV-Engine register holds: zeros, the content loaded by a load  #
+#   macro (identified by a hash of its payload), or unknown. Instructions that   #
+#   write a register make it unknown, while moves copy the content. The load     #
+#   macros use it to skip the clearing of registers that are already zero, to    #
+#   skip loading contents that are already resident, and to replace the reload   #
+#   of a matrix or vector held by another MV-Engine register with a register     #
+#   move.                                                                        #
+#                                                                                #
+#================================================================================#
+
+import hashlib
+import numpy as np
+
+
+
+# Register content tracker. The contents are kept as {reg: content}, where
+# content is ZERO or the hash of the payload of a load macro; registers that
+# are not in the dictionary are unknown (as are all registers at the start).
+class DavinciRegTracker:
+    ZERO = 'zero'
+
+    # Registers written by the built-in instructions of each submodule,
+    # {opcode: [destination field, ...]}; write and mov are handled separately
+    tbl_mvDest = {
+        'aluop'    : ['rd'],
+        'updatepp' : ['rd', 'rd+1'],
+        'accum'    : [],            # depends on the fncode
+    }
+    tbl_vvDest = {
+        'mov_sreg2r' : ['rs1'],
+        'mov_oreg2r' : ['rs1'],
+    }
+
+
+    # Parameters:
+    #   asm : the assembler (DavinciAsm), for the register layout
+    def __init__(self, asm):
+        self.picaso_as = asm.picaso_as
+        self.reset()
+
+
+    # Forgets the contents of all registers
+    def reset(self):
+        self.regs = {'mv' : {}, 'vv' : {}}
+        self.mark = 0       # no. of instructions of the program tracked so far
+
+
+    # Given the kind of a load macro (e.g., loadMat) and its fixed-point
+    # payload, returns the hash that identifies the loaded content
+    def makeHash(self, kind, payload):
+        payload = np.ascontiguousarray(payload, dtype=np.int64)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr((kind, payload.shape)).encode())
+        h.update(payload.tobytes())
+        return h.hexdigest()
+
+
+    # Returns the content of a register (ZERO, a hash, or None if unknown)
+    def get(self, subm, reg):
+        return self.regs[subm].get(reg)
+
+
+    # Sets the content of a register, None makes it unknown
+    def set(self, subm, reg, content):
+        if content is None: self.regs[subm].pop(reg, None)
+        else: self.regs[subm][reg] = content
+
+
+    # Returns a register of the submodule that holds the given content, None if there is none
+    def find(self, subm, content):
+        for reg, other in self.regs[subm].items():
+            if other == content: return reg
+        return None
+
+
+    # Given the instruction store of the program, tracks the instructions
+    # added since the last call. The tracker starts over if the program has
+    # been replaced by a shorter one.
+    def update(self, instructions):
+        if self.mark > len(instructions): self.reset()
+        for instr in instructions[self.mark:]: self.track(instr)
+        self.mark = len(instructions)
+
+
+    # Given an instruction dictionary (internal representation), updates the
+    # contents of the registers written by it
+    def track(self, instr):
+        subm = instr['submodule']
+        if subm not in self.regs: return    # pseudo instructions
+        if 'macro' in instr: self.trackMacro(subm, instr)
+        elif subm == 'mv': self.trackMv(instr['ir'])
+        else: self.trackVv(instr['ir'])
+
+
+    def trackMacro(self, subm, instr):
+        macro = instr['macro']
+        if macro == 'clearReg': self.set(subm, instr['reg'], self.ZERO)
+        elif macro in ('loadMat', 'loadVecRow', 'loadVecCol', 'loadVec'):
+            payload = instr['matrix'] if macro == 'loadMat' else instr['vector']
+            self.set(subm, instr['reg'], self.makeHash(macro, payload))
+        elif macro == 'mult':
+            self.set(subm, instr['rd'], None)
+            self.set(subm, instr['rd']+1, None)
+        elif macro == 'blockAccum': self.set(subm, instr['rd'], None)
+
+
+    def trackMv(self, ir):
+        opcode = ir['opcode']
+        if opcode == 'write': self.set('mv', ir['addr'] // self.picaso_as.regWidth, None)
+        elif opcode == 'mov':
+            # rd = rs for offset 0, the content is copied
+            content = self.get('mv', ir['rs1']) if ir['offset'] == 0 else None
+            self.set('mv', ir['rs2'], content)
+        elif opcode == 'aluop' and ir['fncode'] == 'alu_cpx': self.set('mv', ir['rd'], self.get('mv', ir['rs1']))
+        elif opcode == 'aluop' and ir['fncode'] == 'alu_cpy': self.set('mv', ir['rd'], self.get('mv', ir['rs2']))
+        elif opcode == 'accum':
+            self.set('mv', ir['rs2'] if ir['fncode'] == 'accum_blk' else ir['rs1'], None)
+        else:
+            for field in self.tbl_mvDest.get(opcode, []):
+                reg = ir['rd'] + 1 if field == 'rd+1' else ir[field]
+                self.set('mv', reg, None)
+
+
+    def trackVv(self, ir):
+        opcode = ir['opcode']
+        if opcode.startswith('write'): self.set('vv', ir['addr'], None)    # one-to-one register addresses
+        for field in self.tbl_vvDest.get(opcode, []): self.set('vv', ir[field], None)
@@ -0,0 +1,204 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the instruction scheduler of DavinciAsm. The MV and   #
+#   VV engines run concurrently, but the front-end issues the words in program   #
+#   order, so the engines only overlap where the program interleaves them. The   #
+#   scheduler reorders the assembled words as a list scheduler over the timing   #
+#   model (DavinciTiming): a word is issued as soon as its engine is free and    #
+#   the words it depends on are issued. Words that share state (the shift        #
+#   registers and the shift mode, SYNC barriers, the VV-Engine registers) keep   #
+#   their program order.                                                         #
+#                                                                                #
+#================================================================================#
+
+import numpy as np
+from davinci_timing import DavinciTiming
+
+
+
+# List scheduler of the IR3 words of an assembler (DavinciAsm). The words are
+# split into queues that keep their program order,
+#   mv       : all PiCaSO words
+#   vvShared : VV-Engine words that change the shift mode, access the S registers, or NOPs
+#   vvLocal  : the rest of the VV-Engine words (registers, O, ACT, selection)
+# and the state shared by the queues is modeled as resources,
+#   MODE   : the shift mode of the VV-Engine (serialEn/parallelEn/shiftOff)
+#   SHIFT  : the S registers, fed by the serial outputs of PiCaSO in serial mode
+#   VVDATA : the registers, O, ACT and the selection of the VV-Engine blocks
+# Words of different queues keep their program order if they use a common
+# resource. So, e.g., a shift-mode word may move ahead of the VV-Engine
+# register writes before it, but not ahead of the PiCaSO outputs before it.
+# A mode word that neither enters nor leaves the serial mode (e.g., parallelEn
+# after shiftOff) does not change how the PiCaSO outputs are handled, so the
+# PiCaSO words may move across it.
+class DavinciScheduler:
+    MODE   = 1
+    SHIFT  = 2
+    VVDATA = 4
+
+    tbl_queue = {
+        'mv'       : 0,
+        'vvShared' : 1,
+        'vvLocal'  : 2,
+    }
+
+    # PiCaSO opcodes that write a register, i.e., stream the ALU outputs to the VV-Engine
+    mvStreamOps = ['write', 'aluop', 'updatepp', 'accum', 'mov']
+    # VV-Engine opcodes that change the shift mode and that access the S registers
+    vvModeOps  = ['serial_en', 'parallel_en', 'shiftoff']
+    vvShiftOps = ['add_xsreg', 'sub_xsreg', 'mult_xsreg', 'mov_o2sreg', 'mov_y2sreg', 'mov_sreg2r']
+
+
+    # Parameters:
+    #   asm      : the assembler (DavinciAsm), for the instruction formats and parameters
+    #   vvBlkCnt : no. of VV-Engine blocks, see DavinciTiming
+    #   clkFreq  : clock frequency in MHz
+    def __init__(self, asm, vvBlkCnt, clkFreq=100):
+        self.timing = DavinciTiming(asm, vvBlkCnt, clkFreq)
+        self.picaso_as  = asm.picaso_as
+        self.vvblock_as = asm.vvblock_as
+        self.submCodes  = self.timing.submCodes
+        self.submShift  = self.timing.submShift
+
+
+    # Given the (32-bit) IR3 words, returns the opcode of each word (np.int64
+    # array) and the masks of the MV and VV words
+    def decode(self, words):
+        submCode = words >> np.uint32(self.submShift)
+        isMv = submCode == self.submCodes['mv']
+        isVv = submCode == self.submCodes['vv']
+        fw = self.picaso_as.tbl_field_width
+        mvOpcode = (words >> (fw['seg0'] + fw['seg1'])) & (2**fw['opcode'] - 1)
+        fw = self.vvblock_as.tbl_field_width
+        vvOpcode = (words >> (fw['seg0'] + fw['seg1'])) & (2**fw['opcode'] - 1)
+        opcode = np.where(isMv, mvOpcode, vvOpcode).astype(np.int64)
+        return opcode, isMv, isVv
+
+
+    # Given the (32-bit) IR3 words, returns (queue, res): the queue of each word
+    # (see tbl_queue) and the resources used by it (MODE/SHIFT/VVDATA bits).
+    # The shift mode of a word is the one set by the last mode word before it in
+    # program order (off at the start); the PiCaSO outputs and the S registers
+    # only interact in serial mode. The NOPs of SYNC barriers are ordered
+    # against all the words of the other engine that use the shared state.
+    def getResources(self, words):
+        opcode, isMv, isVv = self.decode(words)
+        mvOpc, vvOpc = self.picaso_as.tbl_opcode, self.vvblock_as.tbl_opcode
+        mvStream = isMv & np.isin(opcode, [mvOpc[op] for op in self.mvStreamOps])
+        vvShift  = isVv & np.isin(opcode, [vvOpc[op] for op in self.vvShiftOps])
+        isMode   = isVv & np.isin(opcode, [vvOpc[op] for op in self.vvModeOps])
+        mvNop    = isMv & (opcode == mvOpc['nop'])
+        vvNop    = isVv & (opcode == vvOpc['nop'])
+        # serial mode: the last mode word before each word is serial_en
+        last = np.maximum.accumulate(np.where(isMode, np.arange(len(words)), -1))
+        prev = np.concatenate([[-1], last[:-1]])
+        serial = (prev >= 0) & (opcode[np.maximum(prev, 0)] == vvOpc['serial_en'])
+        # the PiCaSO outputs are handled the same way on both sides of a mode
+        # word that neither enters nor leaves serial mode (e.g., parallelEn after shiftOff)
+        modeSerial = isMode & (serial | (opcode == vvOpc['serial_en']))
+        res = np.zeros(len(words), dtype=np.int64)
+        res[mvStream] = self.MODE
+        res[mvStream & serial] |= self.SHIFT
+        res[isMode] = self.SHIFT
+        res[mvNop | modeSerial] = self.MODE | self.SHIFT
+        res[isVv & ~isMode] = self.VVDATA
+        res[vvShift & serial] |= self.SHIFT
+        res[vvNop] = self.MODE | self.SHIFT | self.VVDATA
+        queue = np.full(len(words), self.tbl_queue['mv'], dtype=np.int64)
+        queue[isVv] = self.tbl_queue['vvLocal']
+        queue[vvShift | isMode | vvNop] = self.tbl_queue['vvShared']
+        return queue, res
+
+
+    # Given the queues, the needs (see schedule()) and the cycles of the words,
+    # returns the priority of each word: the no. of cycles on the longest path
+    # of dependent words from it to the end of the program (bottom level)
+    def getPriority(self, queues, needs, cycles):
+        priority = [0] * len(cycles)
+        succMax = [0] * len(cycles)     # priority of the dependent words in other queues
+        # words are visited in reverse program order, all dependent words come later
+        wordPos = {}
+        for q, qWords in enumerate(queues):
+            for pos, idx in enumerate(qWords): wordPos[idx] = (q, pos)
+        for idx in range(len(cycles)-1, -1, -1):
+            q, pos = wordPos[idx]
+            qWords = queues[q]
+            nextPrio = priority[qWords[pos+1]] if pos+1 < len(qWords) else 0
+            priority[idx] = cycles[idx] + max(nextPrio, succMax[idx])
+            for other, cnt in enumerate(needs[q][pos]):
+                if cnt: succMax[queues[other][cnt-1]] = max(succMax[queues[other][cnt-1]], priority[idx])
+        return priority
+
+
+    # Given the (32-bit) IR3 words of a program, returns the scheduled order of
+    # the words as an index array (a permutation of the words). Among the ready
+    # words, the one that can issue first is picked; on a tie, the one with the
+    # highest priority (see getPriority()), so that the other engine fills the stalls.
+    def schedule(self, words):
+        words = np.asarray(words, dtype=np.uint32)
+        cycles = self.timing.getCycles(words).tolist()
+        queue, res = self.getResources(words)
+        submCode = (words >> np.uint32(self.submShift)).tolist()
+        resBits = [self.MODE, self.SHIFT, self.VVDATA]
+        queueIDs = range(len(self.tbl_queue))
+        # word indices of each queue (in program order), and the no. of words
+        # of the other queues that must be issued before each word
+        queues = [[] for _ in queueIDs]
+        needs  = [[] for _ in queueIDs]
+        lastUse = [{bit : 0 for bit in resBits} for _ in queueIDs]     # [queue]{resource: count}
+        for idx, (q, r) in enumerate(zip(queue.tolist(), res.tolist())):
+            queues[q].append(idx)
+            need = [max([lastUse[other][bit] for bit in resBits if r & bit], default=0) if other != q else 0 for other in queueIDs]
+            needs[q].append(need)
+            for bit in resBits:
+                if r & bit: lastUse[q][bit] = len(queues[q])
+        # merge the queues: issue the ready head that can issue first
+        priority = self.getPriority(queues, needs, cycles)
+        busyUntil = {subm : 0 for subm in submCode}
+        heads = [0 for _ in queueIDs]
+        order = []
+        t = 0
+        for _ in range(len(words)):
+            best = None
+            for q in queueIDs:
+                pos = heads[q]
+                if pos == len(queues[q]): continue
+                if any(heads[other] < cnt for other, cnt in enumerate(needs[q][pos])): continue
+                idx = queues[q][pos]
+                subm = submCode[idx]
+                key = (max(t, busyUntil[subm]), -priority[idx], idx)
+                if best is None or key < best[0]: best = (key, q)
+            (start, _, idx), q = best
+            order.append(idx)
+            heads[q] += 1
+            subm = submCode[idx]
+            busyUntil[subm] = start + cycles[idx]
+            t = start + 1
+        return np.array(order, dtype=np.int64)
@@ -0,0 +1,644 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements a functional simulator of DA-VinCi programs. It       #
+#   executes the IR3 words produced by DavinciAsm.assemble() on a word-level     #
+#   model of the GEMV PiCaSO array (register files, selection, booth's           #
+#   multiplier bits, fold and accum-row networks) and the VV-Engine blocks       #
+#   (register files, S/O/ACT registers, activation tables, shift modes), and     #
+#   collects the vectors shifted out to the FIFO. The instructions of both       #
+#   engines are executed in program order, i.e., the program is assumed to be    #
+#   properly synchronized (SYNC barriers) as required by the hardware. A bit-    #
+#   plane accurate variant keeps the BRAM images of the PiCaSO blocks and        #
+#   executes their operations bit-serially.                                      #
+#                                                                                #
+#================================================================================#
+
+import numpy as np
+
+
+
+# Functional (word-level) simulator of the IR3 words of an assembler (DavinciAsm).
+# Register contents are kept as unsigned 16-bit patterns (in np.int64 arrays),
+#   mvRegs : PiCaSO register files, indexed by [batch, blkRow, blkCol, reg, pe]
+#   vvRam  : VV-Engine BRAMs (registers and activation tables), indexed by [batch, vvBlk, addr]
+# All blocks of an engine execute the compute operations; only the external
+# writes are restricted to the selected blocks. The leading batch axis is only
+# present in batch mode: the same program is simulated for a batch of inputs
+# at once, where the batch items differ in the data of some write words (see run()).
+class DavinciSim:
+    # shift register modes of the VV-Engine
+    tbl_shiftMode = {
+        'off'      : 0,
+        'serial'   : 1,
+        'parallel' : 2,
+    }
+
+
+    # Parameters:
+    #   asm : the assembler (DavinciAsm), for the instruction formats and parameters.
+    #         The dimensions of the array are taken from mvBlockDim.
+    #   vvFracWidth : no. of fractional bits of the VV-Engine multiplier (FXPFRAC_WIDTH)
+    #   batch : no. of batch items (batch mode), None for a single simulation
+    def __init__(self, asm, vvFracWidth=8, batch=None):
+        assert asm.mvMaxRow, 'Array dimensions are unknown; set mvBlockDim in the assembler parameters'
+        self.picaso_as  = asm.picaso_as
+        self.vvblock_as = asm.vvblock_as
+        self.submCodes  = {name : code for name, code in asm.tbl_submCode.items() if code >= 0}
+        self.submShift  = asm.tbl_field_width['submInstr']
+        self.fracWidth  = asm.fracWidth
+        self.vvFracWidth = vvFracWidth
+        self.batch = batch
+        self.lead = () if batch is None else (batch,)     # shape of the leading (batch) axes of the state
+        # dimensions
+        picaso_as = self.picaso_as
+        self.peCount  = picaso_as.peCount
+        self.regWidth = picaso_as.regWidth
+        self.regMask  = 2**self.regWidth - 1
+        self.blkRows  = asm.mvMaxRow
+        self.blkCols  = asm.mvMaxCol // self.peCount
+        self.mvRegCnt = picaso_as.pimDepth // self.regWidth
+        self.vvBlkCnt = self.blkRows        # one VV-Engine block per PiCaSO block-row
+        self.vvDepth  = 2**self.vvblock_as.tbl_field_width['addr']
+        self.mvExec = self.makeMvDispatch()
+        self.vvExec = self.makeVvDispatch()
+        self.reset()
+
+
+    # Clears the state of both engines and the FIFO
+    def reset(self):
+        shape = self.lead + (self.blkRows, self.blkCols)
+        self.mvRegs = np.zeros(shape + (self.mvRegCnt, self.peCount), dtype=np.int64)
+        self.mvSel  = np.ones((self.blkRows, self.blkCols), dtype=bool)     # all blocks are selected after reset
+        self.mvMbit = np.zeros(shape + (self.peCount,), dtype=np.int64)
+        n = self.vvBlkCnt
+        self.vvRam = np.zeros(self.lead + (n, self.vvDepth), dtype=np.int64)
+        self.vvSel = np.ones(n, dtype=bool)
+        self.vvS   = np.zeros(self.lead + (n,), dtype=np.int64)
+        self.vvO   = np.zeros(self.lead + (n,), dtype=np.int64)
+        self.vvAct = np.zeros(self.lead + (n,), dtype=np.int64)
+        self.shiftMode = self.tbl_shiftMode['off']
+        self.outputs = []       # vectors shifted out to the FIFO (unsigned bit patterns)
+        self.wordCount = 0      # no. of words executed
+
+
+    # Builds the dispatch table of the PiCaSO words, {opcode: handler}
+    def makeMvDispatch(self):
+        opc = self.picaso_as.tbl_opcode
+        return {
+            opc['nop']      : self.mv_nop,
+            opc['write']    : self.mv_write,
+            opc['updatepp'] : self.mv_updatepp,
+            opc['accum']    : self.mv_accum,
+            opc['aluop']    : self.mv_aluop,
+            opc['select']   : self.mv_select,
+            opc['mov']      : self.mv_mov,
+            opc['superop']  : self.mv_superop,
+        }
+
+
+    # Builds the dispatch table of the VV-Engine words, {opcode: handler}
+    def makeVvDispatch(self):
+        opc = self.vvblock_as.tbl_opcode
+        handlers = {}
+        for opcode, code in opc.items():
+            if opcode.startswith('write'): handlers[code] = self.vv_write
+            else: handlers[code] = getattr(self, f'vv_{opcode}')
+        return handlers
+
+
+    # Given the (32-bit) IR3 words of a program, executes them in order.
+    # In batch mode, words can also be a (batch, n) array with the words of
+    # each batch item; the items may only differ in the data of write words,
+    # which are executed with the data of each item at once.
+    # Returns the list of vectors shifted out to the FIFO so far (see getOutputs()).
+    def run(self, words):
+        words = np.asarray(words, dtype=np.uint32)
+        batchData = {}      # {word index: data of each batch item}
+        if words.ndim == 2:
+            assert words.shape[0] == self.batch, f'Expected words of {self.batch} batch items, got {words.shape[0]}'
+            dataWidth = self.picaso_as.tbl_field_width['data']
+            diff = words ^ words[0]
+            assert not np.any(diff >> np.uint32(dataWidth)), 'Batch items may only differ in the data of write words'
+            dataMask = np.uint32(2**dataWidth - 1)
+            batchData = {idx : (words[:, idx] & dataMask).astype(np.int64) for idx in np.flatnonzero(diff.any(axis=0)).tolist()}
+            words = words[0]
+        submCode = (words >> np.uint32(self.submShift)).tolist()
+        instrMask = 2**self.submShift - 1
+        mvCode, vvCode = self.submCodes['mv'], self.submCodes['vv']
+        mvShift = self.picaso_as.tbl_field_width['seg0'] + self.picaso_as.tbl_field_width['seg1']
+        vvShift = self.vvblock_as.tbl_field_width['seg0'] + self.vvblock_as.tbl_field_width['seg1']
+        mvWrite = self.mvExec[self.picaso_as.tbl_opcode['write']]
+        for idx, (subm, word) in enumerate(zip(submCode, words.tolist())):
+            word &= instrMask
+            if subm == mvCode:
+                opcode = word >> mvShift
+                assert opcode in self.mvExec, f'Invalid PiCaSO opcode {opcode} in word {self.wordCount}: 0x{word:08x}'
+                handler = self.mvExec[opcode]
+            elif subm == vvCode:
+                opcode = word >> vvShift
+                assert opcode in self.vvExec, f'Invalid VV-Engine opcode {opcode} in word {self.wordCount}: 0x{word:08x}'
+                handler = self.vvExec[opcode]
+            else:
+                assert 0, f'Invalid submodule code {subm} in word {self.wordCount}: 0x{word:08x}'
+            if idx in batchData:
+                assert handler in (mvWrite, self.vv_write), f'Batch items differ in a non-write word {self.wordCount}: 0x{word:08x}'
+                handler(word, batchData[idx])
+            else:
+                handler(word)
+            self.wordCount += 1
+        return self.getOutputs()
+
+
+    # ---- Value conversions
+
+    # Given unsigned bit patterns, returns the 2's complement (signed) values
+    def toSigned(self, vals):
+        vals = np.asarray(vals, dtype=np.int64)
+        return np.where(vals >> (self.regWidth-1), vals - 2**self.regWidth, vals)
+
+
+    # Returns the list of vectors shifted out to the FIFO as signed integers
+    # (fixed-point bit patterns), each of shape (batch, vvBlkCnt) in batch mode
+    def getOutputs(self):
+        return [self.toSigned(vec) for vec in self.outputs]
+
+
+    # Returns the signed values of the given PiCaSO register, as a (blkRows, mvMaxCol) matrix
+    def getMvReg(self, reg):
+        return self.toSigned(self.mvRegs[..., reg, :].reshape(self.lead + (self.blkRows, -1)))
+
+
+    # Returns the signed values of the given VV-Engine register of all blocks
+    def getVvReg(self, reg):
+        return self.toSigned(self.vvRam[..., reg])
+
+
+    # Writes the FIFO outputs as an expected-output file, in the format read
+    # by the testbenches ($readmemb): {flags}_{data} per element, where the
+    # last element of each vector is flagged.
+    def export_expBin(self, filename):
+        assert self.batch is None, 'Expected outputs can only be written for a single simulation'
+        scaleFact = 1 << self.fracWidth
+        lines = []
+        for vec in self.getOutputs():
+            prefix = np.full(len(vec), 0x0100)
+            prefix[-1] = 0x0300     # last element of the vector
+            for pre, e in zip(prefix.tolist(), vec.tolist()):
+                lines.append(f'{pre:016b}_{e & self.regMask:016b}    // data: {e:6} ({e/scaleFact})\n')
+        with open(filename, 'w') as fout:
+            fout.writelines(lines)
+        print(f'INFO: expected outputs ({len(lines)} elements) written to {filename}')
+
+
+    # ---- PiCaSO (MV-Engine) operations
+
+    # Given a PiCaSO word, returns the fields (seg1, rs2, rs1)
+    def mvFields(self, word):
+        fw = self.picaso_as.tbl_field_width
+        seg1 = (word >> fw['seg0']) & (2**fw['seg1'] - 1)
+        rs2 = (word >> fw['reg']) & (2**fw['reg'] - 1)
+        rs1 = word & (2**fw['reg'] - 1)
+        return seg1, rs2, rs1
+
+
+    # Given a PiCaSO word, returns the Fn/OFFSET field (upper bits of seg1)
+    def mvFncode(self, word):
+        fw = self.picaso_as.tbl_field_width
+        seg1 = (word >> fw['seg0']) & (2**fw['seg1'] - 1)
+        return seg1 >> fw['reg']
+
+
+    # Given the values written by the ALUs of PE-0 of the west-most blocks
+    # (streamed lsb first), shifts them into the VV-Engine S registers.
+    # The S register only captures the serial input in serial mode.
+    def mvSerialOut(self, vals, nbits):
+        if self.shiftMode != self.tbl_shiftMode['serial']: return
+        W = self.regWidth
+        self.vvS = ((self.vvS | (vals << W)) >> nbits) & self.regMask
+
+
+    # Writes the given values (blkRows, blkCols, pe) into a register of all blocks
+    def mvWriteReg(self, reg, vals, nbits=None):
+        self.mvRegs[..., reg, :] = vals
+        self.mvSerialOut(vals[..., :, 0, 0], nbits or self.regWidth)
+
+
+    def mv_nop(self, word):
+        pass
+
+
+    # [ opcode ] [ ADDR ] [ DATA ]: bit-row ADDR of the selected blocks, bit p of DATA goes to PE p.
+    # data overrides the DATA field, e.g., the data of each batch item.
+    def mv_write(self, word, data=None):
+        addr = (word >> self.picaso_as.tbl_field_width['seg0']) & (2**self.picaso_as.tbl_field_width['addr'] - 1)
+        if data is None: data = word & (2**self.picaso_as.tbl_field_width['data'] - 1)
+        reg, bit = divmod(addr, self.regWidth)
+        bits = (np.asarray(data)[..., np.newaxis, np.newaxis] >> np.arange(self.peCount)) & 1
+        rows = self.mvRegs[..., reg, :]
+        sel = self.mvSel
+        rows[..., sel, :] = (rows[..., sel, :] & ~(1 << bit)) | (bits << bit)
+
+
+    # [ opcode ] [ Fn, xx ] [ Row, Col ]
+    def mv_select(self, word):
+        fn = self.picaso_as.tbl_fncode
+        w_id = self.picaso_as.tbl_field_width['id']
+        fncode = self.mvFncode(word)
+        rowID = (word >> w_id) & (2**w_id - 1)
+        colID = word & (2**w_id - 1)
+        rows = np.arange(self.blkRows)[:, None]
+        cols = np.arange(self.blkCols)[None, :]
+        if fncode == fn['sel_block']: sel = (rows == rowID) & (cols == colID)
+        elif fncode == fn['sel_row']: sel = (rows == rowID) & (cols >= 0)
+        elif fncode == fn['sel_col']: sel = (rows >= 0) & (cols == colID)
+        else: sel = np.ones((self.blkRows, self.blkCols), dtype=bool)     # sel_enc
+        self.mvSel = sel
+
+
+    # [ opcode ] [ Fn, RD ] [ RS2, RS1 ]: RD = RS1 (op) RS2
+    def mv_aluop(self, word):
+        fn = self.picaso_as.tbl_fncode
+        fncode = self.mvFncode(word)
+        seg1, rs2, rs1 = self.mvFields(word)
+        rd = seg1 & (2**self.picaso_as.tbl_field_width['reg'] - 1)
+        x = self.mvRegs[..., rs1, :]
+        y = self.mvRegs[..., rs2, :]
+        if fncode == fn['alu_add']: res = x + y
+        elif fncode == fn['alu_sub']: res = x - y
+        elif fncode == fn['alu_cpx']: res = x
+        else: res = y       # alu_cpy
+        self.mvWriteReg(rd, res & self.regMask)
+
+
+    # [ opcode ] [ OFFSET, RD ] [ RS2, RS1 ]: booth's radix-2 step on the
+    # partial product {RD+1, RD}, multiplicand RS2, multiplier bit RS1[OFFSET].
+    # The step writes the 16-bit window at OFFSET and its sign extension.
+    def mv_updatepp(self, word):
+        offset = self.mvFncode(word)
+        seg1, rs2, rs1 = self.mvFields(word)
+        rd = seg1 & (2**self.picaso_as.tbl_field_width['reg'] - 1)
+        assert rd+1 < self.mvRegCnt, f'Partial product register {rd} has no upper half, word {self.wordCount}'
+        W, mask = self.regWidth, self.regMask
+        regs = self.mvRegs
+        pp = regs[..., rd, :] | (regs[..., rd+1, :] << W)
+        cur = (regs[..., rs1, :] >> offset) & 1
+        prev = self.mvMbit
+        mcand = regs[..., rs2, :]
+        window = (pp >> offset) & mask
+        if offset == 0: window = np.zeros_like(window)      # the first step starts from 0 (opmux 0_op_B)
+        res = np.where(cur < prev, window + mcand,          # {cur, prev} = 01: add
+              np.where(cur > prev, window - mcand, window))  # 10: subtract, 00/11: copy
+        res &= mask
+        ext = res >> (W-1)      # sign extension of the partial product
+        out = res | (ext << W)
+        pp = (pp & ~(((1 << (W+1)) - 1) << offset)) | (out << offset)
+        regs[..., rd, :] = pp & mask
+        regs[..., rd+1, :] = (pp >> W) & mask
+        self.mvMbit = cur
+        self.mvSerialOut(out[..., :, 0, 0], W+1)
+
+
+    # [ opcode ] [ Fn, Param ] [ R2, R1 ]
+    #   accum_blk : R2 = R1 + fold(R1), the upper half of the active PEs is added to the lower half
+    #   accum_row : PE-0 of R1 += PE-0 of R1 of the block 2^Param columns to the east, in every
+    #               2^(Param+1)-th block column
+    def mv_accum(self, word):
+        fn = self.picaso_as.tbl_fncode
+        fncode = self.mvFncode(word)
+        seg1, rs2, rs1 = self.mvFields(word)
+        param = seg1 & (2**self.picaso_as.tbl_field_width['param'] - 1)
+        regs = self.mvRegs
+        if fncode == fn['accum_blk']:
+            half = self.peCount >> param
+            acc = regs[..., rs1, :].copy()
+            acc[..., :half] += regs[..., rs1, half:2*half]
+            self.mvWriteReg(rs2, acc & self.regMask)
+        elif fncode == fn['accum_row']:
+            hop = 2**param
+            acc = regs[..., rs1, :].copy()
+            recv = np.arange(0, self.blkCols, 2*hop)     # receiver block columns
+            send = recv + hop
+            valid = send < self.blkCols                 # beyond the east edge: adds 0
+            acc[..., recv[valid], 0] += regs[..., send[valid], rs1, 0]
+            regs[..., recv, rs1, :] = acc[..., recv, :] & self.regMask
+            self.mvSerialOut(regs[..., :, 0, rs1, 0], self.regWidth)
+        else:
+            assert 0, f'Invalid accum fncode {fncode} in word {self.wordCount}'
+
+
+    # [ opcode ] [ Fn, OFFSET ] [ RS2, RS1 ]: mov_offset, RS2 = {RS1+1, RS1} >> OFFSET
+    def mv_mov(self, word):
+        seg1, rd, rs = self.mvFields(word)
+        offset = seg1 & (2**self.picaso_as.tbl_field_width['offset'] - 1)
+        regs = self.mvRegs
+        val = regs[..., rs, :]
+        if offset and rs+1 < self.mvRegCnt: val = val | (regs[..., rs+1, :] << self.regWidth)
+        self.mvWriteReg(rd, (val >> offset) & self.regMask)
+
+
+    # [ opcode ] [ SCODE ] [ 0 ]
+    def mv_superop(self, word):
+        scode, _, _ = self.mvFields(word)
+        assert scode == self.picaso_as.tbl_super_code['clrmbit'], f'Invalid super-op code {scode} in word {self.wordCount}'
+        self.mvMbit = np.zeros_like(self.mvMbit)
+
+
+    # ---- VV-Engine operations
+
+    # Given a VV-Engine word, returns the fields (rs2, rs1)
+    def vvFields(self, word):
+        w_reg = self.vvblock_as.tbl_field_width['reg']
+        return (word >> w_reg) & (2**w_reg - 1), word & (2**w_reg - 1)
+
+
+    # Given the operands (unsigned bit patterns), returns the fixed-point product
+    def vvMult(self, x, y):
+        return ((self.toSigned(x) * self.toSigned(y)) >> self.vvFracWidth) & self.regMask
+
+
+    # Loads the S registers; they hold zeros while the vector is shifted out
+    def vvLoadS(self, vals):
+        if self.shiftMode == self.tbl_shiftMode['parallel']: return
+        self.vvS = vals & self.regMask
+
+
+    def vv_nop(self, word):
+        pass
+
+
+    # [ opcode ] [ addr ] [ data ]: the MSb of the address overlaps with the LSb of the opcode.
+    # data overrides the data field, e.g., the data of each batch item.
+    def vv_write(self, word, data=None):
+        fw = self.vvblock_as.tbl_field_width
+        addr = (word >> fw['seg0']) & (2**fw['addr'] - 1)
+        if data is None: data = word & (2**fw['data'] - 1)
+        self.vvRam[..., self.vvSel, addr] = np.asarray(data)[..., np.newaxis]
+
+
+    def vv_add_xy(self, word):
+        rs2, rs1 = self.vvFields(word)
+        self.vvO = (self.vvRam[..., rs2] + self.vvRam[..., rs1]) & self.regMask
+
+    def vv_sub_xy(self, word):
+        rs2, rs1 = self.vvFields(word)
+        self.vvO = (self.vvRam[..., rs2] - self.vvRam[..., rs1]) & self.regMask
+
+    def vv_mult_xy(self, word):
+        rs2, rs1 = self.vvFields(word)
+        self.vvO = self.vvMult(self.vvRam[..., rs2], self.vvRam[..., rs1])
+
+    def vv_add_xsreg(self, word):
+        rs2, _ = self.vvFields(word)
+        self.vvO = (self.vvRam[..., rs2] + self.vvS) & self.regMask
+
+    def vv_sub_xsreg(self, word):
+        rs2, _ = self.vvFields(word)
+        self.vvO = (self.vvRam[..., rs2] - self.vvS) & self.regMask
+
+    def vv_mult_xsreg(self, word):
+        rs2, _ = self.vvFields(word)
+        self.vvO = self.vvMult(self.vvRam[..., rs2], self.vvS)
+
+    def vv_relu(self, word):
+        self.vvO = np.where(self.toSigned(self.vvAct) < 0, 0, self.vvAct)
+
+
+    # O = table[actCode][addr], the address is mapped from ACT as in VVBram.mapACT2Addr()
+    def vv_actlookup(self, word):
+        actcode = word & (2**self.vvblock_as.tbl_field_width['actcode'] - 1)
+        msb5 = (self.vvAct >> 11) & 0x1F
+        addr = np.where((msb5 == 0) | (msb5 == 0x1F), (self.vvAct >> 4) & 0xFF,
+               np.where(msb5 >> 4, 2**7, 2**7 - 1))     # -ve/+ve saturation
+        self.vvO = np.take_along_axis(self.vvRam, ((actcode << 8) + addr)[..., np.newaxis], axis=-1)[..., 0]
+
+
+    def vv_shiftoff(self, word):
+        self.shiftMode = self.tbl_shiftMode['off']
+
+    def vv_serial_en(self, word):
+        self.shiftMode = self.tbl_shiftMode['serial']
+
+
+    # Shifts the S registers out to the FIFO (block 0 first); zeros are shifted in
+    def vv_parallel_en(self, word):
+        self.outputs.append(self.vvS.copy())
+        self.vvS = np.zeros_like(self.vvS)
+        self.shiftMode = self.tbl_shiftMode['parallel']
+
+
+    def vv_selectblk(self, word):
+        blkID, _ = self.vvFields(word)
+        self.vvSel = np.arange(self.vvBlkCnt) == blkID
+
+    def vv_selectall(self, word):
+        self.vvSel = np.ones(self.vvBlkCnt, dtype=bool)
+
+    def vv_mov_o2sreg(self, word):
+        self.vvLoadS(self.vvO)
+
+    def vv_mov_y2sreg(self, word):
+        _, rs1 = self.vvFields(word)
+        self.vvLoadS(self.vvRam[..., rs1])
+
+    def vv_mov_sreg2r(self, word):
+        _, rs1 = self.vvFields(word)
+        self.vvRam[..., rs1] = self.vvS
+
+    def vv_mov_oreg2r(self, word):
+        _, rs1 = self.vvFields(word)
+        self.vvRam[..., rs1] = self.vvO
+
+    def vv_mov_y2oreg(self, word):
+        _, rs1 = self.vvFields(word)
+        self.vvO = self.vvRam[..., rs1].copy()
+
+    def vv_mov_oreg2act(self, word):
+        self.vvAct = self.vvO.copy()
+
+    def vv_mov_x2act(self, word):
+        rs2, _ = self.vvFields(word)
+        self.vvAct = self.vvRam[..., rs2].copy()
+
+
+
+# Bit-plane accurate variant of the simulator. The PiCaSO register files are
+# kept as the BRAM images of the blocks, as created by DavinciAsm.makeBramImage(),
+#   mvBram : indexed by [blkRow, blkCol, addr], bit p of a BRAM row belongs to PE p
+# and the PiCaSO operations are executed bit-serially (lsb first) on bit-planes,
+# i.e., one BRAM row of all blocks at a time, the same way the serial ALUs of the
+# PEs compute them. The VV-Engine is the same as the word-level simulator.
+class DavinciBitSim(DavinciSim):
+    # Clears the state of both engines and the FIFO
+    def reset(self):
+        super().reset()
+        shape = self.lead + (self.blkRows, self.blkCols)
+        self.mvRegs = None      # replaced by the BRAM images
+        self.mvBram = np.zeros(shape + (self.picaso_as.pimDepth,), dtype=np.uint16)
+        self.mvMbit = np.zeros(shape, dtype=np.uint16)      # previous multiplier bit of each PE
+
+
+    # Returns the signed values of the given PiCaSO register, as a (blkRows, mvMaxCol) matrix
+    def getMvReg(self, reg):
+        W = self.regWidth
+        planes = self.mvBram[..., reg*W:(reg+1)*W].astype(np.int64)
+        bits = (planes[..., np.newaxis] >> np.arange(self.peCount)) & 1       # [batch, blkRow, blkCol, bitNo, peNo]
+        vals = (bits << np.arange(W).reshape(-1, 1)).sum(axis=-2)
+        return self.toSigned(vals.reshape(self.lead + (self.blkRows, -1)))
+
+
+    # Returns a copy of the BRAM images of all blocks, indexed by [batch, blkRow, blkCol, addr]
+    def getBramImage(self):
+        return self.mvBram.copy()
+
+
+    # Bit-serial ALU (boothR2_serial_alu) of all PEs of all blocks. Given the
+    # bit-planes of the operands X and Y (lsb first along the last axis), and
+    # the PEs that add (x + y) or subtract (x - y) as bit-masks, returns the
+    # bit-planes of the output; the rest of the PEs copy x.
+    def serialAlu(self, X, Y, addMask, subMask):
+        cpMask = ~(addMask | subMask)
+        cb = np.zeros_like(X[..., 0])       # carry/borrow FF of each PE
+        out = np.empty_like(X)
+        for i in range(X.shape[-1]):
+            x, y = X[..., i], Y[..., i]
+            carry  = (x & y) | (x & cb) | (y & cb)
+            borrow = (~x & y) | (~x & cb) | (y & cb)
+            out[..., i] = ((x ^ y ^ cb) & ~cpMask) | (x & cpMask)
+            cb = (carry & addMask) | (borrow & subMask)
+        return out
+
+
+    # Given the bit-planes written by the ALUs, streams the bits of PE-0 of
+    # the west-most blocks to the VV-Engine
+    def mvSerialOutPlanes(self, planes):
+        bits = (planes[..., :, 0, :] & 1).astype(np.int64)
+        vals = (bits << np.arange(bits.shape[-1])).sum(axis=-1)
+        self.mvSerialOut(vals, bits.shape[-1])
+
+
+    # Writes the given bit-planes [batch, blkRow, blkCol, bitNo] from the given BRAM row onwards
+    def mvWritePlanes(self, addr, planes):
+        self.mvBram[..., addr:addr+planes.shape[-1]] = planes
+        self.mvSerialOutPlanes(planes)
+
+
+    # Returns the bit-planes of the given register
+    def mvReadPlanes(self, reg):
+        W = self.regWidth
+        return self.mvBram[..., reg*W:(reg+1)*W]
+
+
+    # [ opcode ] [ ADDR ] [ DATA ]: bit-row ADDR of the selected blocks
+    def mv_write(self, word, data=None):
+        addr = (word >> self.picaso_as.tbl_field_width['seg0']) & (2**self.picaso_as.tbl_field_width['addr'] - 1)
+        if data is None: data = word & (2**self.picaso_as.tbl_field_width['data'] - 1)
+        self.mvBram[..., self.mvSel, addr] = np.asarray(data)[..., np.newaxis]
+
+
+    # [ opcode ] [ Fn, RD ] [ RS2, RS1 ]: RD = RS1 (op) RS2
+    def mv_aluop(self, word):
+        fn = self.picaso_as.tbl_fncode
+        fncode = self.mvFncode(word)
+        seg1, rs2, rs1 = self.mvFields(word)
+        rd = seg1 & (2**self.picaso_as.tbl_field_width['reg'] - 1)
+        X, Y = self.mvReadPlanes(rs1), self.mvReadPlanes(rs2)
+        ones, zeros = np.uint16(self.regMask), np.uint16(0)
+        if fncode == fn['alu_add']: out = self.serialAlu(X, Y, ones, zeros)
+        elif fncode == fn['alu_sub']: out = self.serialAlu(X, Y, zeros, ones)
+        elif fncode == fn['alu_cpx']: out = X.copy()
+        else: out = Y.copy()    # alu_cpy
+        self.mvWritePlanes(rd*self.regWidth, out)
+
+
+    # [ opcode ] [ OFFSET, RD ] [ RS2, RS1 ]: booth's radix-2 step. The window
+    # of the partial product starts at bit-row OFFSET of RD (it runs into RD+1),
+    # the PEs select add/sub/copy from the current and previous multiplier bits.
+    def mv_updatepp(self, word):
+        offset = self.mvFncode(word)
+        seg1, rs2, rs1 = self.mvFields(word)
+        rd = seg1 & (2**self.picaso_as.tbl_field_width['reg'] - 1)
+        assert rd+1 < self.mvRegCnt, f'Partial product register {rd} has no upper half, word {self.wordCount}'
+        W = self.regWidth
+        base = rd*W + offset
+        cur = self.mvBram[..., rs1*W + offset]
+        prev = self.mvMbit
+        X = self.mvBram[..., base:base+W]
+        if offset == 0: X = np.zeros_like(X)      # the first step starts from 0 (opmux 0_op_B)
+        out = self.serialAlu(X, self.mvReadPlanes(rs2), ~cur & prev, cur & ~prev)
+        out = np.concatenate([out, out[..., -1:]], axis=-1)     # sign extension, the last bit is written again
+        self.mvWritePlanes(base, out)
+        self.mvMbit = cur.copy()
+
+
+    # [ opcode ] [ Fn, Param ] [ R2, R1 ]: the operand Y is the folded R1 (accum_blk),
+    # or the PE-0 bit stream from the east block (accum_row)
+    def mv_accum(self, word):
+        fn = self.picaso_as.tbl_fncode
+        fncode = self.mvFncode(word)
+        seg1, rs2, rs1 = self.mvFields(word)
+        param = seg1 & (2**self.picaso_as.tbl_field_width['param'] - 1)
+        ones, zeros = np.uint16(self.regMask), np.uint16(0)
+        A = self.mvReadPlanes(rs1)
+        if fncode == fn['accum_blk']:
+            half = self.peCount >> param
+            Y = (A >> half) & np.uint16(2**half - 1)        # upper half of the PEs to the lower half
+            self.mvWritePlanes(rs2*self.regWidth, self.serialAlu(A, Y, ones, zeros))
+        elif fncode == fn['accum_row']:
+            hop = 2**param
+            recv = np.arange(0, self.blkCols, 2*hop)     # receiver block columns
+            send = recv + hop
+            Y = np.zeros_like(A[..., recv, :])
+            valid = send < self.blkCols                 # beyond the east edge: adds 0
+            Y[..., valid, :] = A[..., send[valid], :] & np.uint16(1)
+            out = self.serialAlu(A[..., recv, :], Y, ones, zeros)
+            W = self.regWidth
+            self.mvBram[..., recv, rs1*W:(rs1+1)*W] = out
+            self.mvSerialOutPlanes(out)
+        else:
+            assert 0, f'Invalid accum fncode {fncode} in word {self.wordCount}'
+
+
+    # [ opcode ] [ Fn, OFFSET ] [ RS2, RS1 ]: mov_offset, RS2 = bit-rows OFFSET onwards of RS1
+    def mv_mov(self, word):
+        seg1, rd, rs = self.mvFields(word)
+        offset = seg1 & (2**self.picaso_as.tbl_field_width['offset'] - 1)
+        W = self.regWidth
+        base = rs*W + offset
+        out = np.zeros_like(self.mvReadPlanes(rd))
+        src = self.mvBram[..., base:base+W]
+        out[..., :src.shape[-1]] = src
+        self.mvWritePlanes(rd*W, out)
+
+
+    # [ opcode ] [ SCODE ] [ 0 ]
+    def mv_superop(self, word):
+        scode, _, _ = self.mvFields(word)
+        assert scode == self.picaso_as.tbl_super_code['clrmbit'], f'Invalid super-op code {scode} in word {self.wordCount}'
+        self.mvMbit = np.zeros_like(self.mvMbit)
@@ -0,0 +1,157 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the GEMV tiling layer of DavinciAsm. A matrix of any  #
+#   size is split into tiles of the PiCaSO array dimension (mvBlockDim); each    #
+#   tile is loaded, multiplied with its segment of the vector (MV_MULTFXP) and   #
+#   accumulated along the rows (MV_RNGACCUM), shifting the partial results into  #
+#   the VV-Engine, where the partials of the same rows are accumulated. The tile #
+#   order is chosen to minimize the vector reloads for the available registers.  #
+#   The registers are virtual (see davinci_regalloc.py).                         #
+#                                                                                #
+#================================================================================#
+
+import numpy as np
+
+
+
+# GEMV tiling layer. Each row-tile of the result ends up in a VV-Engine
+# register, one element per VV-Engine block (PiCaSO block row).
+class DavinciTiler:
+    # Parameters:
+    #   asm : the assembler (DavinciAsm), for the array dimension and the register counts
+    def __init__(self, asm):
+        assert asm.mvMaxRow and asm.mvMaxCol, 'Dimension of the PiCaSO array is unknown; set mvBlockDim in the assembler parameters'
+        self.asm = asm
+        self.tileRows = asm.mvMaxRow    # one PE row per block row
+        self.tileCols = asm.mvMaxCol
+
+
+    # Given the shape of a matrix, returns the no. of (row, column) tiles
+    def getTileGrid(self, shape):
+        rowCnt, colCnt = shape
+        return -(-rowCnt // self.tileRows), -(-colCnt // self.tileCols)
+
+
+    # Returns the no. of vector segments that can stay in MV-Engine registers,
+    # besides the matrix, the product pair (+1 for alignment), the fixed-point
+    # product and the row sums of a tile
+    def getResidentCnt(self):
+        return self.asm.picaso_as.regCnt - 6
+
+
+    # Given the no. of (row, column) tiles, returns (order, vecLoads), the tile
+    # order with the fewest vector loads and its no. of vector loads,
+    #   col : column by column; each vector segment is loaded once, the
+    #         partials of all row-tiles are kept in VV-Engine registers
+    #   row : row by row; one VV-Engine register accumulates, the vector
+    #         segments are kept in MV-Engine registers if they fit, reloaded otherwise
+    # Ties go to the row order, which needs fewer VV-Engine registers.
+    def planOrder(self, rowTiles, colTiles):
+        vvFree = self.asm.vvblock_as.regCnt - 1     # register 0 is not allocated
+        rowLoads = colTiles if colTiles <= self.getResidentCnt() else rowTiles*colTiles
+        if rowTiles > vvFree or rowLoads <= colTiles: return 'row', rowLoads
+        return 'col', colTiles
+
+
+    # Returns the smallest valid colCnt of MV_RNGACCUM that covers the given no. of columns
+    def getAccumCnt(self, colCnt):
+        picaso_as = self.asm.picaso_as
+        validCounts = [2**i * picaso_as.peCount for i in range(picaso_as.maxLevel+2)]
+        return min([cnt for cnt in validCounts if cnt >= colCnt], default=validCounts[-1])
+
+
+    # Given a matrix and a vector, records the instructions of matrix @ vector
+    # into the register allocator ra (DavinciRegAlloc). Returns the list of the
+    # VV-Engine (virtual) registers of the row-tiles of the result.
+    # Options:
+    #   order   : tile order (row/col, see planOrder()), the one with the fewest vector loads if None
+    #   comment : comment of the instructions
+    def gemv(self, ra, matrix, vector, *, order=None, comment=None):
+        VVREG = self.asm.VVREG
+        matrix = np.asarray(matrix)
+        vector = np.asarray(vector)
+        assert matrix.ndim == 2 and vector.ndim == 1, f'Expected a matrix and a vector, got arrays of shape {matrix.shape} and {vector.shape}'
+        assert matrix.shape[1] == len(vector), f'Column count ({matrix.shape[1]}) of the matrix does not match the vector length ({len(vector)})'
+        rowTiles, colTiles = self.getTileGrid(matrix.shape)
+        if order is None: order, _ = self.planOrder(rowTiles, colTiles)
+        assert order in {'row', 'col'}, f'Invalid tile order: {order}'
+        if order == 'row': tiles = [(i, j) for i in range(rowTiles) for j in range(colTiles)]
+        else: tiles = [(i, j) for j in range(colTiles) for i in range(rowTiles)]
+        # vector segments of the row order stay resident if they fit
+        resident = order == 'col' or colTiles <= self.getResidentCnt()
+        vecRegs = {}
+        accRegs = {}
+        for i, j in tiles:
+            rows = slice(i*self.tileRows, (i+1)*self.tileRows)
+            cols = slice(j*self.tileCols, (j+1)*self.tileCols)
+            tileCmt = f'tile ({i}, {j}) of {rowTiles}x{colTiles}' + (f'; {comment}' if comment else '')
+            if j not in vecRegs or not resident:
+                vecRegs[j] = ra.mvReg(f'vec{j}')
+                ra.mv_LOADVEC_ROW(vecRegs[j], vector[cols], comment=tileCmt)
+            mat = ra.mvReg(f'mat{i}_{j}')
+            prod = ra.mvReg(f'prod{i}_{j}')
+            rsum = ra.mvReg(f'rsum{i}_{j}')
+            ra.mv_LOADMAT(mat, matrix[rows, cols], comment=tileCmt)
+            ra.mv_MULTFXP(prod, vecRegs[j], mat, comment=tileCmt)
+            # shift the row sums into the S registers of VV-Engine
+            ra.vv_serialEn(comment=tileCmt)
+            ra.mv_RNGACCUM(self.getAccumCnt(matrix[rows, cols].shape[1]), rsum, prod, comment=tileCmt)
+            ra.mv_SYNC(comment=tileCmt)
+            ra.vv_shiftOff(comment=tileCmt)
+            # accumulate the partials of the row-tile
+            if i not in accRegs:
+                accRegs[i] = ra.vvReg(f'acc{i}')
+                ra.vv_mov(accRegs[i], VVREG.S, comment=tileCmt)
+            else:
+                ra.vv_add(accRegs[i], VVREG.S, comment=tileCmt)
+                ra.vv_mov(accRegs[i], VVREG.O, comment=tileCmt)
+        return [accRegs[i] for i in range(rowTiles)]
+
+
+    # Records the instructions that shift out the given VV-Engine registers
+    # (one vector each) to the FIFO, in order
+    def shiftOut(self, ra, vregs, *, comment=None):
+        VVREG = self.asm.VVREG
+        for vreg in vregs:
+            ra.vv_shiftOff(comment=comment)     # S ignores loads in parallel mode
+            ra.vv_mov(VVREG.S, vreg, comment=comment)
+            ra.vv_parallelEn(comment=comment)
+
+
+    # Same as gemv(), using a register allocator of its own: the instructions
+    # are added to the assembler right away, followed by the shifting out of
+    # the result if shiftOut is set. All registers (of the assembler
+    # parameters) may be used. Returns the VV-Engine registers of the row-tiles.
+    def addGemv(self, matrix, vector, *, order=None, shiftOut=True, comment=None):
+        ra = self.asm.regAllocator()
+        accRegs = self.gemv(ra, matrix, vector, order=order, comment=comment)
+        if shiftOut: self.shiftOut(ra, accRegs, comment=comment)
+        alloc = ra.allocate()
+        return [alloc[vreg] for vreg in accRegs]
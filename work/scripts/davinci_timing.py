@@ -0,0 +1,213 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the static timing model of DA-VinCi programs. Each    #
+#   assembled instruction word is assigned a cycle cost from the controllers of  #
+#   its submodule (bit-serial PiCaSO operations, VV-Engine wait cycles). The     #
+#   front-end interface is modeled as an in-order dispatcher that issues one     #
+#   word per cycle and stalls while the target submodule is busy, so the MV and  #
+#   VV engines only overlap when their instructions are interleaved. The latency #
+#   of a program is estimated in seconds instead of hours of RTL simulation.     #
+#                                                                                #
+#================================================================================#
+
+import numpy as np
+
+
+
+# Static timing model of the IR3 instruction words of an assembler (DavinciAsm)
+class DavinciTiming:
+    # VV-Engine: no. of cycles of the multi-cycle opcodes (see getWaitCycles()
+    # in vvcontroller.sv); all other opcodes take a single cycle
+    tbl_vvCycles = {
+        'add_xy'     : 4,
+        'sub_xy'     : 4,
+        'add_xsreg'  : 4,
+        'sub_xsreg'  : 4,
+        'mult_xy'    : 6,
+        'mult_xsreg' : 6,
+        'actlookup'  : 3,
+        'mov_y2sreg' : 3,
+        'mov_y2oreg' : 3,
+        'mov_x2act'  : 3,
+    }
+
+
+    # Parameters:
+    #   asm      : the assembler (DavinciAsm), for the instruction formats and parameters
+    #   vvBlkCnt : no. of VV-Engine blocks, i.e., elements shifted out to the FIFO after PARALLEL_EN
+    #   clkFreq  : clock frequency in MHz
+    def __init__(self, asm, vvBlkCnt, clkFreq=100):
+        self.picaso_as  = asm.picaso_as
+        self.vvblock_as = asm.vvblock_as
+        self.submCodes  = {name : code for name, code in asm.tbl_submCode.items() if code >= 0}
+        self.submShift  = asm.tbl_field_width['submInstr']
+        self.vvBlkCnt = vvBlkCnt
+        self.clkFreq  = clkFreq
+        self.mvCycles = self.makeMvCycleTable()
+        self.vvCycles = self.makeVvCycleTable()
+
+
+    # Builds the cycle table of the PiCaSO (MV-Engine) words, indexed by
+    # [opcode, fncode, param]. write, select, nop and superop take a single
+    # cycle; the cycles of the multi-cycle operations on P-bit registers are,
+    #   aluop     : 4 setup cycles, 5 cycles per nibble, 3 cycles between nibbles (bit-serial ALU)
+    #   updatepp  : same as aluop, plus 2 cycles for the booth multiplier-bit update
+    #   mov       : stream FSM, 5 setup cycles + P bits (mov_offset)
+    #   accum_blk : stream FSM through the opmux fold network, same for all folds
+    #   accum_row : stream FSM, plus 2^level cycles of the row network hops
+    def makeMvCycleTable(self):
+        picaso_as = self.picaso_as
+        fw = picaso_as.tbl_field_width
+        opc, fn = picaso_as.tbl_opcode, picaso_as.tbl_fncode
+        P = picaso_as.regWidth
+        nibbles = P//4
+        aluCycles = 4 + 5*nibbles + 3*(nibbles-1)
+        streamCycles = 5 + P
+        table = np.ones((2**fw['opcode'], 2**fw['fncode'], 2**fw['param']), dtype=np.int64)
+        table[opc['aluop']] = aluCycles
+        table[opc['updatepp']] = aluCycles + 2
+        table[opc['mov']] = streamCycles
+        table[opc['accum'], fn['accum_blk']] = streamCycles
+        table[opc['accum'], fn['accum_row']] = streamCycles + 2**np.arange(2**fw['param'])
+        return table
+
+
+    # Builds the cycle table of the VV-Engine words, indexed by opcode. After
+    # PARALLEL_EN, the engine stays busy until the last element of the vector
+    # is shifted out to the FIFO (one element per cycle).
+    def makeVvCycleTable(self):
+        vvblock_as = self.vvblock_as
+        opc = vvblock_as.tbl_opcode
+        table = np.ones(2**vvblock_as.tbl_field_width['opcode'], dtype=np.int64)
+        for opcode, cycles in self.tbl_vvCycles.items(): table[opc[opcode]] = cycles
+        table[opc['parallel_en']] = 1 + self.vvBlkCnt
+        return table
+
+
+    # Given the (32-bit) IR3 words, returns the no. of cycles the target
+    # submodule is busy with each word, as an np.int64 array
+    def getCycles(self, words):
+        words = np.asarray(words, dtype=np.uint32)
+        submCode = words >> np.uint32(self.submShift)
+        cycles = np.ones(len(words), dtype=np.int64)
+        # PiCaSO: [ opcode ] [ Fn, xx ] [ xx ], the param (level/fold) is in the low bits of seg1
+        fw = self.picaso_as.tbl_field_width
+        s_seg1 = fw['seg0']
+        s_seg2 = s_seg1 + fw['seg1']
+        s_fn   = s_seg1 + fw['reg']
+        mvWords = words[submCode == self.submCodes['mv']]
+        opcode = (mvWords >> s_seg2) & (2**fw['opcode'] - 1)
+        fncode = (mvWords >> s_fn) & (2**fw['fncode'] - 1)
+        param  = (mvWords >> s_seg1) & (2**fw['param'] - 1)
+        cycles[submCode == self.submCodes['mv']] = self.mvCycles[opcode, fncode, param]
+        # VV-Engine: [ opcode ] [ xx ] [ xx ]
+        fw = self.vvblock_as.tbl_field_width
+        s_seg2 = fw['seg0'] + fw['seg1']
+        vvWords = words[submCode == self.submCodes['vv']]
+        opcode = (vvWords >> s_seg2) & (2**fw['opcode'] - 1)
+        cycles[submCode == self.submCodes['vv']] = self.vvCycles[opcode]
+        return cycles
+
+
+    # Given the (32-bit) IR3 words of a program, simulates the front-end
+    # dispatcher: words are issued in order, at most one per cycle, and a word
+    # waits until its target submodule is done with the previous one. Returns
+    # (issue, total, busy), where issue is the issue cycle of each word, total is
+    # the no. of cycles until all submodules are idle, and busy is the no. of
+    # busy cycles of each submodule {submodule-name: cycles}.
+    def simulateIssue(self, words):
+        words = np.asarray(words, dtype=np.uint32)
+        cycles = self.getCycles(words)
+        submCode = words >> np.uint32(self.submShift)
+        busyUntil = [0] * 2**(32 - self.submShift)
+        issue = []
+        t = 0
+        for subm, cyc in zip(submCode.tolist(), cycles.tolist()):
+            if busyUntil[subm] > t: t = busyUntil[subm]    # stall while the submodule is busy
+            issue.append(t)
+            busyUntil[subm] = t + cyc
+            t += 1
+        total = max(t, *busyUntil)
+        busy = {name : int(cycles[submCode == code].sum()) for name, code in self.submCodes.items()}
+        return np.array(issue, dtype=np.int64), total, busy
+
+
+    # Converts the given no. of cycles into milliseconds
+    def toMs(self, cycles):
+        return cycles / (self.clkFreq * 1e3)
+
+
+    # Given the (32-bit) IR3 words of a program, the start of the words of
+    # each instruction (see getWordStart() of the instruction stores) and the
+    # name of each instruction, returns the latency report as a dictionary,
+    #   cycles      : total no. of cycles of the program
+    #   ms          : total latency in milliseconds
+    #   instrCycles : cycles of each instruction, from its first issue to the first
+    #                 issue of the next instruction (the last one includes the drain)
+    #   macroCycles : {name: (count, cycles)}, instruction cycles summed by name
+    #   busyCycles  : {submodule-name: no. of cycles the submodule is busy}
+    def estimate(self, words, wordStart, names):
+        issue, total, busy = self.simulateIssue(words)
+        wordStart = np.asarray(wordStart, dtype=np.int64)
+        wordEnd = np.append(wordStart[1:], len(issue)).astype(np.int64)
+        issue = np.append(issue, total)     # the end of the program, for the last instruction
+        # instructions without words (pseudo) take 0 cycles, the rest are charged
+        # from their first issue to the first issue after them
+        nextIssue = issue[wordEnd]
+        firstIssue = np.where(wordEnd > wordStart, issue[wordStart], nextIssue)
+        instrCycles = nextIssue - firstIssue
+        macroCycles = {}
+        for name, cyc in zip(names, instrCycles.tolist()):
+            count, cycles = macroCycles.get(name, (0, 0))
+            macroCycles[name] = (count+1, cycles+cyc)
+        report = {
+            'cycles'      : int(total),
+            'ms'          : self.toMs(total),
+            'instrCycles' : instrCycles,
+            'macroCycles' : macroCycles,
+            'busyCycles'  : busy,
+        }
+        return report
+
+
+    # Prints the latency report returned by estimate(). The cycles of each
+    # instruction are also printed if the source mnemonics (srcs) are given.
+    def printReport(self, report, srcs=None):
+        total = report['cycles']
+        busy = ', '.join(f'{name.upper()} busy {100*cyc/max(total, 1):.1f}%' for name, cyc in report['busyCycles'].items())
+        print(f"INFO: Estimated latency: {total} cycles, {report['ms']:.6f} ms at {self.clkFreq} MHz ({busy})")
+        print(f"  {'instruction':<16} {'count':>8} {'cycles':>12} {'ms':>12} {'share':>7}")
+        macros = sorted(report['macroCycles'].items(), key=lambda item: -item[1][1])
+        for name, (count, cycles) in macros:
+            print(f"  {name:<16} {count:>8} {cycles:>12} {self.toMs(cycles):>12.6f} {100*cycles/max(total, 1):>6.1f}%")
+        if srcs is not None:
+            print("  ---- Per-instruction cycles ----")
+            for idx, (src, cycles) in enumerate(zip(srcs, report['instrCycles'].tolist())):
+                print(f"  {idx:>6}: {cycles:>10}  {src}")
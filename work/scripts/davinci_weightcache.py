@@ -0,0 +1,167 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the weight-image cache of DavinciAsm. The BRAM image  #
+#   of a weight matrix and the select/write words of its MV_LOADMAT expansion are#
+#   cached by the content of the matrix, so reloading a resident weight matrix   #
+#   costs a hash lookup. The cache is shared by all assemblers of the process,   #
+#   is bounded by a memory budget (LRU eviction), and can optionally keep its    #
+#   entries in a directory to be reused by later runs.                           #
+#                                                                                #
+#================================================================================#
+
+import hashlib
+import os
+from collections import OrderedDict
+import numpy as np
+
+
+
+# Weight-image cache. Each entry is a dictionary of arrays,
+#   image : BRAM image of the matrix (blockRows, blockCols, regWidth), see DavinciAsm.makeBramImage()
+#   words : LOADMAT words for register 0
+#   delta : per-word increment of words for each register step (register relocation)
+class DavinciWeightCache:
+    # Parameters:
+    #   maxSize  : memory budget in bytes
+    #   cacheDir : directory for keeping the entries across runs, not persistent if None
+    #   diskSize : size bound of cacheDir in bytes
+    def __init__(self, maxSize, cacheDir=None, diskSize=None):
+        self.entries = OrderedDict()    # {key: entry}, least recently used first
+        self.size = 0                   # total bytes of the entries in memory
+        self.hits = 0
+        self.misses = 0
+        self.configure(maxSize, cacheDir, diskSize)
+
+
+    # Updates the memory budget and the persistent directory of the cache
+    def configure(self, maxSize, cacheDir=None, diskSize=None):
+        self.maxSize  = maxSize
+        self.cacheDir = cacheDir
+        self.diskSize = diskSize
+        if cacheDir: os.makedirs(cacheDir, exist_ok=True)
+        self.evict()
+
+
+    # Given a (fixed-point) matrix and the parameters that its image and words
+    # depend on, returns the key of the matrix
+    def makeKey(self, matrix, params):
+        matrix = np.ascontiguousarray(matrix)
+        h = hashlib.blake2b(digest_size=20)
+        h.update(repr((matrix.dtype.str, matrix.shape, sorted(params.items()))).encode())
+        h.update(matrix.tobytes())
+        return h.hexdigest()
+
+
+    # Returns the entry of the given key, None if it is not cached
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)   # most recently used
+        elif self.cacheDir:
+            entry = self.loadEntry(key)
+            if entry is not None: self.insert(key, entry)
+        if entry is None: self.misses += 1
+        else: self.hits += 1
+        return entry
+
+
+    # Adds an entry to the cache (and to the persistent directory, if any)
+    def put(self, key, entry):
+        self.insert(key, entry)
+        if self.cacheDir: self.storeEntry(key, entry)
+
+
+    # Adds an entry to the in-memory cache, evicting the least recently used
+    # entries to stay within the memory budget
+    def insert(self, key, entry):
+        if key in self.entries: self.size -= self.entrySize(self.entries.pop(key))
+        for arr in entry.values(): arr.flags.writeable = False   # entries are shared
+        self.entries[key] = entry
+        self.size += self.entrySize(entry)
+        self.evict()
+
+
+    # Returns the memory footprint of an entry in bytes
+    def entrySize(self, entry):
+        return sum(arr.nbytes for arr in entry.values())
+
+
+    # Removes the least recently used entries until the cache fits in its budget
+    def evict(self):
+        while self.size > self.maxSize and self.entries:
+            key, entry = self.entries.popitem(last=False)
+            self.size -= self.entrySize(entry)
+
+
+    # Returns the entry saved in the persistent directory, None if not found
+    def loadEntry(self, key):
+        fpath = os.path.join(self.cacheDir, f'{key}.npz')
+        if not os.path.isfile(fpath): return None
+        with np.load(fpath) as data: entry = {name : data[name] for name in data.files}
+        os.utime(fpath)     # mark as recently used
+        return entry
+
+
+    # Saves an entry in the persistent directory, removing the least recently
+    # used files beyond diskSize
+    def storeEntry(self, key, entry):
+        fpath = os.path.join(self.cacheDir, f'{key}.npz')
+        with open(fpath + '.tmp', 'wb') as fout: np.savez(fout, **entry)
+        os.replace(fpath + '.tmp', fpath)
+        if self.diskSize is None: return
+        files = [os.path.join(self.cacheDir, f) for f in os.listdir(self.cacheDir) if f.endswith('.npz')]
+        files = sorted((os.path.getmtime(f), os.path.getsize(f), f) for f in files)
+        totSize = sum(size for _, size, _ in files)
+        for mtime, size, f in files:
+            if totSize <= self.diskSize: break
+            if f == fpath: continue
+            os.remove(f)
+            totSize -= size
+
+
+    # Removes all entries from the memory (the persistent directory is kept)
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+
+# The process-wide cache, shared by all assemblers
+weightCache = None
+
+
+# Returns the process-wide weight-image cache, creating it on first use.
+# The parameters are the same as DavinciWeightCache(); an existing cache is
+# reconfigured with them.
+def getWeightCache(maxSize, cacheDir=None, diskSize=None):
+    global weightCache
+    if weightCache is None: weightCache = DavinciWeightCache(maxSize, cacheDir, diskSize)
+    else: weightCache.configure(maxSize, cacheDir, diskSize)
+    return weightCache
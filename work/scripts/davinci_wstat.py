@@ -0,0 +1,402 @@
+#===================================================================================#
+#   Copyright (c) 2024, Computer Systems Design Lab, University of Arkansas         #
+#                                                                                   #
+#   All rights reserved.                                                            #
+#                                                                                   #
+#   Permission is hereby granted, free of charge, to any person obtaining a copy    #
+#   of this software and associated documentation files (the "Software"), to deal   #
+#   in the Software without restriction, including without limitation the rights    #
+#   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell       #
+#   copies of the Software, and to permit persons to whom the Software is           #
+#   furnished to do so, subject to the following conditions:                        #
+#                                                                                   #
+#   The above copyright notice and this permission notice shall be included in all  #
+#   copies or substantial portions of the Software.                                 #
+#                                                                                   #
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR      #
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,        #
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE     #
+#   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER          #
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,   #
+#   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE   #
+#   SOFTWARE.                                                                       #
+#===================================================================================#
+
+#================================================================================#
+#                                                                                #
+#   Version: v0.1                                                                #
+#                                                                                #
+#   Description:                                                                 #
+#   This module implements the weight-stationary program generator of            #
+#   DavinciAsm, for running the same weights against a stream of input vectors.  #
+#   The program has two sections: the weight-load section (MV_LOADMAT, bias,     #
+#   activation tables), which is run once, and the per-vector section            #
+#   (MV_LOADVEC_ROW, MV_MULTFXP, MV_ALLACCUM, VV-Engine post-ops and the output  #
+#   shift), which the host replays for each new vector. The vector is loaded     #
+#   with dense writes, so the words of the per-vector section only differ in the #
+#   data of the vector slot; the host patches the slot with the bit-planes of    #
+#   the next vector. In the double-buffering mode, the vector registers          #
+#   alternate between two per-vector sections, and the slot of each loads the    #
+#   next vector while the VV-Engine post-processes the current one.              #
+#                                                                                #
+#================================================================================#
+
+import numpy as np
+from string import Template
+
+
+
+# Runtime format of the C-program: a Davinci_Prog and the vector slot of each
+# section; the host patches the slot words (in order) of a section with the
+# vector it loads. The layout of a slot is, for each block column c, a select
+# word followed by regWidth writes, where the data of write b holds bit b of
+# the fixed-point elements c*peCount ... c*peCount+peCount-1 (element
+# c*peCount+p in data bit p).
+c_wstat_head = Template('''#include "davinci_prog.h"
+
+
+// Weight-stationary program: run ${progname}_load once, then
+$runOrder
+const int ${progname}_vecLen      = $vecLen;
+const int ${progname}_slotBlkCols = $slotBlkCols;
+''')
+
+c_wstat_section = Template('''
+
+// $title
+static const uint32_t ${name}_arr[] = {
+$words
+};
+
+Davinci_Prog ${progname}_${name} = {
+    ${name}_arr,
+    sizeof(${name}_arr)/sizeof(${name}_arr[0]),   // size
+    $fracWidth,    // fracWidth
+    $mvMaxRow,   // mvMaxRow
+    $mvMaxCol,   // mvMaxCol
+    $regWidth,   // regWidth
+    $idWidth,    // idWidth
+    $peCount,   // peCount
+};
+''')
+
+c_wstat_slot = Template('''
+// indices of the vector slot words in ${name}_arr
+const int ${progname}_${name}_slot[] = {
+$indices
+};
+''')
+
+
+
+# Weight-stationary program generator. build() adds the sections to the
+# assembler; the program of the assembler runs each of them once (see
+# build()), while replay() gives the words for a stream of vectors.
+class DavinciWeightStationary:
+    # Parameters:
+    #   asm : the assembler (DavinciAsm) that receives the program
+    def __init__(self, asm):
+        assert asm.mvMaxRow and asm.mvMaxCol, 'Dimension of the PiCaSO array is unknown; set mvBlockDim in the assembler parameters'
+        self.asm = asm
+        self.doubleBuffer = False
+        self.loadEnd  = None    # index after the last instruction of the weight-load section
+        self.sections = {}      # replayed sections, {name: (start, end, slot)}: instruction indices, slot is the MV_LOADVEC_ROW
+
+
+    # Given the weights, adds the weight-load section and the per-vector
+    # section(s) of activation(matrix @ vector + bias) to the assembler. All
+    # instructions before the per-vector section are part of the weight-load
+    # section, e.g., the initialization of the program.
+    # Options:
+    #   bias         : bias vector, no bias if None
+    #   activation   : relu/sigm/tanh, or None for no activation
+    #   vector       : the vector of the per-vector section in the program, zeros if None
+    #   doubleBuffer : if true, the vector registers alternate between two per-vector
+    #                  sections (vector0, vector1), each computes the vector loaded
+    #                  by the one before and loads the next one. The first vector is
+    #                  loaded by the prime section. The program of the assembler runs
+    #                  prime (vector), vector0 (loads zeros) and vector1.
+    def build(self, matrix, bias=None, activation='relu', *, vector=None, doubleBuffer=False):
+        asm = self.asm
+        assert self.loadEnd is None, 'The program is already built'
+        assert asm.stream is None, 'The sections cannot be replayed in streaming mode, the words are not kept'
+        matrix = np.asarray(matrix)
+        assert matrix.ndim == 2, f'Expected a matrix, got an array of shape {matrix.shape}'
+        assert matrix.shape[0] <= asm.mvMaxRow and matrix.shape[1] <= asm.mvMaxCol, f'Matrix of shape {matrix.shape} does not fit the PiCaSO array ({asm.mvMaxRow}, {asm.mvMaxCol})'
+        assert activation in (None, 'relu', 'sigm', 'tanh'), f'Unknown activation: {activation}'
+        vector = np.zeros(matrix.shape[1]) if vector is None else np.asarray(vector)
+        assert vector.shape == (matrix.shape[1],), f'Vector of shape {vector.shape} does not match the matrix {matrix.shape}'
+        self.doubleBuffer = doubleBuffer
+        # weight-load section
+        if activation in ('sigm', 'tanh'): asm.modelFrontend().setupTables({activation})
+        ra = asm.regAllocator()
+        mat = ra.mvReg('mat')
+        ra.mv_LOADMAT(mat, matrix, comment='weight-load section')
+        weights = {'mat' : mat}
+        if bias is not None:
+            weights['bias'] = ra.vvReg('bias')
+            ra.vv_LOADVEC(weights['bias'], bias, comment='weight-load section')
+        alloc = ra.allocate()
+        weights = {name : alloc[vreg] for name, vreg in weights.items()}
+        asm.as_addComment('Finished the weight-load section\n')
+        self.loadEnd = len(asm.instructions)
+        # per-vector sections; the weights and the vector buffers are in fixed (physical) registers
+        free = [reg for reg in range(asm.picaso_as.regCnt) if reg != weights['mat']]
+        buffers = free[:2] if doubleBuffer else free[:1]
+        if doubleBuffer:
+            self.addSection('prime', lambda ra: ra.mv_LOADVEC_ROW(buffers[0], vector, dense=True, comment='prime section'))
+            zeros = np.zeros_like(vector)
+            for k in range(2):
+                self.addSection(f'vector{k}', lambda ra: self.addCompute(ra, buffers[k], weights, activation,
+                                                                          lambda: ra.mv_LOADVEC_ROW(buffers[1-k], zeros, dense=True, comment=f'vector{k} section')))
+        else:
+            def addVector(ra):
+                ra.mv_LOADVEC_ROW(buffers[0], vector, dense=True, comment='vector section')
+                self.addCompute(ra, buffers[0], weights, activation)
+            self.addSection('vector', addVector)
+
+
+    # Given the name of a section and a function that records its instructions
+    # into a register allocator, adds the section to the assembler
+    def addSection(self, name, record):
+        asm = self.asm
+        ra = asm.regAllocator()
+        record(ra)
+        start = len(asm.instructions)
+        ra.allocate()
+        end = len(asm.instructions)
+        slot = next(idx for idx in range(start, end) if asm.instructions[idx].get('macro') == 'loadVecRow')
+        self.sections[name] = (start, end, slot)
+        asm.as_addComment(f'Finished the {name} section\n')
+
+
+    # Records activation(matrix @ vector + bias) of the vector in the given
+    # register into the register allocator ra, using the weight registers
+    # {mat, bias}. loadNext records the loading of the next vector, which
+    # goes after the post-processing, before the output shift.
+    def addCompute(self, ra, vecReg, weights, activation, loadNext=None):
+        VVREG = self.asm.VVREG
+        cmt = 'per-vector section'
+        prod, rsum = ra.mvReg('prod'), ra.mvReg('rsum')
+        ra.mv_MULTFXP(prod, vecReg, weights['mat'], comment=cmt)
+        ra.vv_serialEn(comment=cmt)
+        ra.mv_ALLACCUM(rsum, prod, comment=cmt)
+        ra.mv_SYNC(comment=cmt)
+        ra.vv_shiftOff(comment=cmt)
+        out = ra.vvReg('out')
+        if 'bias' in weights:
+            ra.vv_add(weights['bias'], VVREG.S, comment=cmt)
+            ra.vv_mov(out, VVREG.O, comment=cmt)
+        else:
+            ra.vv_mov(out, VVREG.S, comment=cmt)
+        if activation is not None:
+            ra.vv_mov(VVREG.ACT, out, comment=cmt)
+            ra.vv_activ(getattr(self.asm.ACTCODE, activation.upper()), comment=cmt)
+            out = ra.vvReg('out')
+            ra.vv_mov(out, VVREG.O, comment=cmt)
+        if loadNext: loadNext()
+        self.asm.gemvTiler().shiftOut(ra, [out], comment=cmt)
+
+
+    # Returns (loadWords, sections): the words of the weight-load section, and
+    # the replayed sections {name: (words, slot)}, where slot is the index
+    # array of the vector slot words (in order). In the double-buffering mode,
+    # the words of the sections are scheduled (see DavinciScheduler), so that
+    # the slot words fill the stalls of the VV-Engine post-processing.
+    def getSections(self):
+        asm = self.asm
+        assert self.loadEnd is not None, 'The program is not built, call build() first'
+        assert not asm.schedMark, 'The instructions of a scheduled program are reordered, the sections are not known'
+        # Run assembler if not already
+        if asm.hasPendingInstr():
+            print("INFO: Running assembler ...")
+            asm.assemble()
+        words = asm.instructions.getWords()
+        wordStart = np.append(asm.instructions.getWordStart(), len(words))
+        slotLen = self.getSlotBlkCols()*(1 + asm.picaso_as.regWidth)
+        sections = {}
+        for name, (start, end, slot) in self.sections.items():
+            secWords = words[wordStart[start]:wordStart[end]]
+            slotIdx = np.arange(wordStart[slot], wordStart[slot+1]) - wordStart[start]
+            assert len(slotIdx) == slotLen, f'The vector slot of the {name} section is not dense, the section was changed after build()'
+            if self.doubleBuffer:
+                from davinci_sched import DavinciScheduler
+                order = DavinciScheduler(asm, asm.mvMaxRow).schedule(secWords)
+                secWords, slotIdx = secWords[order], np.argsort(order)[slotIdx]
+            sections[name] = (secWords, slotIdx)
+        return words[:wordStart[self.loadEnd]], sections
+
+
+    # Returns the words of the program of one vector without the weights kept in
+    # place, the baseline of estimate(): the weight-load section, the vector load
+    # and the computation, in program order. Both buffering modes give the same
+    # instructions (only the allocated registers may differ): in the double-
+    # buffering mode, the vector is loaded by the prime section and computed by
+    # the vector0 section without its slot.
+    def getReloadWords(self):
+        asm = self.asm
+        assert self.loadEnd is not None, 'The program is not built, call build() first'
+        # Run assembler if not already
+        if asm.hasPendingInstr():
+            print("INFO: Running assembler ...")
+            asm.assemble()
+        words = asm.instructions.getWords()
+        wordStart = np.append(asm.instructions.getWordStart(), len(words))
+        parts = [words[:wordStart[self.loadEnd]]]
+        if self.doubleBuffer:
+            start, end, _ = self.sections['prime']
+            parts.append(words[wordStart[start]:wordStart[end]])
+            start, end, slot = self.sections['vector0']
+            parts += [words[wordStart[start]:wordStart[slot]], words[wordStart[slot+1]:wordStart[end]]]
+        else:
+            start, end, _ = self.sections['vector']
+            parts.append(words[wordStart[start]:wordStart[end]])
+        return np.concatenate(parts)
+
+
+    # Returns the no. of block columns of the vector slot
+    def getSlotBlkCols(self):
+        start, end, slot = next(iter(self.sections.values()))
+        return -(-len(self.asm.instructions[slot]['vector']) // self.asm.picaso_as.peCount)
+
+
+    # Returns the replayed sections in order, [(name, index of the loaded vector)],
+    # for the given no. of input vectors; the index is the no. of vectors if the
+    # section loads zeros (the last one in the double-buffering mode)
+    def getRunOrder(self, vecCnt):
+        if not self.doubleBuffer: return [('vector', k) for k in range(vecCnt)]
+        return [('prime', 0)] + [(f'vector{k%2}', k+1) for k in range(vecCnt)]
+
+
+    # Given the input vectors (vecCnt, vecLen), returns (words, isSlot): the
+    # words the host sends, the weight-load section followed by the replayed
+    # sections, and the mask of the vector slot words
+    def makeReplay(self, vectors):
+        asm = self.asm
+        vectors = np.asarray(vectors)
+        loadWords, sections = self.getSections()
+        vectors = np.concatenate([vectors, np.zeros((1, vectors.shape[1]))])     # zeros, loaded after the last vector
+        runOrder = self.getRunOrder(len(vectors)-1)
+        runs = [None] * len(runOrder)     # (words, slot mask) of each run
+        for name, (secWords, slotIdx) in sections.items():
+            # the words of all runs of the section at once, the slots patched with their vectors
+            pos = [k for k, (other, _) in enumerate(runOrder) if other == name]
+            if not pos: continue
+            runWords = np.tile(secWords, (len(pos), 1))
+            runWords[:, slotIdx] = asm.gemv_genBatchVecRow(asm.instructions[self.sections[name][2]], vectors[[runOrder[k][1] for k in pos]])
+            mask = np.zeros(len(secWords), dtype=bool)
+            mask[slotIdx] = True
+            for k, words in zip(pos, runWords): runs[k] = (words, mask)
+        words = np.concatenate([loadWords] + [words for words, _ in runs])
+        isSlot = np.concatenate([np.zeros(len(loadWords), dtype=bool)] + [mask for _, mask in runs])
+        return words, isSlot
+
+
+    # Given the input vectors (vecCnt, vecLen), returns the words the host
+    # sends: the weight-load section, followed by the replayed sections
+    def replay(self, vectors):
+        words, _ = self.makeReplay(vectors)
+        return words
+
+
+    # Runs the replayed program of the given input vectors on the functional
+    # simulator (see DavinciAsm.simulate()). The outputs of the vectors are
+    # shifted out in order, one vector each.
+    # Options:
+    #    expFile  : path of the expected-output file, not written if None
+    #    bitLevel : if true, the PiCaSO blocks are simulated at the bit-level
+    # Returns the simulator
+    def simulate(self, vectors, expFile=None, bitLevel=False):
+        from davinci_sim import DavinciSim, DavinciBitSim
+        sim = DavinciBitSim(self.asm) if bitLevel else DavinciSim(self.asm)
+        sim.run(self.replay(vectors))
+        print(f"INFO: simulated {sim.wordCount} words for {len(vectors)} input vector(s), {len(sim.outputs)} output vector(s)")
+        if expFile: sim.export_expBin(expFile)
+        return sim
+
+
+    # Estimates the cycles of the replayed program for the given no. of input
+    # vectors (see DavinciTiming), and compares it to reloading the weights for
+    # each vector. Returns the report as a dictionary,
+    #   loadCycles   : cycles of the weight-load section
+    #   vectorCycles : cycles per vector in the steady state (throughput bound)
+    #   cycles, ms   : total of the replayed program
+    #   reloadCycles : total if the weights are loaded again for each vector (see
+    #                  getReloadWords), the same baseline in both buffering modes
+    #   slotWords    : no. of vector slot words of the replayed sections
+    #   overlapWords : no. of them issued while the VV-Engine is busy
+    def estimate(self, vecCnt, clkFreq=100, report=True):
+        assert vecCnt >= 1, f'Invalid no. of vectors: {vecCnt}'
+        from davinci_timing import DavinciTiming
+        asm = self.asm
+        timing = DavinciTiming(asm, asm.mvMaxRow, clkFreq)
+        vecLen = len(asm.instructions[next(iter(self.sections.values()))[2]]['vector'])
+        loadWords, _ = self.getSections()
+        # the cycles do not depend on the vector data, zeros are replayed
+        _, loadCycles, _ = timing.simulateIssue(loadWords)
+        _, oneCycles, _ = timing.simulateIssue(self.getReloadWords())
+        _, prevCycles, _ = timing.simulateIssue(self.replay(np.zeros((vecCnt-1, vecLen))))
+        words, isSlot = self.makeReplay(np.zeros((vecCnt, vecLen)))
+        issue, cycles, _ = timing.simulateIssue(words)
+        # busy intervals of the VV-Engine, [vvStart, vvEnd) of each VV word
+        isVv = (words >> np.uint32(timing.submShift)) == timing.submCodes['vv']
+        vvStart = issue[isVv]
+        vvEnd = vvStart + timing.getCycles(words[isVv])
+        slotIssue = issue[isSlot]
+        pos = np.searchsorted(vvStart, slotIssue, side='right') - 1
+        overlap = (pos >= 0) & (slotIssue < vvEnd[np.maximum(pos, 0)])
+        result = {
+            'loadCycles'   : int(loadCycles),
+            'vectorCycles' : int(cycles - prevCycles),
+            'cycles'       : int(cycles),
+            'ms'           : timing.toMs(cycles),
+            'reloadCycles' : int(oneCycles*vecCnt),
+            'slotWords'    : int(isSlot.sum()),
+            'overlapWords' : int(overlap.sum()),
+        }
+        if report:
+            mode = 'double-buffered' if self.doubleBuffer else 'single-buffered'
+            print(f"INFO: Weight-stationary ({mode}) estimate for {vecCnt} vector(s) at {clkFreq} MHz: {result['cycles']} cycles, {result['ms']:.6f} ms")
+            print(f"  weight-load section: {result['loadCycles']} cycles (once)")
+            print(f"  per-vector sections: {result['vectorCycles']} cycles, {1e6*clkFreq/max(result['vectorCycles'], 1):.0f} vectors/s")
+            print(f"  vector loads       : {result['overlapWords']} of {result['slotWords']} slot words issued while the VV-Engine is busy")
+            print(f"  reloading weights  : {result['reloadCycles']} cycles, {result['reloadCycles']/max(result['cycles'], 1):.2f}x of the weight-stationary program")
+        return result
+
+
+    # Exports the sections as a C-program in the runtime format (see c_wstat_head)
+    # Parameters:
+    #    progname : name prefix of the program instances in the C-file
+    #    filename : path of the output file, prints to stdout if None
+    def export_CprogHex(self, progname, filename=None):
+        asm = self.asm
+        loadWords, sections = self.getSections()
+        params = asm.makeCprogParams(progname)
+        fmt = lambda words: ''.join(line.tobytes().decode() for line in asm.formatHexWords(words, suffix=',\n', indent=' '*4))[:-1]
+        if self.doubleBuffer:
+            runOrder = (f'// {progname}_prime with the first vector, then {progname}_vector0 and {progname}_vector1\n'
+                        f'// by turns, each with the next vector (zeros after the last one)')
+        else:
+            runOrder = f'// {progname}_vector for each vector'
+        vecLen = len(asm.instructions[next(iter(self.sections.values()))[2]]['vector'])
+        cprog = c_wstat_head.substitute(runOrder=runOrder, vecLen=vecLen,
+                                        slotBlkCols=self.getSlotBlkCols(), progname=progname)
+        cprog += c_wstat_section.substitute(title='weight-load section, run once', name='load', words=fmt(loadWords), **params)
+        for name, (secWords, slotIdx) in sections.items():
+            cprog += c_wstat_section.substitute(title=f'{name} section, replayed', name=name, words=fmt(secWords), **params)
+            cprog += c_wstat_slot.substitute(name=name, indices=fmt_indices(slotIdx), progname=progname)
+        if filename:
+            with open(filename, 'w') as fout:
+                fout.write(cprog)
+            print(f"INFO: weight-stationary C-program written to {filename}")
+        else:
+            print("---- Weight-Stationary Program ----")
+            print(cprog)
+            print("---- End of Program ----")
+
+
+
+# Given an index array, returns the C-initializer text, 16 indices per line
+def fmt_indices(indices):
+    lines = [indices[i:i+16] for i in range(0, len(indices), 16)]
+    return ',\n'.join('    ' + ', '.join(str(idx) for idx in line.tolist()) for line in lines)
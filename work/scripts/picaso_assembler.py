@@ -39,6 +39,8 @@
 #                                                                                #
 #================================================================================#
 
+import numpy as np
+
 
 class PiCaSOAsm:
     # Module information
@@ -187,88 +189,100 @@ class PiCaSOAsm:
         return reg*self.regWidth + bit
 
 
-    # Given an instruction dictionary (internal representation), Returns the
-    # machine code as a dictionary of instruction-word segements (wordDict)
-    def genMachineCode(self, instrDict):
+    # Given a (30-bit) instruction word, returns the dictionary of instruction-word segments (wordDict)
+    def makeWordDict(self, word):
+        w_seg0 = self.tbl_field_width['seg0']
+        w_seg1 = self.tbl_field_width['seg1']
+        seg0 = word & ((1 << w_seg0) - 1)
+        seg1 = (word >> w_seg0) & ((1 << w_seg1) - 1)
+        seg2 = word >> (w_seg0 + w_seg1)
+        return {'seg0' : seg0, 'seg1' : seg1, 'seg2': seg2}
+
+
+    # Builds the encoder table: one packing recipe per opcode, as follows,
+    #   {opcode: (base-word, [(field, shift, mask, code-table, default), ...])}
+    # base-word has the opcode in seg2; the value of each field is translated
+    # through code-table (if any), masked (if mask is not None), shifted, then
+    # ORed with the base-word. Fields with a default (not None) are optional.
+    def makeEncoderTable(self):
         # shorthands for field widths
         w_reg  = self.tbl_field_width['reg']
         w_id   = self.tbl_field_width['id']
-        # get the opcode name and machine code
-        opcode = instrDict['opcode']
-        opnum  = self.tbl_opcode[opcode]
-        # Encode instructions
-        if opcode == 'aluop':
+        s_seg1 = self.tbl_field_width['seg0']             # shift of segment-1
+        s_seg2 = s_seg1 + self.tbl_field_width['seg1']    # shift of segment-2
+        s_fn   = s_seg1 + w_reg                           # shift of Fn/OFFSET field
+        fn, sc = self.tbl_fncode, self.tbl_super_code
+        recipes = {
             # [ opcode ] [ Fn, RD ] [ RS2, RS1 ]
-            fn = self.tbl_fncode[instrDict['fncode']]
-            rd, rs1, rs2 = instrDict['rd'], instrDict['rs1'], instrDict['rs2']
-            seg2 = opnum
-            seg1 = (fn  << w_reg) | rd
-            seg0 = (rs2 << w_reg) | rs1
-        elif opcode == 'accum':
+            'aluop'    : [('fncode', s_fn, None, fn, None), ('rd', s_seg1, None, None, None),
+                          ('rs2', w_reg, None, None, None), ('rs1', 0, None, None, None)],
             # [ opcode ] [ Fn, Param ] [ R2, R1 ]
-            fn   = self.tbl_fncode[instrDict['fncode']]
-            param, rs1 = instrDict['param'], instrDict['rs1']
-            if 'rs2' in instrDict: rs2 = instrDict['rs2']
-            else: rs2 = 0
-            seg2 = opnum
-            seg1 = (fn  << w_reg) | param
-            seg0 = (rs2 << w_reg) | rs1
-        elif opcode == 'updatepp':
+            'accum'    : [('fncode', s_fn, None, fn, None), ('param', s_seg1, None, None, None),
+                          ('rs2', w_reg, None, None, 0), ('rs1', 0, None, None, None)],
             # [ opcode ] [ OFFSET, RD ] [ RS2, RS1 ]
-            offset = instrDict['offset']
-            rd, rs1, rs2 = instrDict['rd'], instrDict['rs1'], instrDict['rs2']
-            seg2 = opnum
-            seg1 = (offset  << w_reg) | rd
-            seg0 = (rs2 << w_reg) | rs1
-        elif opcode == 'select':
+            'updatepp' : [('offset', s_fn, None, None, None), ('rd', s_seg1, None, None, None),
+                          ('rs2', w_reg, None, None, None), ('rs1', 0, None, None, None)],
             # [ opcode ] [ Fn, xx ] [ Row, Col ]
-            fn = self.tbl_fncode[instrDict['fncode']]
-            rowID, colID = instrDict['rowID'], instrDict['colID']
-            seg2 = opnum
-            seg1 = (fn << w_reg)
-            seg0 = (rowID << w_id) | colID
-        elif opcode == 'mov':
+            'select'   : [('fncode', s_fn, None, fn, None),
+                          ('rowID', w_id, None, None, None), ('colID', 0, None, None, None)],
             # [ opcode ] [ Fn, Param ] [ R2, R1 ]
-            fn   = self.tbl_fncode[instrDict['fncode']]
-            param, rs1, rs2 = instrDict['offset'], instrDict['rs1'], instrDict['rs2']
-            seg2 = opnum
-            seg1 = (fn  << w_reg) | param
-            seg0 = (rs2 << w_reg) | rs1
-        elif opcode == 'write':
+            'mov'      : [('fncode', s_fn, None, fn, None), ('offset', s_seg1, None, None, None),
+                          ('rs2', w_reg, None, None, None), ('rs1', 0, None, None, None)],
             # [ opcode ] [ ADDR ] [ DATA ]
-            addr = instrDict['addr']
-            data = instrDict['data']
-            seg2 = opnum
-            seg1 = addr
-            seg0 = data
-        elif opcode == 'nop':
-            seg2 = opnum
-            seg1 = seg0 = 0
-        elif opcode == 'superop':
-            seg2 = opnum
-            seg1, seg0 = self.genSuperopMachineCode(instrDict)
-        else:
+            'write'    : [('addr', s_seg1, None, None, None), ('data', 0, None, None, None)],
+            # [ opcode ] [ 0 ] [ 0 ]
+            'nop'      : [],
+            # [ opcode ] [ SCODE ] [ 0 ]
+            'superop'  : [('scode', s_seg1, None, sc, None)],
+        }
+        return {opcode : (self.tbl_opcode[opcode] << s_seg2, recipe) for opcode, recipe in recipes.items()}
+
+
+    # Returns the encoder recipe of the given opcode
+    def getEncoder(self, opcode):
+        if opcode not in self.tbl_encoder:
             if opcode in self.tbl_opcode:
                 assert 0, f"Instruction not implemented yet, opcode: {opcode}"
             else:
                 assert 0, f"Invalid opcode: {opcode}"
-        # build the word dictionary and return
-        wordDict = {'seg0' : seg0, 'seg1' : seg1, 'seg2': seg2}
-        return wordDict
+        return self.tbl_encoder[opcode]
 
 
     # Given an instruction dictionary (internal representation), Returns the
-    # machine code for SUPER-OP instruction segments as tuple.
-    def genSuperopMachineCode(self, instrDict):
-        opcode = instrDict['opcode']
-        scode  = instrDict['scode']
-        assert opcode == 'superop', f"Not a SUPER-OP instruction, opcode: {opcode}"
-        # Encode instructions
-        if scode == 'clrmbit':
-            seg1 = self.tbl_super_code['clrmbit']
-            seg0 = 0
-        else: assert 0, f"Invalid scode: {scode}"
-        return seg1, seg0
+    # (30-bit) instruction word as an integer
+    def encodeWord(self, instrDict):
+        word, recipe = self.getEncoder(instrDict['opcode'])
+        for field, shift, mask, table, default in recipe:
+            val = instrDict[field] if default is None else instrDict.get(field, default)
+            if table is not None: val = table[val]
+            val = int(val)      # numpy integers may overflow while shifting
+            if mask is not None: val &= mask
+            word |= val << shift
+        return word
+
+
+    # Encodes a batch of same-opcode instructions. The fields are given as
+    # keyword arguments, either as arrays (one element per instruction) or as
+    # scalars (same for all instructions). Fields with code-tables (e.g.,
+    # fncode) must be scalars. count is only needed if all fields are scalars.
+    # Returns the (30-bit) instruction words as a np.uint32 array.
+    def encodeBatch(self, opcode, count=None, **fields):
+        word, recipe = self.getEncoder(opcode)
+        words = np.int64(word)
+        for field, shift, mask, table, default in recipe:
+            val = fields[field] if default is None else fields.get(field, default)
+            if table is not None: val = table[val]
+            val = np.asarray(val, dtype=np.int64)
+            if mask is not None: val = val & mask
+            words = words | (val << shift)
+        shape = np.shape(words) if count is None else (count,)
+        return np.array(np.broadcast_to(words, shape), dtype=np.uint32, ndmin=1)
+
+
+    # Given an instruction dictionary (internal representation), Returns the
+    # machine code as a dictionary of instruction-word segements (wordDict)
+    def genMachineCode(self, instrDict):
+        return self.makeWordDict(self.encodeWord(instrDict))
 
 
     # Instruction parameter validation utilities
@@ -319,6 +333,7 @@ class PiCaSOAsm:
         self.peCount  = 16         # no. of PEs in a block (fixed for now)
         self.pimDepth = 1024       # no. of rows in the PIM (BRAM) block, (fixed for now)
         assert regCnt <= self.pimDepth//regWidth, f"Register count is not consistent with regWidth ({regWidth}) and pimDepth ({self.pimDepth})"
+        self.tbl_encoder = self.makeEncoderTable()     # precompiled instruction encoders
 
 
     # Compiles the instructions into machine code for exporting
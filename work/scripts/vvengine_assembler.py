@@ -39,6 +39,8 @@
 #                                                                                #
 #================================================================================#
 
+import numpy as np
+
 
 class VVBlockAsm:
     # Module information
@@ -202,75 +204,98 @@ class VVBlockAsm:
         return reg  # VV-Engine has one-to-one mapping for register addresses
 
 
-    # Given an instruction dictionary (internal representation), Returns the
-    # machine code as a dictionary of instruction-word segements (wordDict)
-    def genMachineCode(self, instrDict):
+    # Given a (30-bit) instruction word, returns the dictionary of instruction-word segments (wordDict)
+    def makeWordDict(self, word):
+        w_seg0 = self.tbl_field_width['seg0']
+        w_seg1 = self.tbl_field_width['seg1']
+        seg0 = word & ((1 << w_seg0) - 1)
+        seg1 = (word >> w_seg0) & ((1 << w_seg1) - 1)
+        seg2 = word >> (w_seg0 + w_seg1)
+        return {'seg0' : seg0, 'seg1' : seg1, 'seg2': seg2}
+
+
+    # Builds the encoder table: one packing recipe per opcode, as follows,
+    #   {opcode: (base-word, [(field, shift, mask, code-table, default), ...])}
+    # base-word has the opcode in seg2; the value of each field is translated
+    # through code-table (if any), masked (if mask is not None), shifted, then
+    # ORed with the base-word. Fields with a default (not None) are optional.
+    def makeEncoderTable(self):
         # shorthands for field widths
         w_reg  = self.tbl_field_width['reg']
         w_addr = self.tbl_field_width['addr']
         w_data = self.tbl_field_width['data']
-        # get the opcode name and machine code
-        opcode = instrDict['opcode']
-        opnum  = self.tbl_opcode[opcode]
-        # Encode instructions
-        if opcode in {'nop', 'relu', 'shiftoff', 'serial_en', 'parallel_en',
-                      'selectall', 'mov_o2sreg', 'mov_oreg2act'}:
-            # [ opcode ] [ 0 ] [ 0 ]
-            seg2 = opnum
-            seg1 = 0
-            seg0 = 0
-        elif opcode in {'add_xy',  'sub_xy', 'mult_xy'}:
-            # [ opcode ] [ 0 ] [ RS2, RS1 ]
-            rs1, rs2 = instrDict['rs1'], instrDict['rs2']
-            seg2 = opnum
-            seg1 = 0
-            seg0 = (rs2 << w_reg) | rs1
-        elif opcode in {'add_xsreg',  'sub_xsreg', 'mult_xsreg', 'mov_x2act'}:
-            # [ opcode ] [ 0 ] [ RS2, 0 ]
-            rs2 = instrDict['rs2']
-            seg2 = opnum
-            seg1 = 0
-            seg0 = (rs2 << w_reg)
-        elif opcode == 'actlookup':
-            # [ opcode ] [ 0 ] [ actCode ]
-            actCode = instrDict['actcode']
-            seg2 = opnum
-            seg1 = 0
-            seg0 = actCode
-        elif opcode == 'selectblk':
-            # [ opcode ] [ 0 ] [ blkID, <RS1:0> ]
-            blkID = instrDict['id']
-            seg2 = opnum
-            seg1 = 0
-            seg0 = (blkID << w_reg)
-        elif opcode in {'mov_y2sreg', 'mov_sreg2r', 'mov_oreg2r', 'mov_y2oreg'}:
-            # [ opcode ] [ 0 ] [ 0, RS1 ]
-            rs1 = instrDict['rs1']
-            seg2 = opnum
-            seg1 = 0
-            seg0 = rs1
-        elif opcode == 'write0':
-            # [ opcode ] [ addr:9-bit ] [ data ]
-            addr, data = instrDict['addr'], instrDict['data']
-            addrMsb = addr >> (w_addr-1)
-            addrMask = (1 << (w_addr - 1)) - 1  # to remove the Msb
-            dataMask = (1 << w_data) - 1        # to extract unsigned bit pattern
-            assert addrMsb == 0 or addrMsb == 1, f'Unexpected value for addrMsb: {addrMsb}'
-            if addrMsb == 1: opnum = self.tbl_opcode['write1']
-            else: opnum = self.tbl_opcode['write0']
-            seg2 = opnum
-            seg1 = addr & addrMask
-            seg0 = data & dataMask
-        else:
+        s_seg1 = self.tbl_field_width['seg0']             # shift of segment-1
+        s_seg2 = s_seg1 + self.tbl_field_width['seg1']    # shift of segment-2
+        recipes = {}
+        # [ opcode ] [ 0 ] [ 0 ]
+        for opcode in ['nop', 'relu', 'shiftoff', 'serial_en', 'parallel_en',
+                       'selectall', 'mov_o2sreg', 'mov_oreg2act']:
+            recipes[opcode] = []
+        # [ opcode ] [ 0 ] [ RS2, RS1 ]
+        for opcode in ['add_xy',  'sub_xy', 'mult_xy']:
+            recipes[opcode] = [('rs2', w_reg, None, None, None), ('rs1', 0, None, None, None)]
+        # [ opcode ] [ 0 ] [ RS2, 0 ]
+        for opcode in ['add_xsreg',  'sub_xsreg', 'mult_xsreg', 'mov_x2act']:
+            recipes[opcode] = [('rs2', w_reg, None, None, None)]
+        # [ opcode ] [ 0 ] [ actCode ]
+        recipes['actlookup'] = [('actcode', 0, None, None, None)]
+        # [ opcode ] [ 0 ] [ blkID, <RS1:0> ]
+        recipes['selectblk'] = [('id', w_reg, None, None, None)]
+        # [ opcode ] [ 0 ] [ 0, RS1 ]
+        for opcode in ['mov_y2sreg', 'mov_sreg2r', 'mov_oreg2r', 'mov_y2oreg']:
+            recipes[opcode] = [('rs1', 0, None, None, None)]
+        # [ opcode ] [ addr:9-bit ] [ data ]
+        # The MSb of the address overlaps with the LSb of the opcode: write0
+        # becomes write1 if the MSb of the address is set.
+        recipes['write0'] = [('addr', s_seg1, (1 << w_addr) - 1, None, None),
+                             ('data', 0, (1 << w_data) - 1, None, None)]     # unsigned bit pattern of the data
+        return {opcode : (self.tbl_opcode[opcode] << s_seg2, recipe) for opcode, recipe in recipes.items()}
+
+
+    # Returns the encoder recipe of the given opcode
+    def getEncoder(self, opcode):
+        if opcode not in self.tbl_encoder:
             if opcode in self.tbl_opcode:
                 assert 0, f"Instruction not implemented yet, opcode: {opcode}"
             else:
                 assert 0, f"Invalid opcode: {opcode}"
-        # build the word dictionary and return
-        w_seg1 = self.tbl_field_width['seg1']
-        assert seg1 >= 0 and seg1 < (1 << w_seg1), f'Segment-1 is outside valid range: {w_seg1:X}'      # there is a chance seg1 may be miscalculated
-        wordDict = {'seg0' : seg0, 'seg1' : seg1, 'seg2': seg2}
-        return wordDict
+        return self.tbl_encoder[opcode]
+
+
+    # Given an instruction dictionary (internal representation), Returns the
+    # (30-bit) instruction word as an integer
+    def encodeWord(self, instrDict):
+        word, recipe = self.getEncoder(instrDict['opcode'])
+        for field, shift, mask, table, default in recipe:
+            val = instrDict[field] if default is None else instrDict.get(field, default)
+            if table is not None: val = table[val]
+            val = int(val)      # numpy integers may overflow while shifting
+            if mask is not None: val &= mask
+            word |= val << shift
+        return word
+
+
+    # Encodes a batch of same-opcode instructions. The fields are given as
+    # keyword arguments, either as arrays (one element per instruction) or as
+    # scalars (same for all instructions). count is only needed if all fields
+    # are scalars. Returns the (30-bit) instruction words as a np.uint32 array.
+    def encodeBatch(self, opcode, count=None, **fields):
+        word, recipe = self.getEncoder(opcode)
+        words = np.int64(word)
+        for field, shift, mask, table, default in recipe:
+            val = fields[field] if default is None else fields.get(field, default)
+            if table is not None: val = table[val]
+            val = np.asarray(val, dtype=np.int64)
+            if mask is not None: val = val & mask
+            words = words | (val << shift)
+        shape = np.shape(words) if count is None else (count,)
+        return np.array(np.broadcast_to(words, shape), dtype=np.uint32, ndmin=1)
+
+
+    # Given an instruction dictionary (internal representation), Returns the
+    # machine code as a dictionary of instruction-word segements (wordDict)
+    def genMachineCode(self, instrDict):
+        return self.makeWordDict(self.encodeWord(instrDict))
 
 
     # Instruction parameter validation utilities
@@ -316,6 +341,7 @@ class VVBlockAsm:
         assert regWidth==16
         assert idWidth==8
         assert actCount==3
+        self.tbl_encoder = self.makeEncoderTable()     # precompiled instruction encoders
 
 
     # Compiles the instructions into machine code for exporting